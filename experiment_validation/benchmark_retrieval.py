@@ -0,0 +1,282 @@
+"""
+검색 스택 Recall / Latency 벤치마크
+utils/search_queries.py의 카탈로그 쿼리를 simulation_dates.csv 일부 날짜에 대해
+설정된 Time-Aware RAGRetriever 구성(검색 백엔드 / 후보 생성 방식 / 후보 수 / HNSW ef_search / 임베딩 백엔드)과
+날짜순 인덱스 위의 exact brute-force 기준으로 각각 검색하여 비교합니다.
+
+- recall@k: 최종 시간 감쇠 top-k (similarity × time_factor)가 exact 기준과 겹치는 비율
+- p50 / p99 지연: 에이전트 한 명(쿼리 5개)의 검색 + 재랭킹 시간
+- peak RSS: 구성마다 새 프로세스에서 실행하여 측정 (모델 / 인덱스 로드 포함)
+
+결과는 results/retrieval_benchmark.csv (구성별 요약)와 JSON (회귀 추적용)으로 저장됩니다.
+
+사용 예:
+    python experiment_validation/benchmark_retrieval.py --dates 8 --backends chroma bruteforce faiss
+    python experiment_validation/benchmark_retrieval.py --pool-sizes 100 300 --ef-search 50 100 200
+    python experiment_validation/benchmark_retrieval.py --fail-below 0.95   # recall이 기준 미만이면 exit 1
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# 프로젝트 루트 경로 추가
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from utils.search_queries import GAMER_TYPE_QUERIES
+from utils.retrieval_plan import select_agent_queries
+from utils.date_utils import yyyymmdd_to_epoch_days
+from utils.collection_config import distance_to_similarity
+
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "experiment_validation", "results")
+SIMULATION_DATES_FILE = os.path.join("datasets", "simulation_dates.csv")
+
+
+def build_workload(dates, trials, seed):
+    """(날짜, 쿼리 리스트) 목록: 날짜 × 게이머 유형 × trials, 시뮬레이션과 같은 쿼리 선정"""
+    rng = random.Random(seed)
+    return [
+        (date_str, list(dict.fromkeys(select_agent_queries(gamer_type, rng))))
+        for date_str in dates
+        for gamer_type in GAMER_TYPE_QUERIES
+        for _ in range(trials)
+    ]
+
+
+def peak_rss_mb():
+    """현재 프로세스의 최대 RSS (MB, Linux는 KB / macOS는 byte 단위)"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def exact_time_aware_topk(index, query_embeddings, agent_rows, date_str, top_k, decay_rate):
+    """
+    date <= date_str 인 모든 리뷰의 similarity × time_factor를 계산한 exact top-k
+
+    Args:
+        index: DateSortedIndex
+        query_embeddings: (Q, dim) 날짜에 사용된 쿼리 임베딩
+        agent_rows: 에이전트별 query_embeddings 행 번호 리스트
+    Returns:
+        list: 에이전트 순서대로 리뷰 ID 리스트 (점수 내림차순)
+    """
+    date_int = int(date_str.replace("-", ""))
+    end = index.prefix_length(date_int)
+    current_day = int(yyyymmdd_to_epoch_days(date_int))
+    k = min(top_k, end)
+    best_score = np.empty((len(agent_rows), 0))
+    best_rows = np.empty((len(agent_rows), 0), dtype=np.int64)
+    for block_start, dist in index.iter_distances(query_embeddings, end):
+        dates = index.dates[block_start:block_start + dist.shape[1]]
+        review_days = np.where(dates > 0, yyyymmdd_to_epoch_days(dates), current_day)
+        time_factor = np.exp(-decay_rate * np.maximum(0, current_day - review_days))
+        score = distance_to_similarity(dist, index.space) * time_factor
+        # 에이전트의 리뷰별 점수 = 자기 쿼리들의 점수 중 최댓값 (rank_candidates()의 중복 제거와 같음)
+        agent_score = np.stack([score[rows].max(axis=0) for rows in agent_rows])
+        rows = np.broadcast_to(np.arange(block_start, block_start + dist.shape[1]), agent_score.shape)
+
+        agent_score = np.concatenate([best_score, agent_score], axis=1)
+        rows = np.concatenate([best_rows, rows], axis=1)
+        if agent_score.shape[1] > k:
+            part = np.argpartition(-agent_score, k - 1, axis=1)[:, :k]
+            agent_score = np.take_along_axis(agent_score, part, axis=1)
+            rows = np.take_along_axis(rows, part, axis=1)
+        best_score, best_rows = agent_score, rows
+
+    order = np.argsort(-best_score, axis=1, kind='stable')
+    return [list(index.ids[r]) for r in np.take_along_axis(best_rows, order, axis=1)]
+
+
+def run_exact_baseline(workload, top_k, decay_rate):
+    """exact brute-force 기준 top-k (workload 순서)"""
+    from time_aware_rag import rag_modules
+    from utils.vector_index import DateSortedIndex
+    from utils.query_embedding_cache import QueryEmbedder
+    from utils.embedding_backend import get_embedding_cache_tag
+    from utils.embedding_projection import EmbeddingProjection, load_projected_query_embedder
+
+    collection = rag_modules.get_chroma_client().get_collection(name=rag_modules.COLLECTION_NAME, embedding_function=None)
+    index = DateSortedIndex.load_or_build(collection)
+    query_embedder = QueryEmbedder(
+        get_embedding_cache_tag(rag_modules.EMBEDDING_MODEL_NAME, rag_modules.EMBEDDING_BACKEND),
+        rag_modules.get_embedding_function
+    )
+    projection = EmbeddingProjection.load_for_collection(collection)
+    if projection is not None:
+        query_embedder = load_projected_query_embedder(projection, query_embedder, rag_modules.EMBEDDING_BACKEND)
+
+    results = [None] * len(workload)
+    by_date = {}
+    for i, (date_str, queries) in enumerate(workload):
+        by_date.setdefault(date_str, []).append(i)
+    for date_str, positions in by_date.items():
+        unique_queries = list(dict.fromkeys(q for i in positions for q in workload[i][1]))
+        query_rows = {query: row for row, query in enumerate(unique_queries)}
+        agent_rows = [[query_rows[q] for q in workload[i][1]] for i in positions]
+        top = exact_time_aware_topk(index, query_embedder.embed(unique_queries), agent_rows, date_str, top_k, decay_rate)
+        for i, ids in zip(positions, top):
+            results[i] = ids
+    return results, len(index)
+
+
+def run_configuration(config, workload, top_k, decay_rate):
+    """
+    구성 하나를 실행 (새 프로세스에서 호출되어 peak RSS가 구성별로 측정됨)
+
+    Returns:
+        dict: {"ids": 에이전트별 리뷰 ID 리스트, "latency_ms": 에이전트별 지연, "peak_rss_mb": 최대 RSS}
+    """
+    os.chdir(PROJECT_ROOT)
+    from time_aware_rag import rag_modules
+    from utils.collection_config import set_search_ef
+
+    rag_modules.EMBEDDING_BACKEND = config["embedding_backend"]
+    retriever = rag_modules.RAGRetriever(backend=config["backend"], candidate_mode=config["candidate_mode"])
+    original_ef = None
+    if config["ef_search"] is not None:
+        # 컬렉션 설정을 바꾸므로 끝나면 원래 값으로 되돌림
+        original_ef = retriever.hnsw_config["ef_search"]
+        set_search_ef(retriever.collection, config["ef_search"])
+    try:
+        # 첫 호출의 지연 로드(쿼리 임베딩 캐시 / 인덱스 mmap)는 측정에서 제외
+        date_str, queries = workload[0]
+        retriever.rank_agent_queries([queries], date_str, top_k, decay_rate, n_results=config["n_results"])
+
+        ids, latencies = [], []
+        for date_str, queries in workload:
+            start = time.perf_counter()
+            ranked = retriever.rank_agent_queries([queries], date_str, top_k, decay_rate,
+                                                  n_results=config["n_results"])[0]
+            latencies.append((time.perf_counter() - start) * 1000)
+            ids.append([str(i) for i in ranked['ids']])
+    finally:
+        if original_ef is not None:
+            set_search_ef(retriever.collection, original_ef)
+    return {"ids": ids, "latency_ms": latencies, "peak_rss_mb": peak_rss_mb()}
+
+
+def build_configurations(args):
+    """CLI 인자의 조합으로 구성 목록 생성 (후보 수는 pool 모드, ef_search는 chroma 백엔드에만 적용)"""
+    configs = []
+    for backend, mode, n_results, ef_search, embedding_backend in itertools.product(
+            args.backends, args.candidate_modes, args.pool_sizes, args.ef_search or [None], args.embedding_backends):
+        config = {
+            "backend": backend,
+            "candidate_mode": mode,
+            "n_results": n_results if mode == "pool" else None,
+            "ef_search": ef_search if backend == "chroma" else None,
+            "embedding_backend": embedding_backend
+        }
+        if config not in configs:
+            configs.append(config)
+    return configs
+
+
+def recall_at_k(reference_ids, ids):
+    reference_ids = set(reference_ids)
+    return len(reference_ids & set(ids)) / len(reference_ids) if reference_ids else 1.0
+
+
+def main():
+    from time_aware_rag import rag_modules
+    from utils.search_backends import SEARCH_BACKENDS
+    from utils.embedding_backend import EMBEDDING_BACKENDS
+
+    parser = argparse.ArgumentParser(description='Benchmark recall@k and latency of retriever configurations against exact search.')
+    parser.add_argument('--dates', type=int, default=8, help='Number of simulation dates to sample (0: all)')
+    parser.add_argument('--trials', type=int, default=2, help='Random query selections per gamer type and date')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--decay-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backends', nargs='+', choices=SEARCH_BACKENDS, default=[rag_modules.RETRIEVAL_BACKEND])
+    parser.add_argument('--candidate-modes', nargs='+', choices=["pool", "decay_index", "adaptive"],
+                        default=[rag_modules.CANDIDATE_MODE])
+    parser.add_argument('--pool-sizes', nargs='+', type=int, default=[rag_modules.CANDIDATE_POOL_SIZE],
+                        help='Candidates per query (n_results) in pool mode')
+    parser.add_argument('--ef-search', nargs='+', type=int, default=None,
+                        help='HNSW ef_search values for the chroma backend (default: collection setting)')
+    parser.add_argument('--embedding-backends', nargs='+', choices=EMBEDDING_BACKENDS,
+                        default=[rag_modules.EMBEDDING_BACKEND], help='Query embedding backends (baseline uses the configured one)')
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, "retrieval_benchmark.json"), help='JSON report path')
+    parser.add_argument('--fail-below', type=float, default=None, help='Exit with status 1 if any mean recall@k is lower')
+    args = parser.parse_args()
+
+    # RAGRetriever의 DB / 인덱스 경로는 프로젝트 루트 기준
+    os.chdir(PROJECT_ROOT)
+    dates = pd.read_csv(SIMULATION_DATES_FILE)['date'].tolist()
+    if args.dates:
+        dates = [dates[int(i)] for i in np.linspace(0, len(dates) - 1, min(args.dates, len(dates)))]
+    workload = build_workload(dates, args.trials, args.seed)
+
+    print("=" * 70)
+    print("검색 스택 Recall / Latency 벤치마크 (기준: exact brute-force)")
+    print("=" * 70)
+    print(f"Workload: {len(dates)} dates × {len(GAMER_TYPE_QUERIES)} types × {args.trials} trials = {len(workload)} agents")
+    reference, corpus_size = run_exact_baseline(workload, args.top_k, args.decay_rate)
+
+    rows, details = [], []
+    for config in build_configurations(args):
+        print(f"\n▶ {config}")
+        # 구성마다 새 프로세스 (peak RSS 분리, spawn으로 부모의 인덱스 / 모델 상태를 물려받지 않음)
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as executor:
+            result = executor.submit(run_configuration, config, workload, args.top_k, args.decay_rate).result()
+
+        recalls = [recall_at_k(ref, ids) for ref, ids in zip(reference, result["ids"])]
+        latency = np.asarray(result["latency_ms"])
+        rows.append({
+            **config,
+            "recall_at_k": float(np.mean(recalls)),
+            "min_recall_at_k": float(np.min(recalls)),
+            "p50_ms": float(np.percentile(latency, 50)),
+            "p99_ms": float(np.percentile(latency, 99)),
+            "mean_ms": float(latency.mean()),
+            "peak_rss_mb": result["peak_rss_mb"],
+            "agents": len(workload)
+        })
+        details.extend(
+            {**config, "date": date_str, "queries": "; ".join(queries), "recall_at_k": recall, "latency_ms": ms}
+            for (date_str, queries), recall, ms in zip(workload, recalls, result["latency_ms"])
+        )
+
+    # 해당 없는 후보 수 / ef_search는 빈 값으로 (정수 열 유지)
+    summary = pd.DataFrame(rows).astype({"n_results": "Int64", "ef_search": "Int64"})
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    summary.to_csv(os.path.splitext(args.output)[0] + ".csv", index=False)
+    pd.DataFrame(details).to_csv(os.path.splitext(args.output)[0] + "_detail.csv", index=False)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "collection": rag_modules.COLLECTION_NAME,
+            "corpus_size": corpus_size,
+            "top_k": args.top_k,
+            "decay_rate": args.decay_rate,
+            "dates": dates,
+            "trials": args.trials,
+            "seed": args.seed,
+            "configurations": rows
+        }, f, indent=2, ensure_ascii=False)
+
+    print(f"\n📊 recall@{args.top_k} (기준: exact time-aware top-{args.top_k}), {len(workload)} agents")
+    print("-" * 70)
+    print(summary.drop(columns=["agents"]).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"\n💾 결과 저장: {args.output}")
+
+    if args.fail_below is not None:
+        failed = summary[summary["recall_at_k"] < args.fail_below]
+        if len(failed):
+            print(f"❌ recall@{args.top_k} < {args.fail_below}: {len(failed)} configuration(s)")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+쿼리 결합(Query Fusion) Recall 비교
+에이전트당 쿼리 5개를 따로 검색하는 기존 방식과, 쿼리 임베딩을 결합 벡터 하나로 검색하는
+"mean" / "maxsim" 방식(utils/query_fusion.py)의 top-k 일치율(recall@k), ANN 호출 수, 지연을 비교합니다.
+
+- Time-Aware: 쿼리별 후보 풀(CANDIDATE_POOL_SIZE) 재랭킹 결과를 기준으로 결합 후보 풀의 재랭킹 결과 비교
+- Static: 쿼리별 top-k를 similarity 최댓값으로 합친 top-k를 기준으로 retrieve_reviews_multi() 결과 비교
+
+사용 예:
+    python experiment_validation/evaluate_query_fusion_recall.py --dates 12 --trials 3
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+import pandas as pd
+
+# 프로젝트 루트 경로 추가
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from utils.search_queries import GAMER_TYPE_QUERIES
+from utils.retrieval_plan import select_agent_queries
+from utils.query_fusion import QUERY_FUSION_MODES
+
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "experiment_validation", "results")
+SIMULATION_DATES_FILE = os.path.join("datasets", "simulation_dates.csv")
+
+
+def recall_at_k(reference_ids, ids):
+    reference_ids = set(map(str, reference_ids))
+    return len(reference_ids & set(map(str, ids))) / len(reference_ids) if reference_ids else 1.0
+
+
+def evaluate_time_aware(dates, trials, top_k, decay_rate, backend):
+    from time_aware_rag.rag_modules import RAGRetriever, CANDIDATE_POOL_SIZE
+
+    retriever = RAGRetriever(backend=backend)
+    rows = []
+    rng = random.Random(0)
+    for date in dates:
+        for gamer_type in GAMER_TYPE_QUERIES:
+            for trial in range(trials):
+                queries = list(dict.fromkeys(select_agent_queries(gamer_type, rng)))
+
+                start = time.perf_counter()
+                candidates = retriever.retrieve_candidates(queries, date, CANDIDATE_POOL_SIZE, decay_rate)
+                reference = retriever.rank_candidates([candidates[q] for q in queries], date, top_k, decay_rate)
+                rows.append({
+                    "retriever": "time_aware", "query_fusion": "per_query", "date": date, "gamer_type": gamer_type,
+                    "trial": trial, "recall_at_k": 1.0, "ann_calls": len(queries),
+                    "latency_ms": (time.perf_counter() - start) * 1000
+                })
+                for mode in QUERY_FUSION_MODES:
+                    start = time.perf_counter()
+                    fused = retriever.retrieve_fused_candidates([queries], date, mode)[0]
+                    ranked = retriever.rank_candidates([fused], date, top_k, decay_rate)
+                    rows.append({
+                        "retriever": "time_aware", "query_fusion": mode, "date": date, "gamer_type": gamer_type,
+                        "trial": trial, "recall_at_k": recall_at_k(reference['ids'], ranked['ids']), "ann_calls": 1,
+                        "latency_ms": (time.perf_counter() - start) * 1000
+                    })
+    return rows
+
+
+def evaluate_static(dates, trials, top_k, backend):
+    from static_rag.rag_modules import RAGRetriever
+    from utils.collection_config import distance_to_similarity
+    from utils.query_fusion import fuse_query_embeddings, maxsim_similarity, FUSED_CANDIDATE_POOL_SIZE
+
+    retriever = RAGRetriever(backend=backend)
+    space = retriever.hnsw_config["space"]
+    rows = []
+    rng = random.Random(0)
+    for date in dates:
+        date_int = int(date.replace("-", ""))
+        for gamer_type in GAMER_TYPE_QUERIES:
+            for trial in range(trials):
+                queries = list(dict.fromkeys(select_agent_queries(gamer_type, rng)))
+                embeddings = retriever.query_embedder.embed(queries)
+
+                # 기준: 쿼리별 top-k를 similarity 최댓값으로 합친 top-k
+                start = time.perf_counter()
+                best = {}
+                for embedding in embeddings:
+                    hits = retriever._dense_search(embedding[None, :], date_int, top_k)
+                    for review_id, sim in zip(hits['ids'], distance_to_similarity(hits['distances'], space)):
+                        best[review_id] = max(best.get(review_id, -np.inf), sim)
+                reference = sorted(best, key=best.get, reverse=True)[:top_k]
+                rows.append({
+                    "retriever": "static", "query_fusion": "per_query", "date": date, "gamer_type": gamer_type,
+                    "trial": trial, "recall_at_k": 1.0, "ann_calls": len(queries),
+                    "latency_ms": (time.perf_counter() - start) * 1000
+                })
+                for mode in QUERY_FUSION_MODES:
+                    # retrieve_reviews_multi()와 같은 검색 (리뷰 문자열 대신 ID 비교)
+                    start = time.perf_counter()
+                    n_candidates = top_k if mode == "mean" else max(top_k, FUSED_CANDIDATE_POOL_SIZE)
+                    hits = retriever._dense_search(fuse_query_embeddings(embeddings)[None, :], date_int, n_candidates)
+                    ids = hits['ids']
+                    if mode == "maxsim":
+                        similarity = maxsim_similarity(embeddings, retriever.vector_index, ids)
+                        ids = ids[np.argsort(-similarity, kind='stable')[:top_k]]
+                    rows.append({
+                        "retriever": "static", "query_fusion": mode, "date": date, "gamer_type": gamer_type,
+                        "trial": trial, "recall_at_k": recall_at_k(reference, ids), "ann_calls": 1,
+                        "latency_ms": (time.perf_counter() - start) * 1000
+                    })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare fused-query retrieval against per-query retrieval.')
+    parser.add_argument('--dates', type=int, default=None, help='Number of simulation dates to evaluate (default: all)')
+    parser.add_argument('--trials', type=int, default=3, help='Random query selections per gamer type and date')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--decay-rate', type=float, default=0.01)
+    parser.add_argument('--backend', default="chroma", help='RAGRetriever search backend')
+    parser.add_argument('--retrievers', nargs='+', choices=["time_aware", "static"], default=["time_aware", "static"])
+    args = parser.parse_args()
+
+    # RAGRetriever의 DB / 인덱스 경로는 프로젝트 루트 기준
+    os.chdir(PROJECT_ROOT)
+    dates = pd.read_csv(SIMULATION_DATES_FILE)['date'].tolist()
+    if args.dates:
+        dates = [dates[int(i)] for i in np.linspace(0, len(dates) - 1, min(args.dates, len(dates)))]
+
+    print("=" * 70)
+    print("쿼리 결합 Recall 비교 (per_query vs mean / maxsim)")
+    print("=" * 70)
+    rows = []
+    if "time_aware" in args.retrievers:
+        rows += evaluate_time_aware(dates, args.trials, args.top_k, args.decay_rate, args.backend)
+    if "static" in args.retrievers:
+        rows += evaluate_static(dates, args.trials, args.top_k, args.backend)
+
+    df = pd.DataFrame(rows)
+    summary = df.groupby(["retriever", "query_fusion"]).agg(
+        recall_at_k=("recall_at_k", "mean"),
+        min_recall_at_k=("recall_at_k", "min"),
+        ann_calls_per_agent=("ann_calls", "mean"),
+        latency_ms=("latency_ms", "mean"),
+        agents=("recall_at_k", "size")
+    ).reset_index()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    df.to_csv(os.path.join(RESULTS_DIR, "query_fusion_recall_detail.csv"), index=False)
+    summary.to_csv(os.path.join(RESULTS_DIR, "query_fusion_recall.csv"), index=False)
+
+    print(f"\n📊 recall@{args.top_k} (기준: 쿼리별 검색), {len(dates)} dates × {len(GAMER_TYPE_QUERIES)} types × {args.trials} trials")
+    print("-" * 70)
+    print(summary.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"\n💾 결과 저장: {os.path.join(RESULTS_DIR, 'query_fusion_recall.csv')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,23 @@
 import pandas as pd
 import chromadb
-from chromadb.utils import embedding_functions
 from datetime import datetime
 import os
 import argparse
 import sys
 
+# 프로젝트 루트 경로 추가 (utils 모듈 import를 위해)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.collection_config import (
+    build_collection_metadata, add_index_arguments, check_unit_norm,
+    DEFAULT_SPACE, DEFAULT_HNSW_M, DEFAULT_EF_CONSTRUCTION, DEFAULT_EF_SEARCH
+)
+from utils.embedding_backend import load_embedding_function, EMBEDDING_BACKENDS
+from utils.text_store import (SnippetStore, ReviewTextStore, TextStoreWriter, get_snippet_store_path,
+                              get_review_text_store_path)
+from utils.bm25_index import BM25Index, get_bm25_index_path
+from utils.time_shards import build_time_shards, SHARD_GRANULARITIES
+
 
 # 설정 (Configuration)
 CSV_PATH = os.path.join("datasets", "cyberpunk2077_all_reviews.csv")
@@ -67,13 +79,32 @@ def parse_date_to_int(date_str):
 
 
 
-def build_chroma_db(test_mode=False):
+def build_chroma_db(test_mode=False, space=DEFAULT_SPACE, hnsw_m=DEFAULT_HNSW_M,
+                    ef_construction=DEFAULT_EF_CONSTRUCTION, ef_search=DEFAULT_EF_SEARCH, embedding_backend="torch", shard_by=None):
+    """
+    Args:
+        space: 거리 함수 ("l2", "cosine", "ip")
+        hnsw_m: HNSW 그래프 차수 M (클수록 recall ↑, 메모리/빌드 시간 ↑)
+        ef_construction: 빌드 시 탐색 폭
+        ef_search: 검색 시 탐색 폭 (클수록 recall ↑, 지연 ↑)
+        embedding_backend: 임베딩 백엔드 ("torch", "onnx", "onnx-int8")
+        shard_by: None, "month" 또는 "quarter" (지정하면 시간 샤드 컬렉션 + manifest도 생성, utils/time_shards.py)
+    """
     # ChromaDB 클라이언트 초기화
     client = chromadb.PersistentClient(path=DB_PATH)
     
     # 임베딩 함수 설정 (all-MiniLM-L6-v2 사용)
-    print("Using default embedding model: all-MiniLM-L6-v2")
-    ef = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+    print(f"Using default embedding model: all-MiniLM-L6-v2 ({embedding_backend})")
+    ef = load_embedding_function("all-MiniLM-L6-v2", embedding_backend)
+    
+    df = process_reviews(CSV_PATH)
+    
+    if test_mode:
+        print("Test mode: Processing only first 5000 records.")
+        df = df.head(5000)
+
+    # l2 / ip similarity 변환의 정규화 가정 확인 (기존 컬렉션을 지우기 전에)
+    check_unit_norm(ef, df['Review'].astype(str).tolist(), space)
     
     # 스키마 초기화를 위해 항상 기존 컬렉션 삭제
     try:
@@ -82,13 +113,10 @@ def build_chroma_db(test_mode=False):
     except Exception as e:
         print(f"Collection deletion skipped: {e}")
 
-    collection = client.create_collection(name=COLLECTION_NAME, embedding_function=ef)
-    
-    df = process_reviews(CSV_PATH)
-    
-    if test_mode:
-        print("Test mode: Processing only first 5000 records.")
-        df = df.head(5000)
+    # 거리 함수와 HNSW 파라미터를 컬렉션 메타데이터에 기록 (검색 시 RAGRetriever가 다시 읽음)
+    index_metadata = build_collection_metadata(space, hnsw_m, ef_construction, ef_search)
+    print(f"Index settings: {index_metadata}")
+    collection = client.create_collection(name=COLLECTION_NAME, embedding_function=ef, metadata=index_metadata)
     
     batch_size = 512
     total_docs = len(df)
@@ -96,6 +124,12 @@ def build_chroma_db(test_mode=False):
     documents = []
     metadatas = []
     ids = []
+    # mmap 텍스트 저장소 (원문 전체 + 검색 2단계 fetch용 400자 스니펫)는 리뷰마다 파일에 바로 이어 씀
+    # BM25 역색인용으로는 ID / 날짜만 모으고 원문은 저장소에서 다시 읽음
+    text_writer = TextStoreWriter(ReviewTextStore, get_review_text_store_path(COLLECTION_NAME))
+    snippet_writer = TextStoreWriter(SnippetStore, get_snippet_store_path(COLLECTION_NAME))
+    store_ids = []
+    store_dates = []
     
     print(f"\n{'='*60}")
     print(f"🚀 ChromaDB 구축 시작")
@@ -151,6 +185,10 @@ def build_chroma_db(test_mode=False):
         documents.append(review_text)
         metadatas.append(metadata)
         ids.append(doc_id)
+        text_writer.add(doc_id, review_text)
+        snippet_writer.add(doc_id, review_text)
+        store_ids.append(doc_id)
+        store_dates.append(date_int)
         
         processed_count += 1
         
@@ -184,6 +222,16 @@ def build_chroma_db(test_mode=False):
     print(f"   - 최종 저장된 문서 수: {collection.count():,}개")
     print(f"{'='*60}\n")
 
+    text_store = text_writer.close(collection_id=str(collection.id))
+    snippet_writer.close(collection_id=str(collection.id))
+    store_texts = text_store.view(store_ids)
+    BM25Index.build(store_ids, store_texts, store_dates, collection_id=str(collection.id)).save(
+        get_bm25_index_path(COLLECTION_NAME)
+    )
+    if shard_by:
+        # 임베딩을 다시 계산하지 않고 방금 만든 컬렉션에서 샤드로 복사
+        build_time_shards(client, collection, shard_by)
+
     if test_mode:
         verify_insertion(collection)
 
@@ -200,6 +248,17 @@ def verify_insertion(collection):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Build ChromaDB from new reviews CSV.')
     parser.add_argument('--test', action='store_true', help='Run in test mode')
+    add_index_arguments(parser)
+    parser.add_argument('--embedding-backend', choices=EMBEDDING_BACKENDS, default="torch", help='Embedding backend')
+    parser.add_argument('--shard-by', choices=SHARD_GRANULARITIES, default=None, help='Also build per-month / per-quarter shard collections')
     args = parser.parse_args()
     
-    build_chroma_db(test_mode=args.test)
+    build_chroma_db(
+        test_mode=args.test,
+        space=args.space,
+        hnsw_m=args.hnsw_m,
+        ef_construction=args.ef_construction,
+        ef_search=args.ef_search,
+        embedding_backend=args.embedding_backend,
+        shard_by=args.shard_by
+    )
@@ -1,13 +1,28 @@
 import chromadb
 import os
-import openai
-from chromadb.utils import embedding_functions
+import time
+import heapq
+import threading
+import numpy as np
 import sys
 
 # 프로젝트 루트 경로 추가 (모듈 import를 위해)
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils.search_queries import GAMER_TYPE_QUERIES, GENERAL_QUERY
+from utils.query_embedding_cache import QueryEmbedder
+from utils.vector_index import DateSortedIndex
+from utils.collection_config import get_hnsw_config, distance_to_similarity
+from utils.embedding_backend import load_embedding_function, get_embedding_cache_tag
+from utils.embedding_projection import EmbeddingProjection, load_projected_query_embedder
+from utils.text_store import SnippetStore, ReviewTextStore, get_review_text_store_path, SNIPPET_LENGTH
+from utils.bm25_index import BM25Index, fuse_candidates, HYBRID_ALPHA
+from utils.search_backends import load_search_backend, SEARCH_BACKENDS
+from utils.query_fusion import (fuse_query_embeddings, maxsim_similarity, validate_query_fusion,
+                                FUSED_CANDIDATE_POOL_SIZE)
+from utils.retrieval_trace import RetrievalTraceWriter
+from utils.span_tracer import span
+from utils.micro_batcher import MicroBatcher
 
 # RAG 모듈 (RAG Modules)
 # 이 모듈은 ChromaDB와의 연결 및 검색 로직을 담당합니다.
@@ -16,6 +31,20 @@ from utils.search_queries import GAMER_TYPE_QUERIES, GENERAL_QUERY
 # ChromaDB 경로 설정 (Set ChromaDB Path)
 CHROMA_DB_PATH = "datasets/chroma_db"
 COLLECTION_NAME = "cyberpunk2077_reviews"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# 쿼리 임베딩 백엔드: "torch", "onnx", "onnx-int8" (utils/embedding_backend.py)
+EMBEDDING_BACKEND = "torch"
+# 검색 백엔드: "chroma" (HNSW + where 필터), "bruteforce" (날짜순 정렬 exact 인덱스),
+# "sharded" (월 / 분기 샤드 컬렉션 중 날짜 이전 샤드만 병렬 검색, utils/time_shards.py)
+# "faiss" (날짜순 ID 범위 selector를 쓰는 IVF 인덱스, utils/search_backends.py)
+# 또는 "quantized" (int8 / binary 압축 코드로 1차 검색 후 shortlist만 float32 재점수화, utils/quantized_index.py)
+RETRIEVAL_BACKEND = "chroma"
+# 점수 결합 방식: "dense" (임베딩 유사도만) 또는 "hybrid" (임베딩 + BM25, utils/bm25_index.py)
+FUSION_MODE = "dense"
+# hybrid 모드에서 dense / BM25 각각 가져와 결합할 후보 수
+HYBRID_CANDIDATES = 50
+# 검색 트레이스 디렉토리 (설정하면 검색 호출별 최종 리뷰 / 점수 / 지연을 Parquet로 기록, utils/retrieval_trace.py)
+RETRIEVAL_TRACE_DIR = os.getenv("RETRIEVAL_TRACE_DIR")
 
 def get_chroma_client():
     """
@@ -36,32 +65,152 @@ def get_embedding_function():
     기존 ChromaDB 컬렉션이 'all-MiniLM-L6-v2' (SentenceTransformer)로 생성되었으므로,
     이를 맞춰서 사용합니다.
     Returns:
-        embedding_functions.SentenceTransformerEmbeddingFunction: 임베딩 함수 객체
+        Chroma EmbeddingFunction: 임베딩 함수 객체 (EMBEDDING_BACKEND에 따라 PyTorch 또는 ONNX Runtime)
     """
-    # OpenAI 대신 로컬 모델 사용 (DB와의 호환성 유지)
-    return embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
+    # OpenAI 대신 로컬 모델 사용 (DB와의 호환성 유지), CPU에서는 ONNX 백엔드로 교체 가능
+    return load_embedding_function(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND)
+
+def format_review(doc, date_int):
+    """
+    리뷰를 Team 3 스타일 "- [YYYY-MM-DD] Review..." 문자열로 변환합니다.
+    리뷰 길이는 400자로 제한 (Team 3와 동일)
+    """
+    # 정수형 날짜(YYYYMMDD)를 다시 문자열(YYYY-MM-DD)로 변환
+    date_str = str(date_int)
+    if len(date_str) == 8:
+        date_str = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]}"
+    return f"- [{date_str}] {doc[:400]}..."
 
 class RAGRetriever:
-    def __init__(self):
+    def __init__(self, backend=RETRIEVAL_BACKEND, fusion=FUSION_MODE, trace_dir=RETRIEVAL_TRACE_DIR):
         """
         RAGRetriever 초기화
         ChromaDB 클라이언트와 컬렉션을 로드합니다.
+        쿼리 임베딩은 사전 계산된 캐시를 사용하므로, 카탈로그 쿼리만 검색하는 경우
+        SentenceTransformer 모델을 로드하지 않습니다.
+
+        Args:
+            backend (str): "chroma", "bruteforce", "sharded", "faiss" 또는 "quantized"
+                "bruteforce"는 컬렉션을 날짜순 정렬 행렬로 한 번 내보내고(datasets/vector_index/),
+                날짜 필터를 prefix 구간으로 바꾸어 exact top-k를 계산합니다.
+                "sharded"는 현재 날짜 이전의 시간 샤드 컬렉션만 병렬로 검색하여 병합합니다.
+                "faiss"는 같은 날짜순 행 번호를 ID로 쓰는 IVF 인덱스(datasets/faiss_index/)에서
+                날짜 필터를 ID 범위 selector로 적용합니다.
+                "quantized"는 날짜순 행렬의 int8 / binary 압축 코드(datasets/quantized_index/)로 shortlist를 고르고
+                shortlist 행만 float32 행렬(mmap)에서 읽어 정확한 거리로 다시 정렬합니다.
+            fusion (str): "dense" 또는 "hybrid"
+                "hybrid"는 dense 후보와 BM25 후보(datasets/bm25_index/)를 정규화 점수로 결합해 순위를 정합니다
+                (결합 점수는 순서에만 쓰고, 트레이스의 similarity는 dense similarity).
+            trace_dir (str): 지정하면 retrieve_reviews() 결과를 호출 / 순위별로 Parquet 트레이스에 기록합니다.
+                (Static RAG에는 시간 감쇠가 없으므로 time_factor = 1, final_score = similarity)
         """
+        if backend not in SEARCH_BACKENDS:
+            raise ValueError(f"지원하지 않는 검색 백엔드입니다: {backend}")
+        if fusion not in ("dense", "hybrid"):
+            raise ValueError(f"지원하지 않는 점수 결합 방식입니다: {fusion}")
         self.client = get_chroma_client()
-        self.embedding_fn = get_embedding_function()
+        self.query_embedder = QueryEmbedder(get_embedding_cache_tag(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND), get_embedding_function)
         
         # 컬렉션 가져오기 (Get Collection)
+        # 검색 시 query_embeddings를 직접 전달하므로 컬렉션에는 임베딩 함수를 연결하지 않음
         try:
             self.collection = self.client.get_collection(
                 name=COLLECTION_NAME,
-                embedding_function=self.embedding_fn
+                embedding_function=None
             )
             print(f"Collection '{COLLECTION_NAME}' loaded successfully.")
         except Exception as e:
             raise ValueError(f"컬렉션 '{COLLECTION_NAME}'을 로드하는 중 오류가 발생했습니다: {e}")
 
+        # Time-Aware 빌더가 --reduce-dim으로 같은 컬렉션을 차원 축소해 만들었으면 저장된 투영을 쿼리에도 적용
+        self.projection = EmbeddingProjection.load_for_collection(self.collection)
+        if self.projection is not None:
+            self.query_embedder = load_projected_query_embedder(self.projection, self.query_embedder, EMBEDDING_BACKEND)
+
+        # 빌드 시 기록된 거리 함수 / HNSW 파라미터
+        self.hnsw_config = get_hnsw_config(self.collection)
+        print(f"Index settings: {self.hnsw_config}")
+
+        self.backend = backend
+        self.fusion = fusion
+        self._vector_index = None
+        # 날짜순 인덱스 지연 로드는 동시에 실행되는 aretrieve_reviews() 배치 스레드 사이에서 한 번만
+        self._lazy_load_lock = threading.Lock()
+        if backend in ("bruteforce", "faiss", "quantized"):
+            self._vector_index = DateSortedIndex.load_or_build(self.collection)
+        # dense 검색 백엔드 (sharded는 manifest, faiss는 IVF 인덱스가 없으면 컬렉션에서 생성)
+        self.search_backend = load_search_backend(
+            backend, self.client, self.collection, self.hnsw_config["space"], self._vector_index
+        )
+        # 최종 결과의 400자 스니펫 (검색 단계에서는 원문을 받아 오지 않음)
+        self.snippet_store = SnippetStore.load_or_build(self.collection)
+        # 원문 전체 mmap 저장소 (ingest 시 만들어졌으면 사용, 없으면 컬렉션에서 조회)
+        self.text_store = ReviewTextStore.load_for_collection(self.collection, get_review_text_store_path(COLLECTION_NAME))
+        # 키워드 쿼리용 BM25 역색인 (hybrid 모드에서만 로드)
+        self.bm25_index = BM25Index.load_or_build(self.collection) if fusion == "hybrid" else None
+        # 검색 트레이스 기록기 (백그라운드 스레드에서 Parquet 저장)
+        self.tracer = RetrievalTraceWriter(trace_dir, "static") if trace_dir else None
+        # aretrieve_reviews()용 micro-batcher (이벤트 루프 안에서 처음 호출될 때 생성)
+        self._batcher = None
+
+    def prepare(self):
+        """
+        처음 사용할 때 만들어지는 디스크 캐시(쿼리 임베딩 캐시)를 미리 만들어 둡니다.
+        RetrieverPool이 워커를 띄우기 전에 부모 프로세스에서 호출하여 워커들이 같은 파일을 동시에 만들지 않도록 합니다.
+        """
+        self.query_embedder.embed([GENERAL_QUERY])
+
+    def close(self):
+        """검색 백엔드(sharded 샤드 검색 스레드 풀)와 검색 트레이스 기록기를 정리합니다."""
+        self.search_backend.close()
+        if self.tracer is not None:
+            self.tracer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def vector_index(self):
+        """날짜순 정렬 인덱스 (bruteforce / faiss / quantized 백엔드가 아니면 sweep 등에서 처음 필요할 때 로드)"""
+        if self._vector_index is None:
+            with self._lazy_load_lock:
+                if self._vector_index is None:
+                    self._vector_index = DateSortedIndex.load_or_build(self.collection)
+        return self._vector_index
+
+    def fetch_documents(self, ids):
+        """
+        리뷰 ID 목록의 원문을 가져옵니다 (mmap 원문 저장소 → 없으면 컬렉션).
+        Returns:
+            list: 입력 ID 순서대로 정렬된 리뷰 원문 리스트
+        """
+        ids = [str(i) for i in ids]
+        if not ids:
+            return []
+        documents = self.text_store.get_many(ids) if self.text_store is not None else [None] * len(ids)
+        missing = [i for i, doc in zip(ids, documents) if doc is None]
+        if missing:
+            result = self.collection.get(ids=missing, include=["documents"])
+            fetched = dict(zip(result['ids'], result['documents']))
+            documents = [doc if doc is not None else fetched.get(i, "") for i, doc in zip(ids, documents)]
+        return documents
+
+    def fetch_snippets(self, ids):
+        """
+        리뷰 ID 목록의 앞 400자 스니펫을 스니펫 저장소에서 가져옵니다 (없으면 컬렉션에서 원문 조회).
+        Returns:
+            list: 입력 ID 순서대로 정렬된 스니펫 리스트
+        """
+        snippets = self.snippet_store.get_many(ids)
+        missing = [i for i, snippet in enumerate(snippets) if snippet is None]
+        if missing:
+            for i, doc in zip(missing, self.fetch_documents([ids[i] for i in missing])):
+                snippets[i] = doc[:SNIPPET_LENGTH]
+        return snippets
+
     def retrieve_reviews(self, query_text, current_date, top_k=5):
         """
         주어진 쿼리와 날짜를 기준으로 관련 리뷰를 검색합니다.
@@ -74,47 +223,238 @@ class RAGRetriever:
         Returns:
             list: 검색된 문서(리뷰) 리스트
         """
-        # 날짜 포맷 변환: YYYY-MM-DD -> YYYYMMDD (int)
-        # ChromaDB 메타데이터가 int형 날짜로 저장되어 있으므로 이에 맞춰 변환
-        try:
-            date_int = int(current_date.replace("-", ""))
-        except ValueError:
-            print(f"Warning: Invalid date format {current_date}. Using current timestamp.")
-            date_int = 20250101 # Fallback
+        date_int = self._to_date_int(current_date)
             
-        # 날짜 필터링: 현재 날짜보다 작거나 같은(lte) 데이터만 검색
-        where_filter = {"date": {"$lte": date_int}}
-        
         # print(f"Retrieving for query: '{query_text}' with date filter <= {date_int}")
         
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=top_k,
-            where=where_filter
-        )
-        
-        if results['documents'] and results['documents'][0]:
-            # Team 3 스타일: "- [Date] Review..." 형식으로 변환
-            formatted_results = []
-            
-            # documents[0], metadatas[0]는 리스트 형태임
-            docs = results['documents'][0]
-            metas = results['metadatas'][0]
-            
-            for doc, meta in zip(docs, metas):
-                date_int = meta.get('date', 0)
-                # 정수형 날짜(YYYYMMDD)를 다시 문자열(YYYY-MM-DD)로 변환
-                date_str = str(date_int)
-                if len(date_str) == 8:
-                    date_str = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]}"
-                
-                # 리뷰 길이를 400자로 제한 (Team 3와 동일)
-                review_snippet = doc[:400]
-                formatted_results.append(f"- [{date_str}] {review_snippet}...")
-                
-            return formatted_results
+        start = time.perf_counter()
+        with span("embed"):
+            query_embeddings = self.query_embedder.embed([query_text])
+
+        # 1단계: ID / 거리 / 날짜만 검색, 2단계: 최종 결과의 스니펫만 조회
+        if self.fusion == "hybrid":
+            ids, dates, similarity = self._hybrid_search(query_text, query_embeddings, date_int, top_k)
         else:
+            with span("ann", backend=self.backend):
+                hits = self._dense_search(query_embeddings, date_int, top_k)
+            ids, dates = hits['ids'], hits['dates']
+            similarity = distance_to_similarity(hits['distances'], self.hnsw_config["space"]) if self.tracer else None
+        with span("fetch_snippets"):
+            docs = self.fetch_snippets(ids)
+
+        if self.tracer is not None:
+            # 결과만 큐에 넣고 기록은 백그라운드 스레드에서
+            self.tracer.record(
+                self.tracer.new_task_id(), date_int, ids, dates, similarity, np.ones(len(ids)), similarity,
+                [query_text] * len(ids), (time.perf_counter() - start) * 1000
+            )
+        
+        # Team 3 스타일: "- [Date] Review..." 형식으로 변환
+        return [format_review(doc, date) for doc, date in zip(docs, dates)]
+
+    def retrieve_reviews_batch(self, query_texts, current_date, top_k=5):
+        """
+        같은 날짜의 여러 쿼리를 한 번의 임베딩 조회 / 멀티 쿼리 검색으로 처리합니다.
+
+        Returns:
+            list: query_texts 순서대로 retrieve_reviews()와 같은 형식의 결과 리스트
+        """
+        if not query_texts:
             return []
+        if self.fusion == "hybrid":
+            # BM25 결합은 쿼리별 처리
+            return [self.retrieve_reviews(query_text, current_date, top_k) for query_text in query_texts]
+        date_int = self._to_date_int(current_date)
+        unique_queries = list(dict.fromkeys(query_texts))
+
+        start = time.perf_counter()
+        with span("embed"):
+            query_embeddings = self.query_embedder.embed(unique_queries)
+        with span("ann", backend=self.backend):
+            hits = dict(zip(unique_queries, self.search_backend.search(query_embeddings, date_int, top_k)))
+        with span("fetch_snippets"):
+            # 모든 쿼리의 최종 결과 스니펫을 한 번에 조회한 뒤 쿼리별로 나눔
+            docs = self.fetch_snippets(np.concatenate([hits[q]['ids'] for q in unique_queries]))
+            offsets = np.cumsum([0] + [len(hits[q]['ids']) for q in unique_queries])
+            docs = {q: docs[offsets[i]:offsets[i + 1]] for i, q in enumerate(unique_queries)}
+
+        if self.tracer is not None:
+            latency_ms = (time.perf_counter() - start) * 1000
+            for query_text in unique_queries:
+                hit = hits[query_text]
+                similarity = distance_to_similarity(hit['distances'], self.hnsw_config["space"])
+                self.tracer.record(
+                    self.tracer.new_task_id(), date_int, hit['ids'], hit['dates'], similarity,
+                    np.ones(len(similarity)), similarity, [query_text] * len(similarity), latency_ms
+                )
+        return [
+            [format_review(doc, date) for doc, date in zip(docs[query_text], hits[query_text]['dates'])]
+            for query_text in query_texts
+        ]
+
+    async def aretrieve_reviews(self, query_text, current_date, top_k=5):
+        """
+        retrieve_reviews()의 비동기 버전
+        짧은 시간 안에 들어온 같은 날짜 / top_k의 동시 요청을 모아 retrieve_reviews_batch() 한 번으로 처리합니다.
+        (utils/micro_batcher.py)
+        """
+        if self._batcher is None:
+            # 배치가 여러 스레드에서 동시에 실행되기 전에 쿼리 임베딩 캐시를 미리 만들어 둠
+            self.prepare()
+            self._batcher = MicroBatcher(lambda key, query_texts: self.retrieve_reviews_batch(query_texts, *key))
+        return await self._batcher.submit((current_date, top_k), query_text)
+
+    @staticmethod
+    def _to_date_int(current_date):
+        # 날짜 포맷 변환: YYYY-MM-DD -> YYYYMMDD (int)
+        # ChromaDB 메타데이터가 int형 날짜로 저장되어 있으므로 이에 맞춰 변환
+        try:
+            return int(current_date.replace("-", ""))
+        except ValueError:
+            print(f"Warning: Invalid date format {current_date}. Using current timestamp.")
+            return 20250101 # Fallback
+
+    def retrieve_reviews_multi(self, query_texts, current_date, top_k=5, query_fusion="mean"):
+        """
+        여러 쿼리를 결합 벡터 하나로 한 번만 검색합니다 (쿼리별 retrieve_reviews() 호출 대신).
+
+        Args:
+            query_texts (list): 에이전트가 선정한 쿼리 텍스트 리스트
+            query_fusion (str): "mean" (결합 벡터와의 유사도 순) 또는
+                "maxsim" (결합 벡터로 FUSED_CANDIDATE_POOL_SIZE개 후보를 가져와 쿼리별 유사도의 최댓값 순)
+        Returns:
+            list: retrieve_reviews()와 같은 형식의 리뷰 문자열 리스트 (최대 top_k개)
+        """
+        validate_query_fusion(query_fusion)
+        if query_fusion is None or self.fusion != "dense":
+            raise ValueError("retrieve_reviews_multi는 dense 점수 결합과 mean / maxsim 쿼리 결합에서만 사용할 수 있습니다.")
+        date_int = self._to_date_int(current_date)
+        query_texts = list(dict.fromkeys(query_texts))
+
+        start = time.perf_counter()
+        with span("embed"):
+            query_embeddings = self.query_embedder.embed(query_texts)
+        n_candidates = top_k if query_fusion == "mean" else max(top_k, FUSED_CANDIDATE_POOL_SIZE)
+        with span("ann", backend=self.backend):
+            hits = self._dense_search(fuse_query_embeddings(query_embeddings)[None, :], date_int, n_candidates)
+        ids, dates = hits['ids'], hits['dates']
+        similarity = distance_to_similarity(hits['distances'], self.hnsw_config["space"])
+        if query_fusion == "maxsim":
+            similarity = maxsim_similarity(query_embeddings, self.vector_index, ids)
+            # 동점은 결합 벡터 검색 순서 우선
+            top = np.argsort(-similarity, kind='stable')[:top_k]
+            ids, dates, similarity = ids[top], dates[top], similarity[top]
+        with span("fetch_snippets"):
+            docs = self.fetch_snippets(ids)
+
+        if self.tracer is not None:
+            self.tracer.record(
+                self.tracer.new_task_id(), date_int, ids, dates, similarity, np.ones(len(ids)), similarity,
+                ["; ".join(query_texts)] * len(ids), (time.perf_counter() - start) * 1000
+            )
+        return [format_review(doc, date) for doc, date in zip(docs, dates)]
+
+    def _dense_search(self, query_embeddings, date_int, n_results):
+        """
+        date <= date_int 인 리뷰 중 임베딩 거리 상위 n_results개 (쿼리 하나)
+        Returns:
+            dict: {"ids", "distances", "dates"} - 거리 오름차순
+        """
+        return self.search_backend.search(query_embeddings, date_int, n_results)[0]
+
+    def _hybrid_search(self, query_text, query_embeddings, date_int, top_k):
+        """
+        dense 후보와 BM25 후보를 HYBRID_CANDIDATES개씩 가져와 결합 점수로 상위 top_k를 고릅니다.
+        결합 점수는 쿼리마다 min-max 정규화된 값이라 순서를 정하는 데만 쓰고, 반환하는 점수는 dense similarity입니다.
+
+        Returns:
+            tuple: (ids, dates, similarity) - 결합 점수 내림차순. similarity는 트레이스를 켰을 때만 계산 (아니면 None)
+        """
+        n_candidates = max(top_k, HYBRID_CANDIDATES)
+        with span("ann", backend=self.backend):
+            hits = self._dense_search(query_embeddings, date_int, n_candidates)
+        dense = {
+            "ids": hits['ids'],
+            "scores": distance_to_similarity(hits['distances'], self.hnsw_config["space"]),
+            "dates": hits['dates']
+        }
+        with span("bm25_fusion"):
+            lexical = self.bm25_index.search([query_text], date_int, n_candidates)[0]
+            fused = fuse_candidates(dense, lexical, HYBRID_ALPHA, n_results=top_k)
+        if self.tracer is None:
+            return fused['ids'], fused['dates'], None
+        # BM25 후보에만 있던 리뷰는 임베딩 거리로 dense similarity를 채움
+        similarity = fused['similarity']
+        lexical_only = np.isnan(similarity)
+        if lexical_only.any():
+            similarity[lexical_only] = maxsim_similarity(query_embeddings, self.vector_index, fused['ids'][lexical_only])
+        return fused['ids'], fused['dates'], similarity
+
+    def sweep_reviews(self, query_texts, simulation_dates, top_k=5):
+        """
+        시뮬레이션 달력 전체를 한 번에 훑으며 날짜별 검색 결과를 만듭니다 (Date Sweep).
+
+        날짜는 증가만 하므로 d+1일의 top-k는 (d일의 top-k ∪ (d, d+1] 사이에 작성된 리뷰)의 top-k와 같습니다.
+        쿼리마다 top-k 힙을 유지하면서 새로 추가된 리뷰만 점수를 계산하므로,
+        날짜 수만큼 독립적인 필터 검색을 하는 대신 코퍼스를 한 번만 읽습니다.
+
+        검색 백엔드와 관계없이 날짜순 인덱스(self.vector_index, 없으면 컬렉션에서 내보내 생성)를 훑는 exact 검색이므로,
+        근사 백엔드("chroma", "sharded", "faiss", "quantized")에서는 retrieve_reviews()의 날짜별 결과와 다를 수 있습니다
+        (bruteforce 백엔드에서만 같음).
+
+        Args:
+            query_texts (list): 검색할 쿼리 텍스트 리스트
+            simulation_dates (list): 시뮬레이션 날짜 리스트 (YYYY-MM-DD 형식)
+            top_k (int): 날짜별 반환할 상위 결과 개수
+
+        Returns:
+            dict: {쿼리: {날짜: retrieve_reviews()와 같은 형식의 리스트}}
+        """
+        query_texts = list(dict.fromkeys(query_texts))
+        if self.fusion == "hybrid":
+            # BM25 점수는 날짜별 결과 집합 안에서 정규화되므로 누적 힙을 쓸 수 없음 → 날짜별 검색
+            return {
+                query: {date_str: self.retrieve_reviews(query, date_str, top_k) for date_str in simulation_dates}
+                for query in query_texts
+            }
+        if self.backend != "bruteforce":
+            print(f"⚠️  Date sweep scans the exact date-sorted index; results may differ from the '{self.backend}' backend's per-date search.")
+        index = self.vector_index
+        query_embeddings = self.query_embedder.embed(query_texts)
+
+        # 쿼리별 최대 힙: (-distance, -row) → heap[0]이 현재 top-k 중 가장 먼 후보
+        heaps = [[] for _ in query_texts]
+        snapshots = {}
+        prev_end = 0
+        for date_str in sorted(set(simulation_dates)):
+            end = index.prefix_length(int(date_str.replace("-", "")))
+
+            # (이전 날짜, 현재 날짜] 사이에 새로 작성된 리뷰만 점수 계산
+            for block_start, dist in index.iter_distances(query_embeddings, end, start=prev_end):
+                k = min(top_k, dist.shape[1])
+                if k <= 0:
+                    continue
+                block_top = np.argpartition(dist, k - 1, axis=1)[:, :k]
+                for q, heap in enumerate(heaps):
+                    for col in block_top[q]:
+                        item = (-float(dist[q, col]), -(block_start + int(col)))
+                        if len(heap) < top_k:
+                            heapq.heappush(heap, item)
+                        elif item > heap[0]:
+                            heapq.heapreplace(heap, item)
+            prev_end = end
+
+            snapshots[date_str] = [[-row for _, row in sorted(heap, reverse=True)] for heap in heaps]
+
+        # 선택된 리뷰의 스니펫은 한 번에 조회
+        all_rows = sorted({row for rows_per_query in snapshots.values() for rows in rows_per_query for row in rows})
+        docs = dict(zip(all_rows, self.fetch_snippets(index.ids[all_rows]))) if all_rows else {}
+
+        results = {query: {} for query in query_texts}
+        for date_str in simulation_dates:
+            for query, rows in zip(query_texts, snapshots[date_str]):
+                results[query][date_str] = [format_review(docs[row], index.dates[row]) for row in rows]
+        return results
 
 if __name__ == "__main__":
     # 테스트 코드 (Test Code)
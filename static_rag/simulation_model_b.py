@@ -2,7 +2,6 @@ import os
 import sys
 import json
 import pandas as pd
-import random
 from openai import OpenAI
 
 # 프로젝트 루트 경로 추가
@@ -11,9 +10,10 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 from utils.persona_generator import generate_balanced_personas, Persona
-from utils.search_queries import GAMER_TYPE_QUERIES, GENERAL_QUERY
 from utils.llm_config import get_llm_client, TEMPERATURE
 from static_rag.rag_modules import RAGRetriever
+from utils.retrieval_server import RemoteRetriever
+from utils.retrieval_plan import RetrievalPlan
 
 # 1. LLM 클라이언트 초기화 (공통 모듈 사용)
 client, MODEL_NAME = get_llm_client()
@@ -21,6 +21,8 @@ print(f"✅ Using model: {MODEL_NAME} (Team 2)")
 
 OUTPUT_FILE = "static_rag/Team2_StaticRAG_Results.csv"
 SIMULATION_DATES_FILE = "datasets/simulation_dates.csv"
+# 검색 서버 주소 (설정 시 utils/retrieval_server.py 서버를 공유하여 모델/DB 로드를 생략)
+RETRIEVAL_SERVER_URL = os.getenv("RETRIEVAL_SERVER_URL")
 
 # =============================================================================
 # 2. 프롬프트 생성
@@ -74,14 +76,25 @@ def call_llm(prompt: str) -> dict:
 # 4. 메인 실행 (Main Execution)
 # =============================================================================
 
-def run_experiment_b_rag(n_per_type: int = 13):
+def run_experiment_b_rag(n_per_type: int = 13, date_sweep: bool = False):
+    """
+    쿼리는 시작 전에 모든 (에이전트, 날짜)에 대해 미리 선정하고(utils/retrieval_plan.py),
+    날짜마다 에이전트들이 고른 distinct 쿼리만 한 번의 배치 검색으로 처리합니다.
+
+    Args:
+        n_per_type: 게이머 유형별 에이전트 수
+        date_sweep: True이면 사용되는 모든 쿼리의 날짜별 검색 결과를 시작 전에 한 번의 Date Sweep으로 미리 계산
+            (날짜마다 독립적인 필터 검색을 하지 않고 코퍼스를 한 번만 읽음).
+            Date Sweep은 날짜순 인덱스(datasets/vector_index/)를 로드해 exact top-k를 계산하므로,
+            근사 백엔드(기본 "chroma" HNSW)의 날짜별 검색 결과와 다를 수 있음 (RETRIEVAL_BACKEND = "bruteforce"에서만 같음)
+    """
     print("=" * 70)
     print(f"Task 2: Static RAG Simulation")
     print("=" * 70)
 
     # RAG 검색기 초기화
     print("Initializing RAG Retriever...")
-    retriever = RAGRetriever()
+    retriever = RemoteRetriever("static", RETRIEVAL_SERVER_URL) if RETRIEVAL_SERVER_URL else RAGRetriever()
 
     # 날짜 로드
     dates_df = pd.read_csv(SIMULATION_DATES_FILE)
@@ -92,6 +105,16 @@ def run_experiment_b_rag(n_per_type: int = 13):
     personas = generate_balanced_personas(n_per_type=n_per_type) 
     print(f"Generated {len(personas)} agents.")
 
+    # 1. 쿼리 선정 (Team 3 방식: 4개 랜덤 + 일반 쿼리) - 모든 (에이전트, 날짜)에 대해 미리 선정
+    plan = RetrievalPlan(personas, simulation_dates)
+    print(plan.summary())
+
+    sweep_results = None
+    if date_sweep:
+        sweep_queries = list(dict.fromkeys(q for queries in plan.date_queries.values() for q in queries))
+        print(f"Running date sweep: {len(sweep_queries)} queries × {len(simulation_dates)} dates...")
+        sweep_results = retriever.sweep_reviews(sweep_queries, simulation_dates, top_k=2)
+
     results = []
     
     # 시뮬레이션 루프
@@ -100,28 +123,23 @@ def run_experiment_b_rag(n_per_type: int = 13):
 
     for date_str in simulation_dates:
         print(f"\n📅 Date: {date_str}")
+
+        # 2. 검색 (Team 2 정적 로직)
+        # 쿼리당 상위 k개를 검색하고 합침
+        # Team 3는 쿼리당 CANDIDATE_POOL_SIZE개(time_aware_rag/rag_modules.py, 기본 300) 후보를 검색 후 시간 감쇠(Time-Decay) 랭킹을 적용하지만,
+        # Team 2는 유사도(Similarity) 기반 상위 k개를 검색
+        # 같은 날짜에 여러 에이전트가 고른 쿼리는 한 번만 검색 ("- [Date] text..." 형식)
+        date_queries = plan.date_queries[date_str]
+        if sweep_results is not None:
+            query_results = {query: sweep_results[query][date_str] for query in date_queries}
+        else:
+            query_results = dict(zip(date_queries, retriever.retrieve_reviews_batch(date_queries, date_str, top_k=2)))
         
         for persona in personas:
             step_count += 1
-            # 1. 쿼리 선정 (Team 3 방식: 4개 랜덤 + 일반 쿼리)
-            agent_queries = GAMER_TYPE_QUERIES.get(persona.gamer_type, [])
-            selected_queries = []
-            if len(agent_queries) >= 4:
-                selected_queries = random.sample(agent_queries, 4)
-            else:
-                selected_queries = agent_queries # Fallback
-            selected_queries.append(GENERAL_QUERY)
-            
-            # 2. 검색 (Team 2 정적 로직)
-            # 쿼리당 상위 k개를 검색하고 합침
-            # Team 3는 쿼리당 100개를 검색 후 시간 감쇠(Time-Decay) 랭킹을 적용하지만,
-            # Team 2는 유사도(Similarity) 기반 상위 k개를 검색
-            
             candidates = []
-            for query in selected_queries:
-                # retrieve_reviews 함수는 "- [Date] text..." 형식을 반환
-                reviews = retriever.retrieve_reviews(query, date_str, top_k=2)
-                candidates.extend(reviews)
+            for query in plan.queries_for(persona, date_str):
+                candidates.extend(query_results[query])
             
             # 중복 제거 (단순 집합 사용)
             unique_candidates = list(set(candidates))
@@ -150,6 +168,8 @@ def run_experiment_b_rag(n_per_type: int = 13):
                 "Reasoning": res.get("reasoning", "")
             })
 
+    retriever.close()
+
     # 결과 저장
     df = pd.DataFrame(results)
     df.to_csv(OUTPUT_FILE, index=False, encoding="utf-8-sig")
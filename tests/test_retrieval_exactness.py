@@ -0,0 +1,114 @@
+"""
+Exact 검색 경로 일치 테스트
+임시 디렉토리에 합성 컬렉션(랜덤 단위 벡터 + 날짜)과 카탈로그 쿼리 임베딩 캐시를 만들고,
+bruteforce 백엔드에서 다음 경로가 코퍼스 전체를 후보 풀로 쓴 결과와 같은지 확인합니다.
+
+- candidate_mode="adaptive"의 단계적 후보 검색 top-k
+- candidate_mode="decay_index"의 사전 정렬 목록 top-k
+- Static RAG의 Date Sweep 결과 == 날짜별 retrieve_reviews() 결과
+
+실행:
+    python -m pytest tests/
+"""
+import os
+import sys
+import random
+import hashlib
+import datetime
+import numpy as np
+import pytest
+import chromadb
+
+# 프로젝트 루트 경로 추가
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.search_queries import GAMER_TYPE_QUERIES
+from utils.retrieval_plan import select_agent_queries
+from utils.query_embedding_cache import build_query_embedding_cache
+from utils.embedding_backend import get_embedding_cache_tag
+
+N_REVIEWS = 2000
+DIM = 16
+TOP_K = 5
+DATES = ["2020-12-03", "2021-06-01", "2022-03-01", "2024-08-01"]
+DECAY_RATES = [0.0, 0.01, 0.1]
+
+
+def fake_embedding_fn(texts):
+    """텍스트별로 고정된 랜덤 단위 벡터 (모델 없이 쿼리 임베딩 캐시 생성)"""
+    vectors = []
+    for text in texts:
+        seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+        v = np.random.default_rng(seed).normal(size=DIM).astype(np.float32)
+        vectors.append(v / np.linalg.norm(v))
+    return vectors
+
+
+@pytest.fixture(scope="module")
+def workdir(tmp_path_factory):
+    """datasets/chroma_db에 합성 컬렉션, datasets/query_embeddings에 쿼리 캐시를 만든 작업 디렉토리로 이동"""
+    from time_aware_rag import rag_modules
+
+    path = tmp_path_factory.mktemp("retrieval")
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(N_REVIEWS, DIM)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    start = datetime.date(2020, 12, 1)
+    dates = [int((start + datetime.timedelta(days=int(d))).strftime("%Y%m%d")) for d in rng.integers(0, 1370, N_REVIEWS)]
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(path)
+        client = chromadb.PersistentClient(path=os.path.join("datasets", "chroma_db"))
+        collection = client.create_collection(rag_modules.COLLECTION_NAME, embedding_function=None,
+                                              metadata={"hnsw:space": "l2"})
+        for offset in range(0, N_REVIEWS, 1000):
+            rows = range(offset, min(offset + 1000, N_REVIEWS))
+            collection.add(
+                ids=[f"review_{i}" for i in rows],
+                embeddings=embeddings[offset:offset + len(rows)].tolist(),
+                documents=[f"review {i}" for i in rows],
+                metadatas=[{"date": dates[i]} for i in rows]
+            )
+        build_query_embedding_cache(
+            get_embedding_cache_tag(rag_modules.EMBEDDING_MODEL_NAME, rag_modules.EMBEDDING_BACKEND), fake_embedding_fn
+        )
+        yield path
+
+
+@pytest.fixture(scope="module")
+def agent_queries():
+    rng = random.Random(0)
+    return [list(dict.fromkeys(select_agent_queries(gamer_type, rng))) for gamer_type in GAMER_TYPE_QUERIES]
+
+
+def ranked_ids(ranked):
+    return [list(r['ids']) for r in ranked]
+
+
+def full_pool_ranking(retriever, agent_queries, date, decay_rate):
+    """코퍼스 전체를 쿼리당 후보 풀로 쓴 exact 결과"""
+    return ranked_ids(retriever.rank_agent_queries(agent_queries, date, TOP_K, decay_rate, n_results=N_REVIEWS))
+
+
+@pytest.mark.parametrize("candidate_mode", ["adaptive", "decay_index"])
+def test_candidate_mode_matches_full_pool(workdir, agent_queries, candidate_mode):
+    from time_aware_rag.rag_modules import RAGRetriever
+
+    with RAGRetriever("bruteforce") as exact, RAGRetriever("bruteforce", candidate_mode=candidate_mode) as retriever:
+        for date in DATES:
+            for decay_rate in DECAY_RATES:
+                expected = full_pool_ranking(exact, agent_queries, date, decay_rate)
+                got = ranked_ids(retriever.rank_agent_queries(agent_queries, date, TOP_K, decay_rate))
+                assert got == expected, (date, decay_rate)
+
+
+def test_date_sweep_matches_per_date_search(workdir):
+    from static_rag.rag_modules import RAGRetriever
+    from utils.search_queries import GENERAL_QUERY
+
+    queries = [GENERAL_QUERY] + [queries[0] for queries in GAMER_TYPE_QUERIES.values()]
+    with RAGRetriever("bruteforce") as retriever:
+        swept = retriever.sweep_reviews(queries, DATES, top_k=TOP_K)
+        for query in queries:
+            for date in DATES:
+                assert swept[query][date] == retriever.retrieve_reviews(query, date, top_k=TOP_K), (query, date)
@@ -5,6 +5,23 @@ from datetime import datetime
 import os
 import argparse
 import sys
+
+# 프로젝트 루트 경로 추가 (utils 모듈 import를 위해)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.collection_config import (
+    build_collection_metadata, add_index_arguments, check_unit_norm,
+    DEFAULT_SPACE, DEFAULT_HNSW_M, DEFAULT_EF_CONSTRUCTION, DEFAULT_EF_SEARCH
+)
+from utils.embedding_backend import load_embedding_function, load_query_embedding_function, EMBEDDING_BACKENDS
+from utils.text_store import (SnippetStore, ReviewTextStore, TextStoreWriter, get_snippet_store_path,
+                              get_review_text_store_path)
+from utils.bm25_index import BM25Index, get_bm25_index_path
+from utils.time_shards import build_time_shards, SHARD_GRANULARITIES
+from utils.rescore_index import build_rescore_index, get_rescore_index_path
+from utils.embedding_projection import (
+    ProjectedEmbeddingFunction, fit_projection, save_projection_report, get_projection_path, PROJECTION_METHODS
+)
 # torch는 로컬 모델 사용 시에만 필요 (조건부 import)
 try:
     import torch
@@ -92,18 +109,63 @@ class CustomEmbeddingFunction(embedding_functions.EmbeddingFunction):
         embeddings = self.model.encode(input, convert_to_tensor=False).tolist()
         return embeddings
 
-def build_chroma_db(test_mode=False):
+def build_chroma_db(test_mode=False, space=DEFAULT_SPACE, hnsw_m=DEFAULT_HNSW_M,
+                    ef_construction=DEFAULT_EF_CONSTRUCTION, ef_search=DEFAULT_EF_SEARCH, embedding_backend="torch", shard_by=None,
+                    rescore_model=None, reduce_dim=None, reduction="pca"):
+    """
+    Args:
+        space: 거리 함수 ("l2", "cosine", "ip")
+        hnsw_m: HNSW 그래프 차수 M (클수록 recall ↑, 메모리/빌드 시간 ↑)
+        ef_construction: 빌드 시 탐색 폭
+        ef_search: 검색 시 탐색 폭 (클수록 recall ↑, 지연 ↑)
+        embedding_backend: 임베딩 백엔드 ("torch", "onnx", "onnx-int8"). CUDA가 없는 CPU ingest에서는 onnx-int8 권장
+        shard_by: None, "month" 또는 "quarter" (지정하면 시간 샤드 컬렉션 + manifest도 생성, utils/time_shards.py)
+        rescore_model: 2단계 임베딩 캐스케이드용 큰 모델 경로 (예: models/Qwen3-Embedding-8B).
+            지정하면 컬렉션은 all-MiniLM-L6-v2로 만들고, 이 모델의 문서 벡터는 재점수화 인덱스로 따로 저장 (utils/rescore_index.py)
+        reduce_dim: 컬렉션에 저장할 임베딩 차원 (예: 256). 지정하면 리뷰 샘플로 투영을 학습하여 컬렉션과 함께 저장하고
+            RAGRetriever가 쿼리에도 같은 투영을 적용 (utils/embedding_projection.py)
+        reduction: 차원 축소 방식 ("pca" 또는 Matryoshka 모델용 "truncate")
+    """
     # ChromaDB 클라이언트 초기화
     client = chromadb.PersistentClient(path=DB_PATH)
     
     # 임베딩 함수 설정 (Local Qwen Model)
     # torch는 로컬 모델 사용 시에만 필요
-    if os.path.exists(MODEL_PATH):
+    if rescore_model:
+        # 캐스케이드: 후보 생성은 가벼운 MiniLM 컬렉션, 큰 모델은 문서 벡터만 따로 저장
+        print(f"Using all-MiniLM-L6-v2 for the collection; {rescore_model} vectors are stored for re-scoring.")
+        ef = load_embedding_function("all-MiniLM-L6-v2", embedding_backend)
+    elif os.path.exists(MODEL_PATH) and embedding_backend == "torch":
         print(f"Found local model at {MODEL_PATH}, using CustomEmbeddingFunction.")
         ef = CustomEmbeddingFunction(model_path=MODEL_PATH)
+    elif os.path.exists(MODEL_PATH):
+        # ONNX Runtime으로 내보낸 모델 사용 (models/onnx/에 한 번만 내보냄)
+        print(f"Found local model at {MODEL_PATH}, using ONNX Runtime backend ({embedding_backend}).")
+        ef = load_embedding_function(MODEL_PATH, embedding_backend, trust_remote_code=True)
     else:
         print(f"Warning: Local model not found at {MODEL_PATH}. Falling back to default {MODEL_NAME}.")
-        ef = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+        ef = load_embedding_function("all-MiniLM-L6-v2", embedding_backend)
+
+    df = process_reviews(CSV_PATH)
+
+    if test_mode:
+        print("Test mode: Processing only first 5000 records.")
+        df = df.head(5000)
+
+    projection = None
+    if reduce_dim:
+        # 원본 임베딩 샘플로 투영 학습 → 컬렉션에는 축소된 임베딩만 저장
+        # 투영에는 로드 가능한 모델 경로를 기록 (RAGRetriever가 이 모델의 쿼리 경로로 쿼리를 인코딩)
+        base_model = MODEL_PATH if os.path.exists(MODEL_PATH) and not rescore_model else "all-MiniLM-L6-v2"
+        projection, projection_report = fit_projection(
+            ef, df['Review'].astype(str).tolist(), reduce_dim, reduction, model_name=base_model,
+            query_embedding_fn=load_query_embedding_function(base_model, embedding_backend)
+        )
+        save_projection_report(projection_report, COLLECTION_NAME)
+        ef = ProjectedEmbeddingFunction(ef, projection)
+
+    # l2 / ip similarity 변환의 정규화 가정 확인 (기존 컬렉션을 지우기 전에)
+    check_unit_norm(ef, df['Review'].astype(str).tolist(), space)
     
     # 스키마 초기화를 위해 항상 기존 컬렉션 삭제
     try:
@@ -112,13 +174,17 @@ def build_chroma_db(test_mode=False):
     except Exception as e:
         print(f"Collection deletion skipped: {e}")
 
-    collection = client.create_collection(name=COLLECTION_NAME, embedding_function=ef)
-    
-    df = process_reviews(CSV_PATH)
-    
-    if test_mode:
-        print("Test mode: Processing only first 5000 records.")
-        df = df.head(5000)
+    # 거리 함수와 HNSW 파라미터를 컬렉션 메타데이터에 기록 (검색 시 RAGRetriever가 다시 읽음)
+    index_metadata = build_collection_metadata(space, hnsw_m, ef_construction, ef_search)
+    print(f"Index settings: {index_metadata}")
+    collection = client.create_collection(name=COLLECTION_NAME, embedding_function=ef, metadata=index_metadata)
+    if projection is not None:
+        # 컬렉션 ID를 함께 저장하여 투영 없이 다시 만든 컬렉션에는 적용되지 않도록 함
+        projection.collection_id = str(collection.id)
+        projection.save(get_projection_path(COLLECTION_NAME))
+    elif os.path.exists(get_projection_path(COLLECTION_NAME)):
+        # 이전 빌드의 투영은 새 컬렉션과 맞지 않으므로 제거
+        os.remove(get_projection_path(COLLECTION_NAME))
     
     batch_size = 512
     total_docs = len(df)
@@ -126,6 +192,12 @@ def build_chroma_db(test_mode=False):
     documents = []
     metadatas = []
     ids = []
+    # mmap 텍스트 저장소 (원문 전체 + 검색 2단계 fetch용 400자 스니펫)는 리뷰마다 파일에 바로 이어 씀
+    # BM25 역색인용으로는 ID / 날짜만 모으고 원문은 저장소에서 다시 읽음
+    text_writer = TextStoreWriter(ReviewTextStore, get_review_text_store_path(COLLECTION_NAME))
+    snippet_writer = TextStoreWriter(SnippetStore, get_snippet_store_path(COLLECTION_NAME))
+    store_ids = []
+    store_dates = []
     
     print("Starting ingestion...")
     
@@ -168,6 +240,10 @@ def build_chroma_db(test_mode=False):
         documents.append(review_text)
         metadatas.append(metadata)
         ids.append(doc_id)
+        text_writer.add(doc_id, review_text)
+        snippet_writer.add(doc_id, review_text)
+        store_ids.append(doc_id)
+        store_dates.append(date_int)
         
         if len(documents) >= batch_size:
             collection.add(
@@ -189,6 +265,21 @@ def build_chroma_db(test_mode=False):
     
     print(f"\nIngestion complete. Total documents in collection: {collection.count()}")
 
+    text_store = text_writer.close(collection_id=str(collection.id))
+    snippet_writer.close(collection_id=str(collection.id))
+    store_texts = text_store.view(store_ids)
+    BM25Index.build(store_ids, store_texts, store_dates, collection_id=str(collection.id)).save(
+        get_bm25_index_path(COLLECTION_NAME)
+    )
+    if rescore_model:
+        # 큰 모델은 ingest 때 문서마다 한 번만 실행 (검색 시에는 후보 행만 읽어 재점수화)
+        rescore_fn = load_embedding_function(rescore_model, embedding_backend, trust_remote_code=True)
+        build_rescore_index(store_ids, store_dates, store_texts, rescore_fn,
+                            get_rescore_index_path(COLLECTION_NAME, rescore_model), collection_id=str(collection.id))
+    if shard_by:
+        # 임베딩을 다시 계산하지 않고 방금 만든 컬렉션에서 샤드로 복사
+        build_time_shards(client, collection, shard_by)
+
     if test_mode:
         verify_insertion(collection)
 
@@ -205,6 +296,24 @@ def verify_insertion(collection):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Build ChromaDB from new reviews CSV.')
     parser.add_argument('--test', action='store_true', help='Run in test mode')
+    add_index_arguments(parser)
+    parser.add_argument('--embedding-backend', choices=EMBEDDING_BACKENDS, default="torch", help='Embedding backend')
+    parser.add_argument('--shard-by', choices=SHARD_GRANULARITIES, default=None, help='Also build per-month / per-quarter shard collections')
+    parser.add_argument('--rescore-model', default=None,
+                        help='Build a MiniLM collection and store this model\'s document vectors for re-scoring (e.g. models/Qwen3-Embedding-8B)')
+    parser.add_argument('--reduce-dim', type=int, default=None, help='Store embeddings reduced to this dimension (e.g. 256)')
+    parser.add_argument('--reduction', choices=PROJECTION_METHODS, default="pca", help='Dimensionality reduction method')
     args = parser.parse_args()
     
-    build_chroma_db(test_mode=args.test)
+    build_chroma_db(
+        test_mode=args.test,
+        space=args.space,
+        hnsw_m=args.hnsw_m,
+        ef_construction=args.ef_construction,
+        ef_search=args.ef_search,
+        embedding_backend=args.embedding_backend,
+        shard_by=args.shard_by,
+        rescore_model=args.rescore_model,
+        reduce_dim=args.reduce_dim,
+        reduction=args.reduction
+    )
@@ -1,19 +1,69 @@
 import chromadb
 import os
 import sys
+import time
 import random
+import threading
 import numpy as np
 import pandas as pd
-from chromadb.utils import embedding_functions
 
 # 프로젝트 루트 경로 추가 (모듈 import를 위해)
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils.search_queries import GAMER_TYPE_QUERIES, GENERAL_QUERY
+from utils.query_embedding_cache import QueryEmbedder
+from utils.embedding_projection import EmbeddingProjection, load_projected_query_embedder
+from utils.date_utils import yyyymmdd_to_epoch_days
+from utils.vector_index import DateSortedIndex
+from utils.decay_index import DecayRankedIndex
+from utils.collection_config import get_hnsw_config, distance_to_similarity
+from utils.embedding_backend import load_embedding_function, get_embedding_cache_tag
+from utils.text_store import SnippetStore, ReviewTextStore, get_review_text_store_path, SNIPPET_LENGTH
+from utils.bm25_index import BM25Index, fuse_candidates, HYBRID_ALPHA
+from utils.search_backends import load_search_backend, SEARCH_BACKENDS
+from utils.query_fusion import (fuse_query_embeddings, maxsim_similarity, validate_query_fusion,
+                                FUSED_CANDIDATE_POOL_SIZE)
+from utils.rescore_index import load_rescore_index, rescore_similarity
+from utils.retrieval_trace import RetrievalTraceWriter
+from utils.span_tracer import span
+from utils.micro_batcher import MicroBatcher
 
 # ChromaDB 경로 및 컬렉션 설정
 CHROMA_DB_PATH = "datasets/chroma_db"
 COLLECTION_NAME = "cyberpunk2077_reviews"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# 쿼리 임베딩 백엔드: "torch", "onnx", "onnx-int8" (utils/embedding_backend.py)
+EMBEDDING_BACKEND = "torch"
+# 검색 백엔드: "chroma" (HNSW + where 필터), "bruteforce" (날짜순 정렬 exact 인덱스),
+# "sharded" (월 / 분기 샤드 컬렉션 중 날짜 이전 샤드만 병렬 검색, utils/time_shards.py)
+# "faiss" (날짜순 ID 범위 selector를 쓰는 IVF 인덱스, utils/search_backends.py)
+# 또는 "quantized" (int8 / binary 압축 코드로 1차 검색 후 shortlist만 float32 재점수화, utils/quantized_index.py)
+RETRIEVAL_BACKEND = "chroma"
+# 후보 생성 방식
+# - "pool": 쿼리당 CANDIDATE_POOL_SIZE개 후보를 검색한 뒤 similarity × time_factor로 재랭킹
+# - "decay_index": 쿼리별 sim·exp(λt) 사전 정렬 목록(utils/decay_index.py)에서 exact top-k
+# - "adaptive": ADAPTIVE_POOL_START개부터 후보 풀을 두 배씩 늘리며, k번째 최종 점수가
+#   아직 보지 않은 후보가 가질 수 있는 최대 점수(마지막 후보의 similarity × 1) 이상이 되면 중단
+#   (후보가 정확한 거리 순서로 오는 bruteforce 백엔드, 또는 faiss의 exact 구간에서만 exact top-k.
+#    chroma / sharded HNSW, faiss IVF, quantized 결과는 근사이므로 중단 조건도 근사)
+CANDIDATE_MODE = "pool"
+CANDIDATE_POOL_SIZE = 300
+ADAPTIVE_POOL_START = 32
+# adaptive 모드의 쿼리당 최대 후보 수 (근사 백엔드에서 상한이 줄지 않아 풀이 계속 커지는 것을 방지)
+ADAPTIVE_POOL_MAX = 4096
+# sharded 백엔드의 샤드 건너뛰기 (utils/time_shards.py): True면 k번째 감쇠 점수를 넘을 수 없는 오래된 샤드를 검색하지 않음.
+# 이때 후보 풀은 "거리 상위 CANDIDATE_POOL_SIZE개"가 아니라 "검색한 샤드 후보 중 감쇠 점수 상위 CANDIDATE_POOL_SIZE개"가 되어
+# 다른 백엔드의 pool 모드와 결과가 달라질 수 있으므로 기본값은 False (같은 후보 풀 의미)
+SHARD_PRUNING = False
+# 점수 결합 방식: "dense" (임베딩 유사도만) 또는 "hybrid" (임베딩 + BM25 결합 점수로 후보 풀을 고른 뒤 dense similarity에 time_factor 적용)
+FUSION_MODE = "dense"
+# 2단계 임베딩 캐스케이드 재점수화 모델 (None이면 사용 안 함, 예: os.path.join("models", "Qwen3-Embedding-8B"))
+# 지정하면 MiniLM 후보 풀의 similarity를 ingest 때 저장한 이 모델의 문서 벡터로 다시 계산 (utils/rescore_index.py)
+RESCORE_MODEL = None
+# 재점수화 모델의 쿼리 프롬프트 이름 (Qwen3-Embedding은 쿼리 인코딩에 "query" 프롬프트 사용)
+RESCORE_QUERY_PROMPT = "query"
+# 검색 트레이스 디렉토리 (설정하면 task별 최종 리뷰 / 점수 / 지연을 Parquet로 기록, utils/retrieval_trace.py)
+RETRIEVAL_TRACE_DIR = os.getenv("RETRIEVAL_TRACE_DIR")
 
 def get_chroma_client():
     """ChromaDB PersistentClient 반환"""
@@ -23,32 +73,158 @@ def get_chroma_client():
     return client
 
 def get_embedding_function():
-    """SentenceTransformer 임베딩 함수 반환"""
-    return embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
+    """SentenceTransformer 임베딩 함수 반환 (EMBEDDING_BACKEND에 따라 PyTorch 또는 ONNX Runtime)"""
+    return load_embedding_function(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND)
+
+def get_rescore_embedding_function(model_name_or_path):
+    """재점수화 모델의 쿼리 임베딩 함수 (쿼리 캐시에 없는 쿼리가 들어올 때만 로드)"""
+    return load_embedding_function(model_name_or_path, "torch", trust_remote_code=True, prompt_name=RESCORE_QUERY_PROMPT)
 
 class RAGRetriever:
-    def __init__(self):
-        """RAGRetriever 초기화 및 컬렉션 로드"""
+    def __init__(self, backend: str = RETRIEVAL_BACKEND, candidate_mode: str = CANDIDATE_MODE, fusion: str = FUSION_MODE,
+                 trace_dir: str = RETRIEVAL_TRACE_DIR, rescore_model: str = RESCORE_MODEL):
+        """
+        RAGRetriever 초기화 및 컬렉션 로드 (쿼리 임베딩은 캐시 사용, 모델은 필요할 때만 로드)
+
+        Args:
+            backend: "chroma", "bruteforce" (컬렉션을 날짜순 행렬로 내보내 exact 검색),
+                "sharded" (날짜 이전 시간 샤드만 병렬 검색, 최대 감쇠 점수가 k번째 점수 이하인 샤드는 건너뜀)
+                "faiss" (FAISS IVF, 날짜 필터는 날짜순 내부 ID 범위 selector)
+                또는 "quantized" (int8 / binary 압축 코드 1차 검색 + shortlist float32 재점수화)
+            candidate_mode: "pool", "decay_index" (decay_rate별 사전 정렬 목록으로 exact time-aware top-k)
+                또는 "adaptive" (후보 풀을 단계적으로 늘리며 top-k가 확정되면 중단, exact 백엔드에서만 exact top-k)
+            fusion: "dense" 또는 "hybrid" (dense 후보 풀과 BM25 후보 풀을 정규화 점수로 결합해 후보 풀을 고름, pool 모드 전용)
+            trace_dir: 지정하면 retrieve_reviews(_batch) 결과를 task / 순위별로 Parquet 트레이스에 기록
+            rescore_model: 지정하면 후보 풀의 similarity를 이 모델의 캐시된 문서 / 쿼리 벡터로 다시 계산 (pool / dense 전용)
+        """
+        if backend not in SEARCH_BACKENDS:
+            raise ValueError(f"지원하지 않는 검색 백엔드입니다: {backend}")
+        if candidate_mode not in ("pool", "decay_index", "adaptive"):
+            raise ValueError(f"지원하지 않는 후보 생성 방식입니다: {candidate_mode}")
+        if fusion not in ("dense", "hybrid"):
+            raise ValueError(f"지원하지 않는 점수 결합 방식입니다: {fusion}")
+        if fusion == "hybrid" and candidate_mode != "pool":
+            raise ValueError("hybrid 결합은 pool 후보 생성 방식에서만 사용할 수 있습니다.")
+        if rescore_model and (candidate_mode != "pool" or fusion != "dense"):
+            raise ValueError("재점수화는 pool 후보 생성 방식 / dense 점수 결합에서만 사용할 수 있습니다.")
+
         self.client = get_chroma_client()
-        self.embedding_fn = get_embedding_function()
+        self.query_embedder = QueryEmbedder(get_embedding_cache_tag(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND), get_embedding_function)
         
         try:
+            # query_embeddings를 직접 전달하므로 임베딩 함수는 연결하지 않음
             self.collection = self.client.get_collection(
                 name=COLLECTION_NAME,
-                embedding_function=self.embedding_fn
+                embedding_function=None
             )
             print(f"Collection '{COLLECTION_NAME}' loaded successfully.")
         except Exception as e:
             raise ValueError(f"컬렉션 '{COLLECTION_NAME}'을 로드하는 중 오류가 발생했습니다: {e}")
 
+        # 차원 축소된 컬렉션이면 빌드 시 저장한 투영을 쿼리 임베딩에도 적용 (decay_index도 이 임베딩 사용)
+        # 쿼리는 투영을 학습한 원본 모델(projection.model_name)의 쿼리 경로로 인코딩
+        self.projection = EmbeddingProjection.load_for_collection(self.collection)
+        if self.projection is not None:
+            self.query_embedder = load_projected_query_embedder(self.projection, self.query_embedder, EMBEDDING_BACKEND)
+
+        # 빌드 시 기록된 거리 함수 / HNSW 파라미터 (similarity 변환에 space 사용)
+        self.hnsw_config = get_hnsw_config(self.collection)
+        self.space = self.hnsw_config["space"]
+        print(f"Index settings: {self.hnsw_config}")
+
+        self.backend = backend
+        self.candidate_mode = candidate_mode
+        self.fusion = fusion
+        # 날짜순 인덱스는 bruteforce / faiss / quantized 백엔드와 decay_index 모드에서 사용
+        self.vector_index = None
+        if backend in ("bruteforce", "faiss", "quantized") or candidate_mode == "decay_index":
+            self.vector_index = DateSortedIndex.load_or_build(self.collection)
+        # dense 검색 백엔드 (sharded는 manifest, faiss는 IVF 인덱스가 없으면 컬렉션에서 생성)
+        self.search_backend = load_search_backend(backend, self.client, self.collection, self.space, self.vector_index)
+        # decay_rate별 사전 정렬 인덱스 (처음 사용할 때 로드/생성)
+        self.decay_indexes = {}
+        # 지연 로드(날짜순 인덱스 / decay_index)는 동시에 실행되는 aretrieve_reviews() 배치 스레드 사이에서 한 번만
+        self._lazy_load_lock = threading.Lock()
+        # 최종 top-k의 400자 스니펫 (검색 단계에서는 원문을 받아 오지 않음)
+        self.snippet_store = SnippetStore.load_or_build(self.collection)
+        # 원문 전체 mmap 저장소 (ingest 시 만들어졌으면 사용, 없으면 컬렉션에서 조회)
+        self.text_store = ReviewTextStore.load_for_collection(self.collection, get_review_text_store_path(COLLECTION_NAME))
+        # 키워드 쿼리용 BM25 역색인 (hybrid 모드에서만 로드)
+        self.bm25_index = BM25Index.load_or_build(self.collection) if fusion == "hybrid" else None
+        # 2단계 캐스케이드: 큰 모델의 문서 벡터(ingest 때 저장)와 카탈로그 쿼리 벡터 캐시
+        # (큰 모델은 캐시에 없는 쿼리가 들어올 때만 로드되므로 distinct 쿼리당 한 번만 실행)
+        self.rescore_index = None
+        self.rescore_embedder = None
+        if rescore_model:
+            self.rescore_index = load_rescore_index(self.collection, rescore_model)
+            self.rescore_embedder = QueryEmbedder(get_embedding_cache_tag(rescore_model),
+                                                  lambda: get_rescore_embedding_function(rescore_model))
+        # 검색 트레이스 기록기 (백그라운드 스레드에서 Parquet 저장)
+        self.tracer = RetrievalTraceWriter(trace_dir, "time_aware") if trace_dir else None
+        # aretrieve_reviews()용 micro-batcher (이벤트 루프 안에서 처음 호출될 때 생성)
+        self._batcher = None
+
+    def prepare(self, decay_rate: float = 0.01):
+        """
+        처음 사용할 때 만들어지는 디스크 캐시(쿼리 임베딩 캐시, 재점수화 쿼리 캐시, decay_index)를 미리 만들어 둡니다.
+        RetrieverPool이 워커를 띄우기 전에 부모 프로세스에서 호출하여 워커들이 같은 파일을 동시에 만들지 않도록 합니다.
+        """
+        self.query_embedder.embed([GENERAL_QUERY])
+        if self.rescore_embedder is not None:
+            self.rescore_embedder.embed([GENERAL_QUERY])
+        if self.candidate_mode == "decay_index":
+            self.get_decay_index(decay_rate)
+
+    def close(self):
+        """검색 백엔드(sharded 샤드 검색 스레드 풀)와 검색 트레이스 기록기를 정리합니다."""
+        self.search_backend.close()
+        if self.tracer is not None:
+            self.tracer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get_decay_index(self, decay_rate: float):
+        """decay_rate에 해당하는 DecayRankedIndex 반환 (없으면 만들어 저장)"""
+        if decay_rate not in self.decay_indexes:
+            with self._lazy_load_lock:
+                if decay_rate not in self.decay_indexes:
+                    self.decay_indexes[decay_rate] = DecayRankedIndex.load_or_build(
+                        self.vector_index, self.query_embedder, decay_rate, COLLECTION_NAME
+                    )
+        return self.decay_indexes[decay_rate]
+
+    def fetch_documents(self, ids):
+        """리뷰 ID 목록의 원문을 가져옵니다 (mmap 원문 저장소 → 없으면 컬렉션, 입력 순서 유지)"""
+        ids = [str(i) for i in ids]
+        if not ids:
+            return []
+        documents = self.text_store.get_many(ids) if self.text_store is not None else [None] * len(ids)
+        missing = [i for i, doc in zip(ids, documents) if doc is None]
+        if missing:
+            result = self.collection.get(ids=missing, include=["documents"])
+            fetched = dict(zip(result['ids'], result['documents']))
+            documents = [doc if doc is not None else fetched.get(i, "") for i, doc in zip(ids, documents)]
+        return documents
+
+    def fetch_snippets(self, ids):
+        """리뷰 ID 목록의 앞 400자 스니펫 (스니펫 저장소에 없으면 컬렉션에서 원문 조회, 입력 순서 유지)"""
+        snippets = self.snippet_store.get_many(ids)
+        missing = [i for i, snippet in enumerate(snippets) if snippet is None]
+        if missing:
+            for i, doc in zip(missing, self.fetch_documents([ids[i] for i in missing])):
+                snippets[i] = doc[:SNIPPET_LENGTH]
+        return snippets
+
     # ===========================================================
     # 핵심 차별점: Time-Aware Weighted Score 적용
     # ===========================================================
     # Team 2 (static_rag)와의 차이:
     # - Team 2: 쿼리당 top_k개만 검색, similarity만 사용
-    # - Team 3: 쿼리당 100개 검색 후 similarity × time_factor로 재랭킹
+    # - Team 3: 쿼리당 CANDIDATE_POOL_SIZE개(기본 300) 후보를 검색한 뒤 similarity × time_factor로 재랭킹
     # 
     # Time Decay 공식:
     #   time_factor = exp(-decay_rate * days_diff)
@@ -59,7 +235,130 @@ class RAGRetriever:
     #   - 70일 전: time_factor ≈ 0.50 (50%, half-life)
     #   - 100일 전: time_factor ≈ 0.37 (37%)
     # ===========================================================
-    def retrieve_reviews(self, agent, current_date_str: str, top_k_final: int = 5, decay_rate: float = 0.01):
+    def select_queries(self, agent):
+        """
+        에이전트의 검색 쿼리 선정 (Team 2와 동일: 4개 랜덤 + GENERAL_QUERY)
+        공정성 보장: Team 2와 동일한 쿼리 선택 전략 사용
+        """
+        selected_queries = random.sample(agent.search_queries, min(4, len(agent.search_queries)))
+        selected_queries.append(GENERAL_QUERY)
+        return selected_queries
+
+    def retrieve_candidates(self, queries, current_date_str: str, n_results: int = CANDIDATE_POOL_SIZE, decay_rate: float = 0.01,
+                            prune_k: int = None):
+        """
+        여러 쿼리를 한 번의 멀티 쿼리 Chroma 요청으로 검색합니다.
+        임베딩 조회와 날짜 필터 평가가 요청당 한 번만 일어납니다.
+
+        Args:
+            queries: 검색할 쿼리 텍스트 리스트 (중복은 한 번만 검색)
+            current_date_str: 시뮬레이션 현재 날짜 (YYYY-MM-DD 형식)
+            n_results: 쿼리당 후보 개수 (기본값: 300)
+            decay_rate: decay_index 모드, sharded 백엔드의 샤드 건너뛰기에서 사용할 시간 감쇠율
+            prune_k: sharded 백엔드에서 쿼리별 prune_k번째 감쇠 점수를 넘을 수 없는 샤드는 검색하지 않음
+                (후보가 감쇠 점수 순으로 잘리므로 후보 풀 의미가 달라짐, SHARD_PRUNING 참고)
+                (보통 top_k_final, None이면 날짜 이전 샤드를 모두 검색)
+
+        Returns:
+            dict: {쿼리 텍스트: 후보 집합} 형태. 후보 집합은 병렬 배열로 구성됨
+                - ids (np.ndarray[str]): 리뷰 ID
+                - distances (np.ndarray[float]): Chroma distance
+                - dates (np.ndarray[int]): YYYYMMDD 날짜 (없으면 0)
+                - similarity (np.ndarray[float]): hybrid 모드에서는 dense similarity
+                    (후보 풀은 dense + BM25 결합 점수 상위 n_results개, 순서도 결합 점수 순),
+                    재점수화 사용 시 큰 모델 벡터의 similarity (distances 대신)
+            원문은 가져오지 않으며, 재랭킹 후 최종 행의 스니펫만 fetch_snippets()로 조회합니다.
+        """
+        unique_queries = list(dict.fromkeys(queries))
+        if not unique_queries:
+            return {}
+
+        current_date_int = int(pd.to_datetime(current_date_str).strftime('%Y%m%d'))
+        if self.rescore_index is not None:
+            # 재점수화로 순위가 바뀌므로 MiniLM 감쇠 점수 기준의 샤드 건너뛰기는 사용하지 않음
+            prune_k = None
+        with span("embed"):
+            query_embeddings = self.query_embedder.embed(unique_queries)
+        with span("ann", backend=self.backend):
+            candidates = self._search_candidates(unique_queries, query_embeddings, current_date_int, n_results,
+                                                 decay_rate, prune_k)
+
+        if self.rescore_index is not None:
+            with span("rescore"):
+                return self._rescore(candidates)
+        if self.fusion == "hybrid":
+            with span("bm25_fusion"):
+                return self._fuse_lexical(candidates, query_embeddings, current_date_int, n_results)
+        return candidates
+
+    def _search_candidates(self, unique_queries, query_embeddings, current_date_int, n_results, decay_rate, prune_k):
+        """retrieve_candidates()의 dense 검색 부분 (candidate_mode / backend별)"""
+        if self.candidate_mode == "decay_index":
+            # 사전 정렬 목록: date <= current_date 인 첫 n_results개가 곧 exact time-aware top-k
+            decay_index = self.get_decay_index(decay_rate)
+            hits = [
+                decay_index.search(query, embedding, current_date_int, n_results)
+                for query, embedding in zip(unique_queries, query_embeddings)
+            ]
+            return {
+                query: self._index_candidates(rows, distances)
+                for query, (rows, distances) in zip(unique_queries, hits)
+            }
+
+        # 백엔드별 date <= current_date 필터 검색 (sharded는 k번째 감쇠 점수를 넘을 수 없는 오래된 샤드를 건너뜀)
+        hits = self.search_backend.search(query_embeddings, current_date_int, n_results, decay_rate, prune_k)
+        return dict(zip(unique_queries, hits))
+
+    def _rescore(self, candidates):
+        """쿼리별 후보 집합의 similarity를 재점수화 모델의 쿼리 / 문서 벡터로 계산 (후보 행만 읽음)"""
+        query_embeddings = self.rescore_embedder.embed(list(candidates))
+        return {
+            query: {**c, "similarity": rescore_similarity(self.rescore_index, embedding, c['ids'])}
+            for (query, c), embedding in zip(candidates.items(), query_embeddings)
+        }
+
+    def _fuse_lexical(self, candidates, query_embeddings, current_date_int, n_results):
+        """
+        쿼리별 dense 후보 풀에 같은 크기의 BM25 후보 풀을 결합 (date <= current_date 인 리뷰만)
+        결합 점수 상위 n_results개로 후보 풀을 다시 구성하되, 시간 감쇠에 쓰는 similarity는 dense similarity를 유지합니다
+        (결합 점수는 쿼리마다 min-max 정규화되어 쿼리 간 / dense 점수와 비교할 수 없음).
+        """
+        lexical = self.bm25_index.search(list(candidates), current_date_int, n_results)
+        fused = {}
+        for (query, dense), lexical_hits, embedding in zip(candidates.items(), lexical, query_embeddings):
+            dense = {
+                "ids": dense['ids'],
+                "scores": distance_to_similarity(dense['distances'], self.space),
+                "dates": dense['dates']
+            }
+            hits = fuse_candidates(dense, lexical_hits, HYBRID_ALPHA, n_results=n_results)
+            # BM25 후보에만 있던 리뷰는 임베딩 거리로 dense similarity를 채움
+            lexical_only = np.isnan(hits['similarity'])
+            if lexical_only.any():
+                hits['similarity'][lexical_only] = maxsim_similarity(
+                    embedding, self.get_vector_index(), hits['ids'][lexical_only]
+                )
+            fused[query] = hits
+        return fused
+
+    def get_vector_index(self):
+        """날짜순 인덱스 (bruteforce / faiss / quantized 백엔드 / decay_index 모드가 아니면 처음 필요할 때 로드)"""
+        if self.vector_index is None:
+            with self._lazy_load_lock:
+                if self.vector_index is None:
+                    self.vector_index = DateSortedIndex.load_or_build(self.collection)
+        return self.vector_index
+
+    def _index_candidates(self, rows, distances):
+        """vector_index 행 번호로 후보 집합 구성"""
+        return {
+            "ids": self.vector_index.ids[rows],
+            "distances": np.asarray(distances, dtype=np.float64),
+            "dates": self.vector_index.dates[rows]
+        }
+
+    def retrieve_reviews(self, agent, current_date_str: str, top_k_final: int = 5, decay_rate: float = 0.01,
+                         query_fusion: str = None, queries: list = None):
         """
         Time-Aware Weighted RAG 검색
         
@@ -70,88 +369,288 @@ class RAGRetriever:
             current_date_str: 시뮬레이션 현재 날짜 (YYYY-MM-DD 형식)
             top_k_final: 최종 반환할 리뷰 개수 (기본값: 5)
             decay_rate: 시간 감쇠율 (기본값: 0.01, half-life ≈ 70일)
+            query_fusion: None (쿼리별 검색), "mean" 또는 "maxsim" (선정된 쿼리를 결합 벡터 하나로 검색, utils/query_fusion.py)
+            queries: 이미 선정된 쿼리 리스트 (검색 계획, utils/retrieval_plan.py). 지정하면 그대로 검색하고,
+                None이면 agent.search_queries에서 select_queries()로 선정
         
         Returns:
             list: "- [Date] Review text..." 형식의 리뷰 문자열 리스트
         
         Process:
-            1. 각 쿼리마다 n_results=100으로 넓은 후보 풀 검색
+            1. 선정된 쿼리 전체를 한 번의 요청으로 검색 (쿼리당 n_results=300 후보 풀)
             2. 각 후보에 대해 similarity × time_factor 계산
             3. final_score 기준으로 정렬하여 상위 top_k_final개 선택
             4. 중복 제거 (동일 리뷰는 최고 점수만 유지)
         """
-        # 현재 날짜 처리
-        current_date_obj = pd.to_datetime(current_date_str)
-        current_ts = int(current_date_obj.timestamp())
-        current_date_int = int(current_date_obj.strftime('%Y%m%d'))
+        return self.retrieve_reviews_batch([agent], current_date_str, top_k_final, decay_rate, query_fusion,
+                                           agent_queries=[queries])[0]
 
-        # 쿼리 선정 (Team 2와 동일: 4개 랜덤 + GENERAL_QUERY)
-        # 공정성 보장: Team 2와 동일한 쿼리 선택 전략 사용
-        selected_queries = random.sample(agent.search_queries, min(4, len(agent.search_queries)))
-        selected_queries.append(GENERAL_QUERY)
+    async def aretrieve_reviews(self, agent, current_date_str: str, top_k_final: int = 5, decay_rate: float = 0.01,
+                                query_fusion: str = None, queries: list = None):
+        """
+        retrieve_reviews()의 비동기 버전
+        짧은 시간 안에 들어온 같은 날짜 / 인자의 동시 요청을 모아 retrieve_reviews_batch() 한 번으로 처리합니다.
+        (쿼리 임베딩 조회와 검색이 요청마다가 아니라 배치마다 한 번씩 일어남, utils/micro_batcher.py)
+        """
+        if self._batcher is None:
+            # 배치가 여러 스레드에서 동시에 실행되기 전에 디스크 캐시 / decay_index를 미리 만들어 둠
+            self.prepare(decay_rate)
+            self._batcher = MicroBatcher(lambda key, items: self.retrieve_reviews_batch(
+                [agent for agent, _ in items], *key, agent_queries=[queries for _, queries in items]
+            ))
+        return await self._batcher.submit((current_date_str, top_k_final, decay_rate, query_fusion), (agent, queries))
+
+    def retrieve_reviews_batch(self, agents, current_date_str: str, top_k_final: int = 5, decay_rate: float = 0.01,
+                               query_fusion: str = None, agent_queries: list = None):
+        """
+        같은 날짜의 여러 에이전트 검색을 한 번의 멀티 쿼리 요청으로 처리합니다.
+        에이전트 간에 겹치는 쿼리는 한 번만 검색하고, 재랭킹은 에이전트별로 수행합니다.
+        query_fusion을 지정하면 쿼리별 검색 대신 에이전트마다 결합 벡터 하나로 검색합니다.
+
+        Args:
+            agent_queries: 에이전트별로 이미 선정된 쿼리 리스트 (검색 계획). 지정한 쿼리는 다시 선정하지 않고 그대로 검색하며,
+                None이거나 항목이 None인 에이전트만 select_queries()로 선정
+
+        Returns:
+            list: 에이전트 순서대로 retrieve_reviews()와 같은 형식의 결과 리스트
+        """
+        validate_query_fusion(query_fusion)
+        start = time.perf_counter()
+        agent_queries = [
+            self.select_queries(agent) if queries is None else list(queries)
+            for agent, queries in zip(agents, agent_queries or [None] * len(agents))
+        ]
+        ranked = self.rank_agent_queries(agent_queries, current_date_str, top_k_final, decay_rate, query_fusion)
+        with span("fetch_snippets"):
+            results = [self.format_ranked(r) for r in ranked]
+
+        if self.tracer is not None:
+            # 검색 결과만 큐에 넣고 기록은 백그라운드 스레드에서 (배치 지연을 각 task의 지연으로 기록)
+            latency_ms = (time.perf_counter() - start) * 1000
+            current_date_int = int(pd.to_datetime(current_date_str).strftime('%Y%m%d'))
+            for agent, queries, r in zip(agents, agent_queries, ranked):
+                # 결합 벡터 검색은 후보 집합이 하나이므로 쿼리 열에 선정된 쿼리 전체를 기록
+                queries = ["; ".join(queries)] if query_fusion is not None else queries
+                self.tracer.record(
+                    self.tracer.new_task_id(), current_date_int, r['ids'], r['dates'],
+                    r['similarity'], r['time_factor'], r['final_score'],
+                    [queries[i] for i in r['set_index']], latency_ms,
+                    agent_id=getattr(agent, "id", None), decay_rate=decay_rate
+                )
+        return results
+
+    def rank_agent_queries(self, agent_queries, current_date_str: str, top_k_final: int = 5, decay_rate: float = 0.01,
+                           query_fusion: str = None, n_results: int = None):
+        """
+        에이전트별로 선정된 쿼리를 검색하고 재랭킹합니다 (retrieve_reviews_batch()의 검색 / 재랭킹 단계).
+        스니펫을 꺼내지 않으므로 리뷰 ID 단위로 결과를 비교할 때 사용합니다 (experiment_validation/benchmark_retrieval.py).
+
+        Args:
+            agent_queries: 에이전트별 쿼리 리스트
+            n_results: pool 모드의 쿼리당 후보 수 (None이면 CANDIDATE_POOL_SIZE)
+        Returns:
+            list: 에이전트 순서대로 rank_candidates() 결과
+        """
+        validate_query_fusion(query_fusion)
+        if query_fusion is not None:
+            agent_sets = [[c] for c in self.retrieve_fused_candidates(agent_queries, current_date_str, query_fusion)]
+        else:
+            if self.candidate_mode == "adaptive":
+                candidate_sets = self.retrieve_candidates_adaptive(agent_queries, current_date_str, top_k_final, decay_rate)
+            else:
+                # decay_index 모드는 쿼리별 exact top-k만 있으면 합집합의 top-k도 exact
+                if self.candidate_mode == "decay_index":
+                    n_results = top_k_final
+                candidate_sets = self.retrieve_candidates(
+                    [query for queries in agent_queries for query in queries],
+                    current_date_str,
+                    n_results=CANDIDATE_POOL_SIZE if n_results is None else n_results,
+                    decay_rate=decay_rate,
+                    prune_k=top_k_final if SHARD_PRUNING else None
+                )
+            agent_sets = [[candidate_sets[query] for query in queries] for queries in agent_queries]
+        with span("rerank"):
+            return [
+                self.rank_candidates(candidate_sets, current_date_str, top_k_final, decay_rate)
+                for candidate_sets in agent_sets
+            ]
+
+    def retrieve_fused_candidates(self, agent_queries, current_date_str: str, query_fusion: str = "mean",
+                                  n_results: int = FUSED_CANDIDATE_POOL_SIZE):
+        """
+        에이전트별 쿼리 임베딩을 결합 벡터 하나로 만들어 에이전트당 한 번만 검색합니다.
+        "maxsim"은 같은 후보 풀을 후보마다 쿼리별 similarity의 최댓값으로 다시 점수화합니다 (후보 집합의 similarity).
 
-        candidate_pool = []
+        Args:
+            agent_queries: 에이전트별 쿼리 리스트
+        Returns:
+            list: 에이전트 순서대로 후보 집합 하나씩 (retrieve_candidates()의 후보 집합과 같은 형식)
+        """
+        if self.candidate_mode != "pool" or self.fusion != "dense":
+            raise ValueError("쿼리 결합은 pool 후보 생성 방식 / dense 점수 결합에서만 사용할 수 있습니다.")
+        if self.rescore_index is not None:
+            raise ValueError("쿼리 결합은 재점수화와 함께 사용할 수 없습니다.")
+        current_date_int = int(pd.to_datetime(current_date_str).strftime('%Y%m%d'))
+        unique_queries = list(dict.fromkeys(query for queries in agent_queries for query in queries))
+        with span("embed"):
+            query_embeddings = self.query_embedder.embed(unique_queries)
+        position = {query: i for i, query in enumerate(unique_queries)}
+        agent_embeddings = [query_embeddings[[position[query] for query in queries]] for queries in agent_queries]
 
-        # 각 쿼리마다 넓은 후보 풀 검색 (Team 2는 top_k만, Team 3는 100개)
-        for query in selected_queries:
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=300,  # 넓은 풀에서 검색 (Team 2와의 차이점)
-                include=["documents", "metadatas", "distances"],
-                where={"date": {"$lte": current_date_int}}  # 현재 날짜 이전 리뷰만 (date 필드 사용)
+        with span("ann", backend=self.backend):
+            hits = self.search_backend.search(
+                np.stack([fuse_query_embeddings(e) for e in agent_embeddings]), current_date_int, n_results
             )
+        if query_fusion == "maxsim":
+            for hit, embeddings in zip(hits, agent_embeddings):
+                hit['similarity'] = maxsim_similarity(embeddings, self.get_vector_index(), hit['ids'])
+        return hits
 
-            if results['documents'] and results['documents'][0]:
-                for doc, meta, dist in zip(results['documents'][0], results['metadatas'][0], results['distances'][0]):
-                    # Cosine similarity 계산 (Team 2와 동일)
-                    # ChromaDB의 distance는 cosine distance이므로 similarity = 1 - distance
-                    similarity = max(0, 1 - dist)
-                    
-                    # 시간 차이 계산 (일 단위)
-                    # 메타데이터의 'date' (YYYYMMDD int)를 사용하여 시간 차이 계산
-                    review_date_int = meta.get('date')
-                    if review_date_int:
-                        review_date_str = str(review_date_int)
-                        review_date_obj = pd.to_datetime(review_date_str, format='%Y%m%d')
-                        review_ts = int(review_date_obj.timestamp())
-                    else:
-                        review_ts = current_ts # 날짜 없으면 차이 0으로 가정
-                        review_date_str = "Unknown"
-
-                    days_diff = max(0, (current_ts - review_ts) / (60 * 60 * 24))
-                    
-                    # Time decay factor 계산 (핵심 차별점)
-                    # Exponential decay: 최근 리뷰일수록 높은 가중치
-                    time_factor = np.exp(-decay_rate * days_diff)
-                    
-                    # 최종 점수: similarity × time_factor
-                    # Team 2는 similarity만 사용, Team 3는 여기에 time_factor 곱함
-                    final_score = similarity * time_factor
-
-                    candidate_pool.append({
-                        "review": doc,
-                        "date_str": review_date_str if review_date_int else 'Unknown',
-                        "final_score": final_score,
-                        "similarity": similarity,
-                        "days_diff": int(days_diff)
-                    })
-
-        if not candidate_pool:
-            return []
+    def retrieve_candidates_adaptive(self, agent_queries, current_date_str: str, top_k_final: int = 5,
+                                     decay_rate: float = 0.01):
+        """
+        Threshold Algorithm 방식의 단계적 후보 검색 (candidate_mode="adaptive")
+
+        쿼리별 후보가 정확한 거리 오름차순(= similarity 내림차순)으로 오면, 아직 보지 않은 후보의 최종 점수는
+        그 쿼리의 마지막 후보 similarity × 1 (time_factor ≤ 1)을 넘을 수 없습니다.
+        에이전트마다 k번째 최종 점수가 자기 쿼리들의 이 상한 이상이면 top-k가 확정된 것이고,
+        그렇지 않은 쿼리만 후보 수를 두 배로 늘려 다시 검색합니다 (결과가 n개보다 적으면 후보가 소진된 것).
+
+        이 보장은 exact 백엔드(bruteforce, faiss의 날짜 prefix가 FAISS_EXACT_PREFIX_ROWS 이하인 구간)에서만 성립합니다.
+        HNSW(chroma / sharded), IVF, quantized 결과는 근사 top-n이라 더 가까운 리뷰가 빠져 있을 수 있으므로
+        결과도 근사입니다. 어떤 백엔드든 쿼리당 후보 수는 ADAPTIVE_POOL_MAX를 넘지 않습니다.
+
+        Args:
+            agent_queries: 에이전트별 쿼리 리스트
+        Returns:
+            dict: retrieve_candidates()와 같은 {쿼리 텍스트: 후보 집합}
+        """
+        n_results = dict.fromkeys((query for queries in agent_queries for query in queries), ADAPTIVE_POOL_START)
+        # prune_k 없이 검색 (sharded 샤드 건너뛰기는 후보를 거리 순서가 아닌 감쇠 점수 순서로 병합)
+        candidate_sets = self.retrieve_candidates(list(n_results), current_date_str, ADAPTIVE_POOL_START, decay_rate)
+        while True:
+            grow = set()
+            for queries in agent_queries:
+                ranked = self.rank_candidates([candidate_sets[query] for query in queries], current_date_str,
+                                              top_k_final, decay_rate)
+                kth_score = ranked['final_score'][top_k_final - 1] if len(ranked['ids']) >= top_k_final else -np.inf
+                for query in queries:
+                    distances = candidate_sets[query]['distances']
+                    if len(distances) < n_results[query]:
+                        continue  # date <= current_date 인 리뷰를 모두 봄
+                    if n_results[query] >= ADAPTIVE_POOL_MAX:
+                        continue  # 후보 수 상한
+                    unseen_bound = float(distance_to_similarity(distances[-1], self.space))
+                    if unseen_bound > kth_score:
+                        grow.add(query)
+            if not grow:
+                return candidate_sets
+
+            # 늘린 후보 수가 같은 쿼리끼리 한 번의 요청으로 다시 검색
+            by_size = {}
+            for query in grow:
+                n_results[query] = min(n_results[query] * 2, ADAPTIVE_POOL_MAX)
+                by_size.setdefault(n_results[query], []).append(query)
+            for size, queries in by_size.items():
+                candidate_sets.update(self.retrieve_candidates(queries, current_date_str, size, decay_rate))
+
+    def rerank_candidates(self, candidate_sets, current_date_str: str, top_k_final: int = 5, decay_rate: float = 0.01):
+        """
+        쿼리별 후보 집합을 합쳐 similarity × time_factor로 재랭킹합니다.
+        리뷰 스니펫은 최종 top_k_final개에 대해서만 꺼냅니다.
+
+        Args:
+            candidate_sets: retrieve_candidates()가 반환한 쿼리별 후보 집합 리스트
+        Returns:
+            list: "- [Date] Review text..." 형식의 리뷰 문자열 리스트
+        """
+        return self.format_ranked(self.rank_candidates(candidate_sets, current_date_str, top_k_final, decay_rate))
+
+    def rank_candidates(self, candidate_sets, current_date_str: str, top_k_final: int = 5, decay_rate: float = 0.01):
+        """
+        쿼리별 후보 집합을 합쳐 similarity × time_factor 상위 top_k_final개를 고릅니다.
+        후보 풀은 (ids, similarity, 경과 일수) 병렬 배열로 유지하고 점수는 한 번의 벡터 연산으로 계산합니다.
+
+        Returns:
+            dict: 최종 순위 순서의 병렬 배열
+                - ids, dates, similarity, time_factor, final_score
+                - set_index: 각 리뷰를 가져온 candidate_sets의 위치 (트레이스의 쿼리 기록용)
+        """
+        set_index = np.repeat(np.arange(len(candidate_sets)), [len(c['ids']) for c in candidate_sets])
+        candidate_sets = [c for c in candidate_sets if len(c['ids'])]
+        if not candidate_sets:
+            return self._ranked_rows(np.empty(0, dtype=str), np.empty(0, dtype=np.int64), np.empty(0),
+                                     np.empty(0), np.empty(0), set_index)
+
+        ids = np.concatenate([c['ids'] for c in candidate_sets])
+        dates = np.concatenate([c['dates'] for c in candidate_sets])
+
+        # Similarity 계산 (Team 2와 동일)
+        # 컬렉션의 거리 함수(cosine / ip / l2)에 맞게 distance → similarity 변환
+        # (hybrid / 재점수화 / maxsim 후보 집합은 similarity를 직접 가지고 있음)
+        if all('similarity' in c for c in candidate_sets):
+            similarity = np.concatenate([c['similarity'] for c in candidate_sets])
+        else:
+            similarity = distance_to_similarity(np.concatenate([c['distances'] for c in candidate_sets]), self.space)
+
+        # 시간 차이 계산 (일 단위)
+        # 메타데이터의 'date' (YYYYMMDD int)를 epoch day로 변환, 날짜 없으면 차이 0으로 가정
+        current_day = int(yyyymmdd_to_epoch_days(int(pd.to_datetime(current_date_str).strftime('%Y%m%d'))))
+        review_days = np.where(dates > 0, yyyymmdd_to_epoch_days(dates), current_day)
+        days_diff = np.maximum(0, current_day - review_days)
+
+        # Time decay factor 계산 (핵심 차별점)
+        # Exponential decay: 최근 리뷰일수록 높은 가중치
+        time_factor = np.exp(-decay_rate * days_diff)
+
+        # 최종 점수: similarity × time_factor
+        # Team 2는 similarity만 사용, Team 3는 여기에 time_factor 곱함
+        final_score = similarity * time_factor
+
+        # 중복 제거 및 최고 점수 유지 (리뷰 ID 기준)
+        unique_ids, first_seen, inverse = np.unique(ids, return_index=True, return_inverse=True)
+        best_score = np.full(len(unique_ids), -np.inf)
+        np.maximum.at(best_score, inverse, final_score)
+        # 리뷰별 최고 점수를 가진 후보 행 (동점이면 먼저 나온 행)
+        best_rows = np.nonzero(final_score == best_score[inverse])[0]
+        representative = np.empty(len(unique_ids), dtype=np.int64)
+        representative[inverse[best_rows[::-1]]] = best_rows[::-1]
+
+        # 상위 top_k_final개 선택: argpartition으로 k번째 점수를 구한 뒤 그 이상인 후보만 정렬
+        # (동점은 먼저 검색된 리뷰 우선)
+        k = min(top_k_final, len(unique_ids))
+        if k <= 0:
+            return self._ranked_rows(ids[:0], dates[:0], similarity[:0], time_factor[:0], final_score[:0], set_index[:0])
+        kth_score = best_score[np.argpartition(-best_score, k - 1)[k - 1]]
+        shortlist = np.nonzero(best_score >= kth_score)[0]
+        top = shortlist[np.lexsort((first_seen[shortlist], -best_score[shortlist]))][:k]
+
+        final_rows = representative[top]
+        return self._ranked_rows(ids[final_rows], dates[final_rows], similarity[final_rows],
+                                 time_factor[final_rows], final_score[final_rows], set_index[final_rows])
 
-        # 중복 제거 및 최고 점수 유지
-        unique_candidates = {}
-        for item in candidate_pool:
-            text = item['review']
-            if text not in unique_candidates or item['final_score'] > unique_candidates[text]['final_score']:
-                unique_candidates[text] = item
+    @staticmethod
+    def _ranked_rows(ids, dates, similarity, time_factor, final_score, set_index):
+        return {
+            "ids": ids,
+            "dates": dates,
+            "similarity": similarity,
+            "time_factor": time_factor,
+            "final_score": final_score,
+            "set_index": set_index
+        }
 
-        candidates_list = list(unique_candidates.values())
-        candidates_list.sort(key=lambda x: x['final_score'], reverse=True)
-        final_docs = candidates_list[:top_k_final]
+    def format_ranked(self, ranked):
+        """rank_candidates() 결과를 "- [Date] Review text..." 문자열 리스트로 변환"""
+        # 최종 행에 대해서만 스니펫 조회 (2단계 fetch)
+        docs = self.fetch_snippets(ranked['ids'])
 
         # Team3 스타일로 변환
-        return [f"- [{item['date_str']}] {item['review'][:400]}..." for item in final_docs]
+        formatted_results = []
+        for date, doc in zip(ranked['dates'], docs):
+            date_str = str(date) if date > 0 else 'Unknown'
+            formatted_results.append(f"- [{date_str}] {doc[:400]}...")
+        return formatted_results
 
 # ===========================================================
 # 테스트용 main
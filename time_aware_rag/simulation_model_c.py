@@ -2,7 +2,6 @@ import os
 import sys
 import json
 import pandas as pd
-import random
 from openai import OpenAI
 
 # 프로젝트 루트 경로 추가
@@ -11,9 +10,10 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 from utils.persona_generator import generate_balanced_personas, Persona
-from utils.search_queries import GAMER_TYPE_QUERIES, GENERAL_QUERY
 from utils.llm_config import get_llm_client, TEMPERATURE
 from time_aware_rag.rag_modules import RAGRetriever
+from utils.retrieval_server import RemoteRetriever
+from utils.retrieval_plan import RetrievalPlan
 
 # 1. LLM 클라이언트 초기화 (공통 모듈 사용)
 client, MODEL_NAME = get_llm_client()
@@ -21,6 +21,8 @@ print(f"✅ Using model: {MODEL_NAME} (Team 3)")
 
 OUTPUT_FILE = "time_aware_rag/Team3_TimeAware_Results_Final.csv"
 SIMULATION_DATES_FILE = "datasets/simulation_dates.csv"
+# 검색 서버 주소 (설정 시 utils/retrieval_server.py 서버를 공유하여 모델/DB 로드를 생략)
+RETRIEVAL_SERVER_URL = os.getenv("RETRIEVAL_SERVER_URL")
 
 # =============================================================================
 # 2. 프롬프트 생성
@@ -81,7 +83,7 @@ def run_experiment_b_rag(n_per_type: int = 13):
 
     # RAG 검색기 초기화
     print("Initializing RAG Retriever...")
-    retriever = RAGRetriever()
+    retriever = RemoteRetriever("time_aware", RETRIEVAL_SERVER_URL) if RETRIEVAL_SERVER_URL else RAGRetriever()
 
     # 날짜 로드
     dates_df = pd.read_csv(SIMULATION_DATES_FILE)
@@ -92,6 +94,10 @@ def run_experiment_b_rag(n_per_type: int = 13):
     personas = generate_balanced_personas(n_per_type=n_per_type) 
     print(f"Generated {len(personas)} agents.")
 
+    # 모든 (에이전트, 날짜)의 쿼리를 미리 선정 (Team 3 방식: 4개 랜덤 + 일반 쿼리)
+    plan = RetrievalPlan(personas, simulation_dates)
+    print(plan.summary())
+
     results = []
     
     # 시뮬레이션 루프
@@ -101,37 +107,24 @@ def run_experiment_b_rag(n_per_type: int = 13):
     for date_str in simulation_dates:
         print(f"\n📅 Date: {date_str}")
         
-        for persona in personas:
+        # 1. 검색 계획에서 미리 선정한 에이전트별 쿼리 (검색기는 다시 선정하지 않고 그대로 검색)
+        # 노트북의 ChromaEnsembleRetriever.retrieve_weighted() 로직과 동일
+        agents = plan.agents_for(date_str)
+        
+        # 2. 검색 (Team 3 Time-Aware 로직)
+        # 쿼리당 CANDIDATE_POOL_SIZE개(rag_modules, 기본 300) 후보를 검색 후 시간 감쇠(Time-Decay) 랭킹을 적용
+        # Team 2와의 차이: similarity × time_factor로 재랭킹
+        # 같은 날짜의 모든 에이전트 쿼리를 한 번의 멀티 쿼리 요청으로 검색
+        all_final_docs = retriever.retrieve_reviews_batch(
+            agents,
+            current_date_str=date_str,
+            top_k_final=5,
+            decay_rate=0.01,  # Half-life ≈ 70일
+            agent_queries=plan.queries_for_date(date_str)
+        )
+        
+        for persona, final_docs in zip(personas, all_final_docs):
             step_count += 1
-            # 1. 쿼리 선정 (Team 3 방식: 4개 랜덤 + 일반 쿼리)
-            agent_queries = GAMER_TYPE_QUERIES.get(persona.gamer_type, [])
-            selected_queries = []
-            if len(agent_queries) >= 4:
-                selected_queries = random.sample(agent_queries, 4)
-            else:
-                selected_queries = agent_queries # Fallback
-            selected_queries.append(GENERAL_QUERY)
-            
-            # 2. 검색 (Team 3 Time-Aware 로직)
-            # 쿼리당 100개를 검색 후 시간 감쇠(Time-Decay) 랭킹을 적용
-            # Team 2와의 차이: similarity × time_factor로 재랭킹
-            
-            # Persona 객체에 search_queries 속성 추가 (rag_modules.py 호환)
-            # 노트북의 ChromaEnsembleRetriever.retrieve_weighted() 로직과 동일
-            class PersonaWithQueries:
-                def __init__(self, persona, queries):
-                    self.search_queries = queries
-            
-            persona_with_queries = PersonaWithQueries(persona, selected_queries)
-            
-            # Time-Aware RAG 검색 (similarity × time_factor)
-            # 노트북의 retrieve_weighted() 메서드와 동일한 로직
-            final_docs = retriever.retrieve_reviews(
-                persona_with_queries,
-                current_date_str=date_str,
-                top_k_final=5,
-                decay_rate=0.01  # Half-life ≈ 70일
-            )
             
             # 3. 프롬프트 생성
             prompt = create_prompt(persona, date_str, final_docs)
@@ -154,6 +147,8 @@ def run_experiment_b_rag(n_per_type: int = 13):
                 "Reasoning": res.get("reasoning", "")
             })
 
+    retriever.close()
+
     # 결과 저장
     df = pd.DataFrame(results)
     df.to_csv(OUTPUT_FILE, index=False, encoding="utf-8-sig")
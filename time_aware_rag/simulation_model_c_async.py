@@ -8,8 +8,8 @@ import os
 import sys
 import json
 import pandas as pd
-import random
 import asyncio
+import functools
 from openai import AsyncOpenAI
 
 # 프로젝트 루트 경로 추가
@@ -18,9 +18,11 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 from utils.persona_generator import generate_balanced_personas, Persona
-from utils.search_queries import GAMER_TYPE_QUERIES, GENERAL_QUERY
 from utils.llm_config import get_llm_client, TEMPERATURE
-from time_aware_rag.rag_modules import RAGRetriever
+from utils.retriever_pool import RetrieverPool
+from utils.retrieval_server import RemoteRetriever
+from utils.retrieval_plan import RetrievalPlan
+from utils.span_tracer import start_recording, task_scope, span
 
 # 병렬 토크나이저 경고 억제
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
@@ -48,6 +50,18 @@ print(f"✅ Using model: {MODEL_NAME} (Team 3 - Async)")
 
 OUTPUT_FILE = "time_aware_rag/Team3_TimeAware_Results_Final.csv"
 SIMULATION_DATES_FILE = "datasets/simulation_dates.csv"
+# 단계별 span (OTLP JSON) 저장 경로 - task마다 검색 대기 / 임베딩 / ANN / 재랭킹 / 프롬프트 / LLM 대기·호출 / CSV 저장 구간
+SPAN_TRACE_FILE = "time_aware_rag/Team3_TimeAware_Spans.json"
+# 검색 워커 프로세스 수 (프로세스마다 읽기 전용 ChromaDB 클라이언트 + 임베딩 모델 보유)
+# 0이면 현재 프로세스의 RAGRetriever.aretrieve_reviews()가 동시 요청을 micro-batch로 묶어 처리
+RETRIEVAL_WORKERS = min(4, os.cpu_count() or 1)
+# 검색 서버 주소 (설정 시 utils/retrieval_server.py 서버를 공유하여 모델/DB 로드를 생략)
+RETRIEVAL_SERVER_URL = os.getenv("RETRIEVAL_SERVER_URL")
+# 쿼리 결합 방식: None (쿼리별 검색), "mean" / "maxsim" (에이전트당 결합 벡터로 한 번만 검색, utils/query_fusion.py)
+QUERY_FUSION = None
+# True이면 날짜마다 모든 에이전트를 한 번의 retrieve_reviews_batch()로 검색 (에이전트 간에 겹치는 쿼리는 한 번만 검색)
+# False이면 에이전트-날짜 task마다 따로 검색 (utils/retrieval_plan.py)
+SHARED_RETRIEVAL_PLAN = True
 
 # =============================================================================
 # 2. 프롬프트 생성
@@ -86,28 +100,34 @@ JSON only:
 
 async def call_llm_async(client: AsyncOpenAI, prompt: str, semaphore: asyncio.Semaphore) -> dict:
     """비동기 LLM 호출 (동시 실행 수 제한, 재시도 포함)"""
-    async with semaphore:
+    # Semaphore 대기(llm_wait)와 실제 API 호출(llm_call)을 나누어 기록
+    with span("llm_wait"):
+        await semaphore.acquire()
+    try:
         for attempt in range(3):
             try:
-                res = await client.chat.completions.create(
-                    model=MODEL_NAME, 
-                    messages=[{"role": "system", "content": prompt}],
-                    response_format={"type": "json_object"},
-                    temperature=TEMPERATURE,
-                    timeout=60
-                )
+                with span("llm_call", attempt=attempt):
+                    res = await client.chat.completions.create(
+                        model=MODEL_NAME, 
+                        messages=[{"role": "system", "content": prompt}],
+                        response_format={"type": "json_object"},
+                        temperature=TEMPERATURE,
+                        timeout=60
+                    )
                 return json.loads(res.choices[0].message.content)
             except Exception as e:
                 if attempt == 2:
                     print(f"[LLM Final Error] {e}", flush=True)
                     return {"decision": "NO", "reasoning": f"Error: {e}"}
                 await asyncio.sleep(2 ** attempt)
+    finally:
+        semaphore.release()
 
 # =============================================================================
 # 4. 메인 실행 (비동기)
 # =============================================================================
 
-async def run_experiment_c_rag_async(n_per_type: int = 13, max_concurrent: int = 20):
+async def run_experiment_c_rag_async(n_per_type: int = 13, max_concurrent: int = 20, n_retrieval_workers: int = RETRIEVAL_WORKERS):
     import sys
     sys.stdout.reconfigure(line_buffering=True)  # 즉시 출력
     sys.stderr.reconfigure(line_buffering=True)
@@ -123,9 +143,28 @@ async def run_experiment_c_rag_async(n_per_type: int = 13, max_concurrent: int =
     print(f"Task 3: Time-Aware RAG Simulation (Async)", flush=True)
     print("=" * 70, flush=True)
 
-    # RAG 검색기 초기화
-    print("Initializing RAG Retriever...")
-    retriever = RAGRetriever()
+    # 단계별 span 기록 시작 (이후 생성되는 task에 contextvars로 전달됨)
+    span_recorder = start_recording("time_aware_async")
+
+    # RAG 검색기 초기화 (검색 서버가 있으면 공유, 없으면 워커 프로세스 풀을 직접 띄움)
+    retriever = None
+    retriever_pool = None
+    if RETRIEVAL_SERVER_URL:
+        remote_retriever = RemoteRetriever("time_aware", RETRIEVAL_SERVER_URL)
+        retrieve_reviews = remote_retriever.aretrieve_reviews
+        retrieve_reviews_batch = remote_retriever.aretrieve_reviews_batch
+    elif n_retrieval_workers == 0:
+        from time_aware_rag.rag_modules import RAGRetriever
+        print("Initializing in-process RAG Retriever (micro-batched)...")
+        retriever = RAGRetriever()
+        retrieve_reviews = retriever.aretrieve_reviews
+        retrieve_reviews_batch = functools.partial(asyncio.to_thread, retriever.retrieve_reviews_batch)
+    else:
+        print(f"Initializing RAG Retriever pool ({n_retrieval_workers} workers)...")
+        retriever_pool = RetrieverPool("time_aware_rag.rag_modules.RAGRetriever", n_workers=n_retrieval_workers)
+        await asyncio.to_thread(retriever_pool.warmup)
+        retrieve_reviews = retriever_pool.retrieve_reviews
+        retrieve_reviews_batch = retriever_pool.retrieve_reviews_batch
 
     # 날짜 로드
     dates_df = pd.read_csv(SIMULATION_DATES_FILE)
@@ -134,46 +173,54 @@ async def run_experiment_c_rag_async(n_per_type: int = 13, max_concurrent: int =
     # 에이전트 생성
     personas = generate_balanced_personas(n_per_type=n_per_type) 
     print(f"Generated {len(personas)} agents.")
+
+    # 모든 (에이전트, 날짜)의 쿼리를 미리 선정 (날짜별 distinct 쿼리는 공유 검색 계획에 사용)
+    plan = RetrievalPlan(personas, simulation_dates)
+    print(plan.summary(shared=SHARED_RETRIEVAL_PLAN, query_fusion=QUERY_FUSION))
     print(f"Total tasks: {len(simulation_dates)} dates × {len(personas)} agents = {len(simulation_dates) * len(personas)} decisions")
     print(f"Max concurrent requests: {max_concurrent}\n")
 
     # 동시 실행 수 제한을 위한 Semaphore
     semaphore = asyncio.Semaphore(max_concurrent)
-    retrieval_lock = asyncio.Lock()  # ChromaDB는 thread-safe 아님
     
     total_steps = len(simulation_dates) * len(personas)
     completed = 0
     
+    async def retrieve_date_agents(date_str: str):
+        """날짜의 모든 에이전트를 한 번의 배치 검색으로 처리 -> {에이전트 ID: 리뷰 리스트}"""
+        agents = plan.agents_for(date_str)
+        all_final_docs = await retrieve_reviews_batch(
+            agents, current_date_str=date_str, top_k_final=5, decay_rate=0.01, query_fusion=QUERY_FUSION,
+            agent_queries=plan.queries_for_date(date_str)
+        )
+        return {agent.id: final_docs for agent, final_docs in zip(agents, all_final_docs)}
+
     async def process_agent_date(persona: Persona, date_str: str, step_num: int):
-        """에이전트-날짜 조합 처리"""
+        """에이전트-날짜 조합 처리 (task 단위로 단계별 span 기록)"""
+        with task_scope(f"{persona.id}@{date_str}"), span("task"):
+            return await _process_agent_date(persona, date_str, step_num)
+
+    async def _process_agent_date(persona: Persona, date_str: str, step_num: int):
         nonlocal completed
         if step_num <= 3:
             print(f"🟢 Start task {step_num}: {persona.id} @ {date_str}", flush=True)
         
-        # 1. 쿼리 선정
-        agent_queries = GAMER_TYPE_QUERIES.get(persona.gamer_type, [])
-        selected_queries = []
-        if len(agent_queries) >= 4:
-            selected_queries = random.sample(agent_queries, 4)
-        else:
-            selected_queries = agent_queries
-        selected_queries.append(GENERAL_QUERY)
-        
         try:
-            # 2~3. ChromaDB 검색 (직렬화)
-            async with retrieval_lock:
-                class PersonaWithQueries:
-                    def __init__(self, persona, queries):
-                        self.search_queries = queries
-                persona_with_queries = PersonaWithQueries(persona, selected_queries)
-                # Run blocking sync DB call in a separate thread to avoid blocking event loop
-                final_docs = await asyncio.to_thread(
-                    retriever.retrieve_reviews,
-                    persona_with_queries,
-                    current_date_str=date_str,
-                    top_k_final=5,
-                    decay_rate=0.01
-                )
+            # 1~3. 쿼리 선정 (검색 계획에서 미리 선정) 및 ChromaDB 검색 (워커 프로세스 풀/검색 서버에서 병렬 처리)
+            with span("retrieval"):
+                if SHARED_RETRIEVAL_PLAN:
+                    # 같은 날짜의 공유 검색 결과에서 자기 결과만 가져옴
+                    final_docs = (await plan.shared_result(date_str, retrieve_date_agents))[persona.id]
+                else:
+                    final_docs = await retrieve_reviews(
+                        plan.agent_for(persona, date_str),
+                        current_date_str=date_str,
+                        top_k_final=5,
+                        decay_rate=0.01,
+                        query_fusion=QUERY_FUSION,
+                        queries=plan.queries_for(persona, date_str)
+                    )
+            with span("prompt_build"):
                 prompt = create_prompt(persona, date_str, final_docs)
             if step_num <= 3:
                 print(f"🔍 Retrieved context lines for {persona.id} @ {date_str}", flush=True)
@@ -229,7 +276,8 @@ async def run_experiment_c_rag_async(n_per_type: int = 13, max_concurrent: int =
                 encoding="utf-8-sig"
             )
         async with flush_lock:
-            await asyncio.to_thread(write_batch)
+            with span("csv_flush", rows=len(batch)):
+                await asyncio.to_thread(write_batch)
             written += len(batch)
             print(f"💾 Saved {written}/{total_steps} rows", flush=True)
     
@@ -252,6 +300,12 @@ async def run_experiment_c_rag_async(n_per_type: int = 13, max_concurrent: int =
     
     # 남은 버퍼 플러시
     await flush_buffer()
+    if retriever_pool is not None:
+        retriever_pool.close()
+    if retriever is not None:
+        retriever.close()
+    span_recorder.export_otlp_json(SPAN_TRACE_FILE)
+    span_recorder.print_summary()
     
     # 최종 통계 출력
     total = yes_count + no_count
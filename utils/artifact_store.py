@@ -0,0 +1,89 @@
+"""
+디스크 인덱스 공통 메타데이터 모듈
+datasets/ 아래 디렉토리 하나로 저장되는 파생 인덱스(날짜순 행렬과 그로부터 만드는 인덱스들)는
+모두 meta.json에 포맷 버전과 원본(컬렉션 / 날짜순 인덱스) 식별 정보를 기록하고, 로드 시 하나라도 다르면 다시 만듭니다.
+그 meta.json 읽기 / 비교 / 쓰기와 load_or_build 흐름을 이 모듈 한 곳에서 제공합니다.
+
+사용 예:
+    meta = read_meta(path, INDEX_FORMAT_VERSION, **collection_fields(collection))
+    if meta is None:
+        ...  # 없거나 버전 / 컬렉션이 다름
+    write_meta(path, INDEX_FORMAT_VERSION, **collection_fields(collection), dtype="float32")
+"""
+import os
+import json
+
+META_FILE_NAME = "meta.json"
+
+
+def get_meta_path(path):
+    return os.path.join(path, META_FILE_NAME)
+
+
+def read_meta(path, version, **expected):
+    """
+    path/meta.json을 읽어 포맷 버전과 expected의 모든 항목이 일치하면 meta dict, 아니면 None 반환
+
+    Args:
+        version: 현재 포맷 버전 (저장된 "version"과 다르면 None)
+        expected: 저장된 값과 같아야 하는 항목 (예: collection_id, count, space)
+    """
+    meta_path = get_meta_path(path)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != version:
+        return None
+    if any(meta.get(key) != value for key, value in expected.items()):
+        return None
+    return meta
+
+
+def write_meta(path, version, **fields):
+    """path/meta.json에 포맷 버전과 fields 기록 (인덱스 파일을 모두 쓴 뒤 마지막에 호출)"""
+    os.makedirs(path, exist_ok=True)
+    with open(get_meta_path(path), "w", encoding="utf-8") as f:
+        json.dump({"version": version, **fields}, f, indent=2)
+
+
+def clear_meta(path):
+    """
+    새로 쓰기 전에 meta.json을 지웁니다.
+    중간에 실패해도 남은 파일이 이전 인덱스로 잘못 로드되지 않도록, meta.json은 항상 마지막에 다시 씁니다.
+    """
+    meta_path = get_meta_path(path)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+
+def collection_fields(collection):
+    """Chroma 컬렉션에서 바로 만드는 인덱스의 식별 정보 (컬렉션이 다시 만들어지면 ID가 바뀜)"""
+    return {"collection_id": str(collection.id), "count": collection.count()}
+
+
+def vector_index_fields(vector_index):
+    """날짜순 인덱스(DateSortedIndex)에서 파생된 인덱스의 식별 정보"""
+    return {"space": vector_index.space, "collection_id": vector_index.collection_id, "count": len(vector_index)}
+
+
+def load_or_build(path, load, build, label, describe=None):
+    """
+    load(path)가 인덱스를 반환하면 그대로 쓰고, None이면 build()로 새로 만들어 path에 저장합니다.
+
+    Args:
+        load: path -> 인덱스 또는 None (없거나 meta.json이 맞지 않음)
+        build: () -> 인덱스. 디스크에 바로 쓰는 빌더(스트리밍)는 스스로 meta.json까지 쓰고,
+            아니면 반환된 인덱스의 save(path)를 호출합니다.
+        label: 로그용 이름 (예: "BM25 index")
+        describe: 인덱스 -> 로드 로그에 덧붙일 설명 (예: "3,000 reviews")
+    """
+    index = load(path)
+    if index is not None:
+        print(f"{label} loaded: {path}" + (f" ({describe(index)})" if describe else ""))
+        return index
+    clear_meta(path)
+    index = build()
+    if not os.path.exists(get_meta_path(path)):
+        index.save(path)
+    return index
@@ -0,0 +1,286 @@
+"""
+BM25 역색인 (Lexical Index) 모듈
+"DLSS and Ray Tracing", "rtx series", "save corruption"처럼 키워드 위주인 쿼리를 위해
+리뷰 코퍼스의 BM25 역색인을 Chroma 컬렉션과 함께 만들어 두고, dense 검색 점수와 결합(hybrid)합니다.
+
+문서 행은 날짜 오름차순으로 번호를 매기므로 모든 posting list가 날짜순으로 정렬되어 있고,
+date <= current_date 필터는 term마다 np.searchsorted 한 번으로 잘라 내는 prefix 구간이 됩니다.
+posting마다 BM25 가중치(impact)를 미리 계산해 두므로 검색은 prefix 구간의 가중치를 더하는 연산(np.bincount)뿐입니다.
+"""
+import os
+import re
+import argparse
+from collections import Counter
+import numpy as np
+
+from utils import artifact_store
+
+BM25_INDEX_DIR = os.path.join("datasets", "bm25_index")
+BM25_INDEX_FORMAT_VERSION = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+# hybrid 결합 시 dense 점수 가중치 (1 - HYBRID_ALPHA가 lexical 가중치)
+HYBRID_ALPHA = 0.5
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from has have how i if in into is it its me my no not of on or
+our so than that the their them then there these they this to too was we were what when which who will with you your
+""".split())
+
+
+def tokenize(text):
+    """소문자 영숫자 토큰 (불용어 제외)"""
+    return [t for t in TOKEN_PATTERN.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def get_bm25_index_path(collection_name):
+    """컬렉션별 BM25 인덱스 디렉토리 경로"""
+    return os.path.join(BM25_INDEX_DIR, collection_name)
+
+
+def _minmax(scores):
+    """결과 집합 안에서 [0, 1]로 정규화 (모두 같으면 1)"""
+    scores = np.asarray(scores, dtype=np.float64)
+    if not len(scores):
+        return scores
+    low, high = scores.min(), scores.max()
+    return (scores - low) / (high - low) if high > low else np.ones_like(scores)
+
+
+def fuse_candidates(dense, lexical, alpha=HYBRID_ALPHA, n_results=None):
+    """
+    Dense 결과와 BM25 결과를 relative score fusion으로 합칩니다.
+    각 결과 집합의 점수를 min-max 정규화한 뒤 alpha · dense + (1 - alpha) · lexical
+    (한쪽 결과에만 있는 리뷰는 다른 쪽 점수를 0으로 봅니다)
+
+    결합 점수는 결과 집합마다 정규화되어 쿼리 간에 비교할 수 없으므로 순서를 정하는 데만 쓰고,
+    similarity는 dense 점수를 그대로 유지합니다 (시간 감쇠 / 트레이스는 dense similarity 기준).
+
+    Args:
+        dense / lexical: {"ids": np.ndarray[str], "scores": np.ndarray, "dates": np.ndarray[int]}
+            dense의 scores는 similarity, lexical의 scores는 BM25 점수
+        alpha: dense 점수 가중치
+        n_results: 결합 점수 상위 n_results개만 반환 (None이면 전체)
+
+    Returns:
+        dict: {"ids", "dates", "similarity", "fused_score"} - 결합 점수 내림차순 (동점은 dense 결과 순서 우선)
+            similarity는 dense 점수이며 lexical 전용 결과는 NaN (호출 측에서 임베딩으로 채움)
+    """
+    ids = np.concatenate([dense['ids'], lexical['ids']])
+    dates = np.concatenate([dense['dates'], lexical['dates']])
+    n_dense = len(dense['ids'])
+
+    unique_ids, first, inverse = np.unique(ids, return_index=True, return_inverse=True)
+    dense_part = np.zeros(len(unique_ids))
+    lexical_part = np.zeros(len(unique_ids))
+    similarity = np.full(len(unique_ids), np.nan)
+    dense_part[inverse[:n_dense]] = _minmax(dense['scores'])
+    lexical_part[inverse[n_dense:]] = _minmax(lexical['scores'])
+    similarity[inverse[:n_dense]] = dense['scores']
+    fused = alpha * dense_part + (1 - alpha) * lexical_part
+
+    order = np.argsort(first, kind='stable')
+    order = order[np.argsort(-fused[order], kind='stable')][:n_results]
+    return {
+        "ids": unique_ids[order],
+        "dates": dates[first[order]],
+        "similarity": similarity[order],
+        "fused_score": fused[order]
+    }
+
+
+class BM25Index:
+    """
+    날짜순 posting list를 가진 BM25 역색인
+
+    Attributes:
+        ids (np.ndarray[str]): 리뷰 ID (날짜 오름차순, 문서 행 순서)
+        dates (np.ndarray[int]): YYYYMMDD 날짜 (오름차순)
+        vocab (np.ndarray[str]): term 목록 (term id 순서)
+        term_offsets (np.ndarray[int64]): (V + 1,) term별 posting 구간
+        postings (np.ndarray[int32]): posting의 문서 행 번호 (term 안에서 오름차순 = 날짜순)
+        impacts (np.ndarray[float32]): posting별 BM25 가중치 idf · tf(k1 + 1) / (tf + k1(1 - b + b·dl/avgdl))
+    """
+    def __init__(self, ids, dates, vocab, term_offsets, postings, impacts, collection_id=None):
+        self.ids = ids
+        self.dates = dates
+        self.vocab = vocab
+        self.term_offsets = term_offsets
+        self.postings = postings
+        self.impacts = impacts
+        self.collection_id = collection_id
+        self.term_ids = {str(term): i for i, term in enumerate(vocab)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---------------------------------------------------------------
+    # 생성 / 저장 / 로드
+    # ---------------------------------------------------------------
+    @classmethod
+    def build(cls, ids, texts, dates, collection_id=None, k1=BM25_K1, b=BM25_B):
+        """
+        Args:
+            ids, texts, dates: 리뷰 ID / 원문 / YYYYMMDD 날짜 (같은 순서, 같은 ID가 여러 번 나오면 처음 것만 사용)
+        """
+        ids = np.array([str(i) for i in ids], dtype=str)
+        dates = np.asarray(dates, dtype=np.int64)
+        first = np.sort(np.unique(ids, return_index=True)[1])
+        order = first[np.argsort(dates[first], kind='stable')]
+        print(f"Building BM25 index over {len(order):,} reviews...")
+
+        term_ids = {}
+        posting_terms, posting_rows, posting_tfs = [], [], []
+        doc_len = np.zeros(len(order), dtype=np.int64)
+        for row, i in enumerate(order):
+            tokens = tokenize(texts[i])
+            doc_len[row] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                posting_terms.append(term_ids.setdefault(term, len(term_ids)))
+                posting_rows.append(row)
+                posting_tfs.append(tf)
+
+        # term 기준으로 묶되(stable) term 안에서는 행 번호 = 날짜 오름차순 유지
+        posting_terms = np.asarray(posting_terms, dtype=np.int64)
+        by_term = np.argsort(posting_terms, kind='stable')
+        postings = np.asarray(posting_rows, dtype=np.int32)[by_term]
+        tfs = np.asarray(posting_tfs, dtype=np.float64)[by_term]
+        df = np.bincount(posting_terms, minlength=len(term_ids))
+        term_offsets = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        np.cumsum(df, out=term_offsets[1:])
+
+        n_docs = max(len(order), 1)
+        avgdl = max(doc_len.mean(), 1e-9) if len(doc_len) else 1.0
+        idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        posting_idf = np.repeat(idf, df)
+        norm = k1 * (1 - b + b * doc_len[postings] / avgdl)
+        impacts = (posting_idf * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+
+        vocab = np.empty(len(term_ids), dtype=object)
+        for term, i in term_ids.items():
+            vocab[i] = term
+        return cls(
+            ids[order],
+            dates[order],
+            vocab.astype(str),
+            term_offsets,
+            postings,
+            impacts,
+            collection_id
+        )
+
+    @classmethod
+    def build_from_collection(cls, collection, batch_size=5000):
+        """이미 구축된 Chroma 컬렉션의 원문 + 날짜로 인덱스를 만듭니다."""
+        total = collection.count()
+        print(f"Exporting {total:,} reviews from collection '{collection.name}' for BM25...")
+        ids, texts, dates = [], [], []
+        for offset in range(0, total, batch_size):
+            batch = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            ids.extend(batch['ids'])
+            texts.extend(batch['documents'])
+            dates.extend((meta or {}).get('date') or 0 for meta in batch['metadatas'])
+        return cls.build(ids, texts, dates, collection_id=str(collection.id))
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "ids.npy"), self.ids)
+        np.save(os.path.join(path, "dates.npy"), self.dates)
+        np.save(os.path.join(path, "vocab.npy"), self.vocab)
+        np.save(os.path.join(path, "term_offsets.npy"), self.term_offsets)
+        np.save(os.path.join(path, "postings.npy"), self.postings)
+        np.save(os.path.join(path, "impacts.npy"), self.impacts)
+        artifact_store.write_meta(path, BM25_INDEX_FORMAT_VERSION, collection_id=self.collection_id, count=len(self),
+                                  vocab_size=len(self.vocab), postings=len(self.postings))
+        print(f"💾 BM25 index saved: {path} ({len(self):,} reviews, {len(self.vocab):,} terms, {len(self.postings):,} postings)")
+
+    @classmethod
+    def load(cls, path, mmap=True, **expected):
+        """저장된 인덱스 로드 (posting 배열은 mmap). 없거나 포맷 버전 / expected(collection_id 등)가 다르면 None 반환"""
+        meta = artifact_store.read_meta(path, BM25_INDEX_FORMAT_VERSION, **expected)
+        if meta is None:
+            return None
+        mmap_mode = 'r' if mmap else None
+        return cls(
+            np.load(os.path.join(path, "ids.npy")),
+            np.load(os.path.join(path, "dates.npy")),
+            np.load(os.path.join(path, "vocab.npy")),
+            np.load(os.path.join(path, "term_offsets.npy")),
+            np.load(os.path.join(path, "postings.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, "impacts.npy"), mmap_mode=mmap_mode),
+            meta.get("collection_id")
+        )
+
+    @classmethod
+    def load_or_build(cls, collection, path=None):
+        """저장된 인덱스가 컬렉션과 일치하면 로드하고, 없거나 컬렉션이 다시 만들어졌으면 새로 만들어 저장합니다."""
+        path = path or get_bm25_index_path(collection.name)
+        return artifact_store.load_or_build(
+            path,
+            lambda p: cls.load(p, **artifact_store.collection_fields(collection)),
+            lambda: cls.build_from_collection(collection),
+            "BM25 index", lambda index: f"{len(index):,} reviews"
+        )
+
+    # ---------------------------------------------------------------
+    # 검색
+    # ---------------------------------------------------------------
+    def prefix_length(self, date_int):
+        """date <= date_int 인 문서 행의 개수 (날짜순 행 번호이므로 앞쪽 prefix 구간)"""
+        return int(np.searchsorted(self.dates, date_int, side='right'))
+
+    def score(self, query_text, end):
+        """
+        [0, end) 문서 행에 대한 쿼리의 BM25 점수를 계산합니다.
+
+        Returns:
+            tuple: (rows, scores) - 점수가 0보다 큰 문서 행과 점수
+        """
+        rows, weights = [], []
+        for term in set(tokenize(query_text)):
+            t = self.term_ids.get(term)
+            if t is None:
+                continue
+            start, stop = self.term_offsets[t], self.term_offsets[t + 1]
+            # posting이 날짜순이므로 date 필터는 prefix 자르기
+            cut = start + int(np.searchsorted(self.postings[start:stop], end))
+            rows.append(self.postings[start:cut])
+            weights.append(self.impacts[start:cut])
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        scores = np.bincount(np.concatenate(rows), weights=np.concatenate(weights), minlength=0)
+        hit_rows = np.nonzero(scores)[0]
+        return hit_rows, scores[hit_rows]
+
+    def search(self, query_texts, date_int, n_results):
+        """
+        date <= date_int 인 리뷰 중 쿼리별 BM25 상위 n_results개를 찾습니다.
+
+        Returns:
+            list: 쿼리 순서대로 {"ids", "scores", "dates"} (점수 내림차순, 매칭이 없으면 빈 배열)
+        """
+        end = self.prefix_length(date_int)
+        results = []
+        for query_text in query_texts:
+            rows, scores = self.score(query_text, end)
+            if len(rows) > n_results:
+                part = np.argpartition(-scores, n_results - 1)[:n_results]
+                rows, scores = rows[part], scores[part]
+            order = np.lexsort((rows, -scores))
+            rows, scores = rows[order], scores[order]
+            results.append({"ids": self.ids[rows], "scores": scores, "dates": self.dates[rows]})
+        return results
+
+
+if __name__ == "__main__":
+    import chromadb
+
+    parser = argparse.ArgumentParser(description='Build a date-sorted BM25 inverted index from a Chroma collection.')
+    parser.add_argument('--db-path', default=os.path.join("datasets", "chroma_db"), help='ChromaDB path')
+    parser.add_argument('--collection', default="cyberpunk2077_reviews", help='Collection name')
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.db_path)
+    collection = client.get_collection(name=args.collection, embedding_function=None)
+    BM25Index.build_from_collection(collection).save(get_bm25_index_path(args.collection))
@@ -0,0 +1,133 @@
+"""
+ChromaDB 컬렉션 인덱스 설정 모듈
+빌드 시 거리 함수(space)와 HNSW 파라미터(M, ef_construction, ef_search)를 컬렉션 메타데이터에 기록하고,
+검색 시 이를 다시 읽어 distance → similarity 변환을 거리 함수에 맞게 수행합니다.
+
+ef_search 조정 (재빌드 없이 recall ↔ latency 트레이드오프):
+    python -m utils.collection_config --collection cyberpunk2077_reviews --ef-search 200
+"""
+import os
+import argparse
+import numpy as np
+
+# Chroma가 지원하는 거리 함수
+DISTANCE_SPACES = ("l2", "cosine", "ip")
+# Chroma 기본값 (chromadb >= 1.0)
+DEFAULT_SPACE = "l2"
+DEFAULT_HNSW_M = 16
+DEFAULT_EF_CONSTRUCTION = 100
+DEFAULT_EF_SEARCH = 100
+# l2 / ip의 distance → similarity 변환이 가정하는 단위 norm의 허용 오차와 빌드 시 확인할 샘플 수
+UNIT_NORM_TOLERANCE = 1e-3
+NORM_CHECK_SAMPLE = 16
+
+
+def build_collection_metadata(space=DEFAULT_SPACE, hnsw_m=DEFAULT_HNSW_M,
+                              ef_construction=DEFAULT_EF_CONSTRUCTION, ef_search=DEFAULT_EF_SEARCH):
+    """create_collection(metadata=...)에 전달할 HNSW 설정 메타데이터"""
+    if space not in DISTANCE_SPACES:
+        raise ValueError(f"지원하지 않는 거리 함수입니다: {space}")
+    return {
+        "hnsw:space": space,
+        "hnsw:M": hnsw_m,
+        "hnsw:construction_ef": ef_construction,
+        "hnsw:search_ef": ef_search,
+    }
+
+
+def get_collection_space(collection):
+    """컬렉션의 거리 함수 (기록되어 있지 않으면 Chroma 기본값 l2)"""
+    return get_hnsw_config(collection)["space"]
+
+
+def get_hnsw_config(collection):
+    """
+    컬렉션의 거리 함수와 HNSW 파라미터를 읽어 옵니다.
+    chromadb >= 1.0의 configuration(ef_search 변경 반영)을 우선하고, 없으면 메타데이터를 사용합니다.
+
+    Returns:
+        dict: {"space", "M", "ef_construction", "ef_search"}
+    """
+    metadata = collection.metadata or {}
+    config = {
+        "space": metadata.get("hnsw:space", DEFAULT_SPACE),
+        "M": metadata.get("hnsw:M", DEFAULT_HNSW_M),
+        "ef_construction": metadata.get("hnsw:construction_ef", DEFAULT_EF_CONSTRUCTION),
+        "ef_search": metadata.get("hnsw:search_ef", DEFAULT_EF_SEARCH),
+    }
+    hnsw = (getattr(collection, "configuration", None) or {}).get("hnsw") or {}
+    config.update({
+        key: hnsw[name]
+        for key, name in (("space", "space"), ("M", "max_neighbors"),
+                          ("ef_construction", "ef_construction"), ("ef_search", "ef_search"))
+        if hnsw.get(name) is not None
+    })
+    return config
+
+
+def set_search_ef(collection, ef_search):
+    """기존 컬렉션의 검색 시 ef 값 변경 (인덱스 재빌드 불필요)"""
+    try:
+        collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+    except TypeError:
+        # chromadb < 1.0: configuration 인자가 없으므로 메타데이터로 변경
+        metadata = {k: v for k, v in (collection.metadata or {}).items() if k != "hnsw:space"}
+        collection.modify(metadata={**metadata, "hnsw:search_ef": ef_search})
+
+
+def distance_to_similarity(distances, space):
+    """
+    Chroma distance를 [0, 1] 범위의 similarity로 변환합니다.
+        - cosine: distance = 1 - cos            → similarity = 1 - distance
+        - ip:     distance = 1 - dot            → similarity = 1 - distance (정규화 임베딩이면 cos와 동일)
+        - l2:     distance = ||a - b||² (제곱)   → 정규화 임베딩에서 2 - 2cos 이므로 similarity = 1 - distance / 2
+    l2 / ip는 정규화 임베딩을 가정하며 빌드 시 check_unit_norm()으로 확인합니다.
+    거리 함수가 기록되지 않은 기존 컬렉션(Chroma 기본값 l2)도 1 - distance / 2 (= cos)로 변환합니다.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    if space == "l2":
+        return np.maximum(0, 1 - distances / 2)
+    if space in ("cosine", "ip"):
+        return np.maximum(0, 1 - distances)
+    raise ValueError(f"지원하지 않는 거리 함수입니다: {space}")
+
+
+def check_unit_norm(embedding_fn, texts, space):
+    """
+    l2 / ip 컬렉션의 similarity 변환은 정규화 임베딩을 가정하므로 ingest 전에 샘플 임베딩의 norm을 확인합니다.
+    정규화되지 않은 모델이면 ValueError (cosine은 norm과 무관하므로 확인하지 않음)
+    """
+    if space == "cosine" or not texts:
+        return
+    norms = np.linalg.norm(np.asarray(embedding_fn(list(texts[:NORM_CHECK_SAMPLE])), dtype=np.float64), axis=1)
+    if np.abs(norms - 1).max() > UNIT_NORM_TOLERANCE:
+        raise ValueError(
+            f"{space} 거리의 similarity 변환은 정규화된 임베딩을 가정합니다 "
+            f"(샘플 norm {norms.min():.3f} ~ {norms.max():.3f}). --space cosine으로 빌드하세요."
+        )
+
+
+def add_index_arguments(parser):
+    """빌드 스크립트 공통 CLI 인자 (--space, --hnsw-m, --ef-construction, --ef-search)"""
+    parser.add_argument('--space', choices=DISTANCE_SPACES, default=DEFAULT_SPACE, help='Distance metric')
+    parser.add_argument('--hnsw-m', type=int, default=DEFAULT_HNSW_M, help='HNSW M (graph degree)')
+    parser.add_argument('--ef-construction', type=int, default=DEFAULT_EF_CONSTRUCTION, help='HNSW ef at build time')
+    parser.add_argument('--ef-search', type=int, default=DEFAULT_EF_SEARCH, help='HNSW ef at query time')
+    return parser
+
+
+if __name__ == "__main__":
+    import chromadb
+
+    parser = argparse.ArgumentParser(description='Show or change the HNSW query-time settings of a Chroma collection.')
+    parser.add_argument('--db-path', default=os.path.join("datasets", "chroma_db"), help='ChromaDB path')
+    parser.add_argument('--collection', default="cyberpunk2077_reviews", help='Collection name')
+    parser.add_argument('--ef-search', type=int, default=None, help='New HNSW ef at query time')
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.db_path)
+    collection = client.get_collection(name=args.collection, embedding_function=None)
+    if args.ef_search is not None:
+        set_search_ef(collection, args.ef_search)
+        collection = client.get_collection(name=args.collection, embedding_function=None)
+    print(f"{args.collection}: {get_hnsw_config(collection)}")
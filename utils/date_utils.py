@@ -0,0 +1,31 @@
+"""
+날짜 변환 유틸리티
+ChromaDB 메타데이터의 YYYYMMDD 정수형 날짜를 벡터 연산으로 처리하기 위한 함수 모음
+"""
+import numpy as np
+
+
+def yyyymmdd_to_epoch_days(date_ints):
+    """
+    YYYYMMDD 정수 배열을 1970-01-01 기준 경과 일수 배열로 변환합니다.
+    pd.to_datetime()을 원소마다 호출하지 않고 한 번의 벡터 연산으로 처리합니다.
+
+    Args:
+        date_ints: YYYYMMDD 형식의 정수 (스칼라 또는 배열)
+    Returns:
+        np.ndarray: 경과 일수 (int64)
+    """
+    d = np.asarray(date_ints, dtype=np.int64)
+    year = d // 10000
+    month = (d // 100) % 100
+    day = d % 100
+
+    # days_from_civil (proleptic Gregorian): 3월을 한 해의 시작으로 보고 계산
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    yoe = year - era * 400
+    mp = (month + 9) % 12
+    doy = (153 * mp + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
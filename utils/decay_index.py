@@ -0,0 +1,238 @@
+"""
+Time-Decay 사전 정렬 인덱스 모듈
+
+final_score = sim · exp(-λ(now − t)) = sim · exp(λt) · exp(−λ·now) 이므로,
+쿼리가 고정되어 있으면 리뷰 순위는 now와 무관하게 sim · exp(λt)로 결정되고
+now는 date <= now 필터로만 작용합니다.
+따라서 카탈로그 쿼리마다 리뷰 전체를 sim · exp(λt) 내림차순으로 한 번 정렬해 두면,
+임의의 시뮬레이션 날짜에서 정확한 time-aware top-k는 "date <= now 인 첫 k개"를 찾는 스캔이 됩니다.
+(후보 풀 근사 없이 exact 결과)
+날짜가 없는(date <= 0) 리뷰는 rank_candidates()와 같이 경과 일수 0(time_factor = 1)으로 보므로
+정렬 목록에서 빼고 검색할 때 따로 점수를 계산해 합칩니다.
+인덱스는 컬렉션 + 쿼리 임베딩 모델 + decay_rate 별로 저장하고, 컬렉션 내용 지문이 바뀌면 다시 만듭니다.
+"""
+import os
+import argparse
+import numpy as np
+
+from utils import artifact_store
+from utils.date_utils import yyyymmdd_to_epoch_days
+from utils.collection_config import distance_to_similarity
+from utils.query_embedding_cache import get_catalog_queries, catalog_fingerprint
+
+DECAY_INDEX_DIR = os.path.join("datasets", "decay_index")
+DECAY_INDEX_FORMAT_VERSION = 3
+# 스캔 시 한 번에 확인하는 항목 수
+SCAN_CHUNK_SIZE = 4096
+
+
+def get_decay_index_path(collection_name, decay_rate, model_tag):
+    """
+    컬렉션 + 쿼리 임베딩 모델 + decay_rate 별 인덱스 디렉토리 경로
+
+    Args:
+        model_tag: 쿼리 임베딩 캐시 키 (get_embedding_cache_tag() 결과, 로컬 모델 경로면 디렉토리 이름만 사용)
+    """
+    model_tag = os.path.basename(os.path.normpath(model_tag))
+    return os.path.join(DECAY_INDEX_DIR, f"{collection_name}_{model_tag}_decay{decay_rate:g}")
+
+
+def decay_sort_keys(distances, dates, decay_rate, space):
+    """
+    log(sim) + λ·t 정렬 키 (sim · exp(λt)는 t가 커지면 overflow 되므로 log 공간에서 계산)
+    similarity는 거리 함수(space)에 맞게 변환하며 sim = 0 인 리뷰와 날짜가 없는 리뷰는 -inf로 맨 뒤에 위치합니다.
+    """
+    similarity = distance_to_similarity(distances, space)
+    with np.errstate(divide='ignore'):
+        keys = np.log(similarity) + decay_rate * yyyymmdd_to_epoch_days(dates)
+    return np.where(np.asarray(dates) > 0, keys, -np.inf)
+
+
+def decay_scores(distances, dates, date_int, decay_rate, space):
+    """rank_candidates()와 같은 sim · exp(-λ·경과 일수) (날짜가 없는(<= 0) 리뷰는 경과 일수 0)"""
+    current_day = yyyymmdd_to_epoch_days(date_int)
+    review_days = np.where(np.asarray(dates) > 0, yyyymmdd_to_epoch_days(dates), current_day)
+    return distance_to_similarity(distances, space) * np.exp(-decay_rate * np.maximum(0, current_day - review_days))
+
+
+class DecayRankedIndex:
+    """
+    카탈로그 쿼리별 sim · exp(λt) 내림차순 리뷰 목록
+
+    Attributes:
+        queries (list): 카탈로그 쿼리 (행 순서)
+        rows (np.ndarray): (Q, N) int32 - 쿼리별 정렬된 vector_index 행 번호
+        dates (np.ndarray): (Q, N) int32 - rows와 같은 순서의 YYYYMMDD 날짜 (스캔용)
+        decay_rate (float): 정렬에 사용한 λ
+        vector_index: 거리 계산에 사용하는 DateSortedIndex
+        model_tag (str): 쿼리 임베딩 캐시 키
+    """
+    def __init__(self, queries, rows, dates, decay_rate, vector_index, model_tag=None):
+        self.queries = list(queries)
+        self.query_pos = {q: i for i, q in enumerate(self.queries)}
+        self.rows = rows
+        self.dates = dates
+        self.decay_rate = decay_rate
+        self.vector_index = vector_index
+        self.model_tag = model_tag
+        # 날짜가 없는(date <= 0) 리뷰는 vector_index 앞쪽 행 (날짜 오름차순)
+        self.n_undated = vector_index.prefix_length(0)
+
+    @classmethod
+    def build(cls, vector_index, query_embedder, decay_rate):
+        """
+        카탈로그 전체 쿼리에 대해 리뷰 전체를 sim · exp(λt) 순으로 정렬합니다.
+
+        Args:
+            vector_index: DateSortedIndex (리뷰 임베딩 + 날짜)
+            query_embedder: QueryEmbedder (카탈로그 쿼리 임베딩)
+            decay_rate: 시간 감쇠율 λ
+        """
+        queries = get_catalog_queries()
+        query_embeddings = query_embedder.embed(queries)
+        n = len(vector_index)
+        print(f"Building decay-ranked lists: {len(queries)} queries × {n:,} reviews (decay_rate={decay_rate:g})")
+
+        rows = np.empty((len(queries), n), dtype=np.int32)
+        dates = np.empty((len(queries), n), dtype=np.int32)
+        for i, embedding in enumerate(query_embeddings):
+            distances = np.concatenate([d[0] for _, d in vector_index.iter_distances(embedding, n)])
+            keys = decay_sort_keys(distances, vector_index.dates, decay_rate, vector_index.space)
+            order = np.argsort(-keys, kind='stable')
+            rows[i] = order
+            dates[i] = vector_index.dates[order]
+        return cls(queries, rows, dates, decay_rate, vector_index, query_embedder.model_name)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "queries.npy"), np.array(self.queries))
+        np.save(os.path.join(path, "rows.npy"), self.rows)
+        np.save(os.path.join(path, "dates.npy"), self.dates)
+        artifact_store.write_meta(
+            path, DECAY_INDEX_FORMAT_VERSION,
+            decay_rate=self.decay_rate,
+            collection_id=self.vector_index.collection_id,
+            collection_fingerprint=self.vector_index.fingerprint,
+            model=self.model_tag,
+            count=len(self.vector_index),
+            fingerprint=catalog_fingerprint(self.queries)
+        )
+        print(f"💾 Decay index saved: {path}")
+
+    @classmethod
+    def load(cls, path, vector_index, decay_rate, model_tag):
+        """
+        저장된 인덱스 로드 (rows/dates는 mmap).
+        vector_index(컬렉션 내용), 쿼리 임베딩 모델, decay_rate, 쿼리 카탈로그 중 하나라도 맞지 않으면 None 반환
+        """
+        meta = artifact_store.read_meta(
+            path, DECAY_INDEX_FORMAT_VERSION,
+            decay_rate=decay_rate,
+            collection_id=vector_index.collection_id,
+            collection_fingerprint=vector_index.fingerprint,
+            model=model_tag,
+            count=len(vector_index),
+            fingerprint=catalog_fingerprint(get_catalog_queries())
+        )
+        if meta is None:
+            return None
+        return cls(
+            [str(q) for q in np.load(os.path.join(path, "queries.npy"))],
+            np.load(os.path.join(path, "rows.npy"), mmap_mode='r'),
+            np.load(os.path.join(path, "dates.npy"), mmap_mode='r'),
+            decay_rate,
+            vector_index,
+            model_tag
+        )
+
+    @classmethod
+    def load_or_build(cls, vector_index, query_embedder, decay_rate, collection_name):
+        path = get_decay_index_path(collection_name, decay_rate, query_embedder.model_name)
+        return artifact_store.load_or_build(
+            path,
+            lambda p: cls.load(p, vector_index, decay_rate, query_embedder.model_name),
+            lambda: cls.build(vector_index, query_embedder, decay_rate),
+            "Decay index"
+        )
+
+    def search(self, query, query_embedding, date_int, k):
+        """
+        date <= date_int 인 리뷰 중 sim · exp(-λ(now − t)) 상위 k개를 정확히 찾습니다.
+
+        Args:
+            query: 쿼리 텍스트 (카탈로그에 없으면 prefix 구간 전체를 계산하는 느린 경로 사용)
+            query_embedding: 쿼리 임베딩
+            date_int: YYYYMMDD 기준 날짜
+            k: 결과 개수
+
+        Returns:
+            tuple: (rows, distances) - vector_index 행 번호와 거리 (decay 점수 내림차순)
+        """
+        pos = self.query_pos.get(query)
+        if pos is None:
+            end = self.vector_index.prefix_length(date_int)
+            distances = np.concatenate([d[0] for _, d in self.vector_index.iter_distances(query_embedding, end)]) \
+                if end else np.empty(0, dtype=np.float32)
+            scores = decay_scores(distances, self.vector_index.dates[:end], date_int,
+                                  self.decay_rate, self.vector_index.space)
+            rows = np.argsort(-scores, kind='stable')[:k]
+            return rows, distances[rows]
+
+        # 정렬된 목록을 앞에서부터 훑으며 0 < date <= date_int 인 첫 k개 수집
+        dates = self.dates[pos]
+        found = []
+        n_found = 0
+        for start in range(0, len(dates), SCAN_CHUNK_SIZE):
+            chunk = dates[start:start + SCAN_CHUNK_SIZE]
+            hits = np.nonzero((chunk > 0) & (chunk <= date_int))[0] + start
+            found.append(hits[:k - n_found])
+            n_found += len(found[-1])
+            if n_found >= k:
+                break
+
+        positions = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+        rows = np.asarray(self.rows[pos][positions], dtype=np.int64)
+        distances = self.vector_index.row_distances(query_embedding, rows)
+        if not self.n_undated:
+            return rows, distances
+
+        # 날짜가 없는 리뷰는 time_factor = 1 이므로 점수가 now에 따라 달라짐 → 따로 계산해 합침
+        undated = np.arange(self.n_undated, dtype=np.int64)
+        rows = np.concatenate([rows, undated])
+        distances = np.concatenate([distances, self.vector_index.row_distances(query_embedding, undated)])
+        scores = decay_scores(distances, self.vector_index.dates[rows], date_int, self.decay_rate, self.vector_index.space)
+        order = np.argsort(-scores, kind='stable')[:k]
+        return rows[order], distances[order]
+
+
+if __name__ == "__main__":
+    import chromadb
+    from utils.query_embedding_cache import QueryEmbedder
+    from utils.embedding_backend import load_embedding_function, get_embedding_cache_tag, EMBEDDING_BACKENDS
+    from utils.embedding_projection import EmbeddingProjection, load_projected_query_embedder
+    from utils.vector_index import DateSortedIndex
+    # 기본값은 RAGRetriever의 쿼리 임베딩 설정 (같은 캐시 키로 저장되어야 검색 시 로드됨)
+    from time_aware_rag.rag_modules import EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND
+
+    parser = argparse.ArgumentParser(description='Precompute decay-ranked review lists for every catalog query.')
+    parser.add_argument('--db-path', default=os.path.join("datasets", "chroma_db"), help='ChromaDB path')
+    parser.add_argument('--collection', default="cyberpunk2077_reviews", help='Collection name')
+    parser.add_argument('--model', default=EMBEDDING_MODEL_NAME, help='Query embedding model')
+    parser.add_argument('--backend', choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND, help='Query embedding backend')
+    parser.add_argument('--decay-rate', type=float, default=0.01, help='Time decay rate (λ)')
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.db_path)
+    collection = client.get_collection(name=args.collection, embedding_function=None)
+    vector_index = DateSortedIndex.load_or_build(collection)
+    query_embedder = QueryEmbedder(
+        get_embedding_cache_tag(args.model, args.backend),
+        lambda: load_embedding_function(args.model, args.backend)
+    )
+    # 차원 축소된 컬렉션이면 쿼리에도 같은 투영 적용
+    projection = EmbeddingProjection.load_for_collection(collection)
+    if projection is not None:
+        query_embedder = load_projected_query_embedder(projection, query_embedder, args.backend)
+    DecayRankedIndex.build(vector_index, query_embedder, args.decay_rate).save(
+        get_decay_index_path(args.collection, args.decay_rate, query_embedder.model_name)
+    )
@@ -0,0 +1,221 @@
+"""
+임베딩 백엔드 모듈
+SentenceTransformer 모델을 PyTorch 그대로 쓰거나, ONNX Runtime으로 내보낸 모델(선택적으로 동적 int8 양자화)로
+Chroma EmbeddingFunction 인터페이스를 통해 제공합니다. CPU 환경의 ingest / 쿼리 인코딩 지연을 줄이기 위함입니다.
+
+    - "torch":     기존과 동일한 PyTorch SentenceTransformer
+    - "onnx":      ONNX Runtime (float32, 결과는 PyTorch와 사실상 동일)
+    - "onnx-int8": ONNX Runtime + 동적 int8 양자화 (가장 빠름, parity 체크 권장)
+
+ONNX 모델 내보내기 + PyTorch 벡터와의 parity 체크:
+    python -m utils.embedding_backend --model all-MiniLM-L6-v2 --backend onnx-int8
+
+필요 패키지 (onnx 백엔드 사용 시): sentence-transformers>=3.2, optimum[onnxruntime]
+"""
+import os
+import sys
+import platform
+import argparse
+import numpy as np
+from chromadb.utils import embedding_functions
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+# 내보낸 ONNX 모델 저장 위치 (모델별 하위 디렉토리)
+ONNX_MODEL_DIR = os.path.join("models", "onnx")
+INT8_FILE_SUFFIX = "qint8"
+# parity 체크 기준: 같은 텍스트에 대한 PyTorch 벡터와의 최소 cosine similarity
+PARITY_THRESHOLD = {"onnx": 0.9999, "onnx-int8": 0.98}
+# 쿼리 인코딩에 별도 프롬프트를 쓰는 모델 (모델 디렉토리 이름 접두사 → 프롬프트 이름)
+QUERY_PROMPT_NAMES = {"Qwen3-Embedding": "query"}
+
+
+def get_onnx_model_path(model_name_or_path):
+    """모델별 ONNX 내보내기 디렉토리 (로컬 경로가 들어오면 디렉토리 이름만 사용)"""
+    return os.path.join(ONNX_MODEL_DIR, os.path.basename(os.path.normpath(model_name_or_path)))
+
+
+def get_onnx_file_name(backend):
+    """백엔드별 ONNX 파일 이름 (SentenceTransformer model_kwargs["file_name"])"""
+    return f"onnx/model_{INT8_FILE_SUFFIX}.onnx" if backend == "onnx-int8" else "onnx/model.onnx"
+
+
+def default_quantization_config():
+    """현재 CPU에 맞는 동적 양자화 설정 이름 (arm64 / avx512_vnni / avx2)"""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            if "avx512_vnni" in f.read():
+                return "avx512_vnni"
+    except OSError:
+        pass
+    return "avx2"
+
+
+def export_onnx_model(model_name_or_path, backend="onnx-int8", quantization_config=None, trust_remote_code=False):
+    """
+    SentenceTransformer 모델을 ONNX로 내보내고 (onnx-int8이면 동적 int8 양자화까지) 저장합니다.
+    이미 내보낸 파일이 있으면 그대로 둡니다.
+
+    Returns:
+        str: 내보낸 모델 디렉토리 경로
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    export_path = get_onnx_model_path(model_name_or_path)
+    if os.path.exists(os.path.join(export_path, get_onnx_file_name(backend))):
+        return export_path
+
+    print(f"Exporting {model_name_or_path} to ONNX: {export_path}")
+    if os.path.exists(os.path.join(export_path, get_onnx_file_name("onnx"))):
+        model = SentenceTransformer(export_path, backend="onnx", trust_remote_code=trust_remote_code)
+    else:
+        # ONNX 파일이 없는 모델은 optimum이 로드 시 자동으로 변환
+        model = SentenceTransformer(model_name_or_path, backend="onnx", device="cpu", trust_remote_code=trust_remote_code)
+        model.save_pretrained(export_path)
+
+    if backend == "onnx-int8":
+        quantization_config = quantization_config or default_quantization_config()
+        print(f"Quantizing to int8 ({quantization_config})...")
+        export_dynamic_quantized_onnx_model(model, quantization_config, export_path, file_suffix=INT8_FILE_SUFFIX)
+    return export_path
+
+
+class SentenceTransformerBackendEmbeddingFunction(embedding_functions.EmbeddingFunction):
+    """
+    백엔드(torch / onnx / onnx-int8)를 선택할 수 있는 SentenceTransformer EmbeddingFunction
+    출력은 chromadb의 SentenceTransformerEmbeddingFunction과 같은 형식입니다.
+    """
+    def __init__(self, model_name_or_path, backend="torch", device=None,
+                 normalize_embeddings=False, trust_remote_code=False, batch_size=32, prompt_name=None):
+        """
+        Args:
+            prompt_name: 모델 설정에 정의된 프롬프트 이름 (예: Qwen3-Embedding 쿼리 인코딩 시 "query")
+        """
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError("Please install sentence_transformers: pip install sentence-transformers")
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"지원하지 않는 임베딩 백엔드입니다: {backend}")
+
+        self.backend = backend
+        self.normalize_embeddings = normalize_embeddings
+        self.batch_size = batch_size
+        self.prompt_name = prompt_name
+        if backend == "torch":
+            self.model = SentenceTransformer(model_name_or_path, device=device, trust_remote_code=trust_remote_code)
+        else:
+            export_path = export_onnx_model(model_name_or_path, backend, trust_remote_code=trust_remote_code)
+            print(f"Loading ONNX embedding model: {export_path} ({backend})")
+            self.model = SentenceTransformer(
+                export_path,
+                backend="onnx",
+                device="cpu",
+                trust_remote_code=trust_remote_code,
+                model_kwargs={"file_name": get_onnx_file_name(backend)}
+            )
+
+    def __call__(self, input: list) -> list:
+        embeddings = self.model.encode(
+            list(input),
+            batch_size=self.batch_size,
+            prompt_name=self.prompt_name,
+            convert_to_numpy=True,
+            normalize_embeddings=self.normalize_embeddings
+        )
+        return embeddings.tolist()
+
+
+def load_embedding_function(model_name_or_path, backend="torch", **kwargs):
+    """
+    백엔드에 맞는 Chroma EmbeddingFunction 반환
+    torch 백엔드는 기존과 같은 chromadb SentenceTransformerEmbeddingFunction을 사용합니다.
+    """
+    if backend == "torch" and not kwargs:
+        return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name_or_path)
+    return SentenceTransformerBackendEmbeddingFunction(model_name_or_path, backend=backend, **kwargs)
+
+
+def get_query_prompt_name(model_name_or_path):
+    """모델의 쿼리 프롬프트 이름 (프롬프트 없이 쿼리 / 문서를 같은 방식으로 인코딩하는 모델이면 None)"""
+    model_tag = os.path.basename(os.path.normpath(model_name_or_path))
+    for prefix, prompt_name in QUERY_PROMPT_NAMES.items():
+        if model_tag.startswith(prefix):
+            return prompt_name
+    return None
+
+
+def load_query_embedding_function(model_name_or_path, backend="torch"):
+    """쿼리 인코딩용 EmbeddingFunction (Qwen3-Embedding처럼 쿼리 프롬프트가 있는 모델은 프롬프트 적용)"""
+    prompt_name = get_query_prompt_name(model_name_or_path)
+    if prompt_name is None:
+        return load_embedding_function(model_name_or_path, backend)
+    return load_embedding_function(model_name_or_path, backend, trust_remote_code=True, prompt_name=prompt_name)
+
+
+def get_embedding_cache_tag(model_name, backend="torch"):
+    """쿼리 임베딩 캐시 키 (백엔드마다 벡터가 조금씩 다르므로 torch 외에는 백엔드 이름을 붙임)"""
+    return model_name if backend == "torch" else f"{model_name}.{backend}"
+
+
+def check_parity(model_name_or_path, backend, texts=None, top_k=5, **kwargs):
+    """
+    같은 텍스트에 대해 PyTorch 벡터와 선택한 백엔드 벡터를 비교합니다.
+
+    Args:
+        texts: 비교할 텍스트 (기본값: 검색 쿼리 카탈로그)
+        top_k: 이웃 일치율 계산 시 사용할 k
+
+    Returns:
+        dict: min/mean cosine similarity, 텍스트 간 top-k 이웃 일치율
+    """
+    if texts is None:
+        from utils.query_embedding_cache import get_catalog_queries
+        texts = get_catalog_queries()
+
+    reference = np.asarray(load_embedding_function(model_name_or_path, "torch", **kwargs)(texts), dtype=np.float32)
+    candidate = np.asarray(load_embedding_function(model_name_or_path, backend, **kwargs)(texts), dtype=np.float32)
+
+    reference /= np.maximum(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12)
+    candidate /= np.maximum(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12)
+    cosine = np.einsum('ij,ij->i', reference, candidate)
+
+    # 텍스트 간 유사도 순위가 유지되는지 (검색 결과 일치율의 근사)
+    k = min(top_k, len(texts) - 1)
+    ref_sim = reference @ reference.T
+    cand_sim = candidate @ candidate.T
+    np.fill_diagonal(ref_sim, -np.inf)
+    np.fill_diagonal(cand_sim, -np.inf)
+    ref_top = np.argsort(-ref_sim, axis=1)[:, :k]
+    cand_top = np.argsort(-cand_sim, axis=1)[:, :k]
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]) if k > 0 else 1.0
+
+    return {
+        "backend": backend,
+        "n_texts": len(texts),
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        f"top{k}_overlap": float(overlap),
+        "passed": bool(cosine.min() >= PARITY_THRESHOLD.get(backend, 1.0))
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export an embedding model to ONNX (optionally int8) and check parity with PyTorch.')
+    parser.add_argument('--model', default="all-MiniLM-L6-v2", help='Embedding model name or local path')
+    parser.add_argument('--backend', choices=EMBEDDING_BACKENDS[1:], default="onnx-int8")
+    parser.add_argument('--quantization', choices=['arm64', 'avx2', 'avx512', 'avx512_vnni'], default=None,
+                        help='Dynamic quantization config (default: detected from CPU)')
+    parser.add_argument('--trust-remote-code', action='store_true', help='Needed for some local models (e.g. Qwen)')
+    args = parser.parse_args()
+
+    export_onnx_model(args.model, args.backend, args.quantization, trust_remote_code=args.trust_remote_code)
+    kwargs = {"trust_remote_code": True} if args.trust_remote_code else {}
+    report = check_parity(args.model, args.backend, **kwargs)
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+    if not report["passed"]:
+        print(f"⚠️  Parity check failed (threshold: {PARITY_THRESHOLD[args.backend]})")
+        sys.exit(1)
+    print("✅ Parity check passed")
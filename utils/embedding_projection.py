@@ -0,0 +1,287 @@
+"""
+임베딩 차원 축소(Projection) 모듈
+Qwen3-Embedding-8B처럼 수천 차원인 임베딩을 ingest 시 목표 차원(예: 256)으로 줄여 컬렉션에 저장하고,
+같은 투영을 검색 시 쿼리 임베딩에도 적용합니다. HNSW 인덱스 크기와 거리 계산 비용이 차원에 비례하여 줄어듭니다.
+
+    - "pca":      문서 임베딩 샘플로 학습한 PCA 상위 성분으로 사영
+    - "truncate": 앞쪽 dim개 성분만 사용 (Matryoshka 학습 모델용, 학습 불필요)
+
+투영 후에는 항상 L2 정규화하여 거리 → similarity 변환(utils/collection_config.py)의 가정을 유지합니다.
+투영은 datasets/projections/<컬렉션>.npz에 컬렉션 ID와 함께 저장되며,
+빌드 시 축소 전후의 recall@k / 메모리 / 거리 계산 지연 비교를 <컬렉션>.report.json으로 남깁니다.
+"""
+import os
+import json
+import time
+import numpy as np
+from chromadb.utils import embedding_functions
+
+PROJECTION_DIR = os.path.join("datasets", "projections")
+PROJECTION_FORMAT_VERSION = 1
+PROJECTION_METHODS = ("pca", "truncate")
+# PCA 학습 / recall 리포트에 사용할 문서 샘플 수
+PROJECTION_FIT_SAMPLE = 20000
+# 리포트의 recall@k
+PROJECTION_REPORT_K = 10
+
+
+def get_projection_path(collection_name):
+    """컬렉션별 투영 파일 경로"""
+    return os.path.join(PROJECTION_DIR, f"{collection_name}.npz")
+
+
+def l2_normalize(vectors):
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class EmbeddingProjection:
+    """
+    원본 임베딩 (N, source_dim) → 축소 임베딩 (N, dim) 투영
+
+    Attributes:
+        method (str): "pca" 또는 "truncate"
+        dim (int): 목표 차원
+        source_dim (int): 원본 임베딩 차원
+        mean, components: PCA 평균 (source_dim,)과 성분 행렬 (source_dim, dim) (truncate는 None)
+        model_name (str): 원본 임베딩 모델 이름 또는 로컬 경로 (검색 시 이 모델로 쿼리를 인코딩)
+    """
+    def __init__(self, method, dim, source_dim, mean=None, components=None, model_name=None, collection_id=None):
+        if method not in PROJECTION_METHODS:
+            raise ValueError(f"지원하지 않는 차원 축소 방식입니다: {method}")
+        self.method = method
+        self.dim = dim
+        self.source_dim = source_dim
+        self.mean = mean
+        self.components = components
+        self.model_name = model_name
+        self.collection_id = collection_id
+
+    @classmethod
+    def fit(cls, embeddings, dim, method="pca", model_name=None):
+        """
+        문서 임베딩 샘플로 투영을 만듭니다.
+
+        Args:
+            embeddings: (N, source_dim) 원본 문서 임베딩 샘플 (truncate는 차원 확인에만 사용)
+            dim: 목표 차원 (source_dim보다 작아야 함)
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        source_dim = embeddings.shape[1]
+        if not 0 < dim < source_dim:
+            raise ValueError(f"목표 차원({dim})은 원본 차원({source_dim})보다 작아야 합니다.")
+        if method == "truncate":
+            return cls(method, dim, source_dim, model_name=model_name)
+        if method != "pca":
+            raise ValueError(f"지원하지 않는 차원 축소 방식입니다: {method}")
+        if len(embeddings) < dim:
+            raise ValueError(f"PCA 학습 샘플 수({len(embeddings)})가 목표 차원({dim})보다 적습니다.")
+
+        # 정규화한 벡터 기준으로 학습 (검색은 방향만 비교)
+        embeddings = l2_normalize(embeddings)
+        mean = embeddings.mean(axis=0)
+        _, singular_values, vt = np.linalg.svd(embeddings - mean, full_matrices=False)
+        explained = (singular_values[:dim] ** 2).sum() / max((singular_values ** 2).sum(), 1e-12)
+        print(f"PCA {source_dim} → {dim}: explained variance {explained:.3f}")
+        return cls(method, dim, source_dim, mean=mean.astype(np.float32),
+                   components=vt[:dim].T.astype(np.float32), model_name=model_name)
+
+    def transform(self, embeddings):
+        """원본 임베딩 (N, source_dim) → L2 정규화된 축소 임베딩 (N, dim)"""
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if embeddings.shape[1] != self.source_dim:
+            raise ValueError(
+                f"임베딩 차원({embeddings.shape[1]})이 투영의 입력 차원({self.source_dim})과 다릅니다 "
+                f"(투영 모델: {self.model_name})"
+            )
+        if self.method == "truncate":
+            return l2_normalize(embeddings[:, :self.dim])
+        return l2_normalize((l2_normalize(embeddings) - self.mean) @ self.components)
+
+    # ---------------------------------------------------------------
+    # 저장 / 로드
+    # ---------------------------------------------------------------
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {"mean": self.mean, "components": self.components} if self.method == "pca" else {}
+        np.savez(
+            path,
+            version=np.array(PROJECTION_FORMAT_VERSION),
+            method=np.array(self.method),
+            dim=np.array(self.dim),
+            source_dim=np.array(self.source_dim),
+            model_name=np.array(self.model_name or ""),
+            collection_id=np.array(self.collection_id or ""),
+            **arrays
+        )
+        print(f"💾 Embedding projection saved: {path} ({self.method}, {self.source_dim} → {self.dim})")
+
+    @classmethod
+    def load(cls, path):
+        """저장된 투영 로드. 파일이 없거나 포맷 버전이 다르면 None 반환"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data["version"]) != PROJECTION_FORMAT_VERSION:
+                return None
+            method = str(data["method"])
+            return cls(
+                method, int(data["dim"]), int(data["source_dim"]),
+                mean=data["mean"] if method == "pca" else None,
+                components=data["components"] if method == "pca" else None,
+                model_name=str(data["model_name"]) or None,
+                collection_id=str(data["collection_id"]) or None
+            )
+
+    @classmethod
+    def load_for_collection(cls, collection, path=None):
+        """
+        컬렉션을 만들 때 저장된 투영 로드 (투영 없이 만든 컬렉션이면 None)
+        컬렉션이 투영 없이 다시 만들어졌으면 (컬렉션 ID 불일치) 이전 투영은 무시합니다.
+        """
+        path = path or get_projection_path(collection.name)
+        projection = cls.load(path)
+        if projection is None:
+            return None
+        if projection.collection_id != str(collection.id):
+            print(f"⚠️  Embedding projection does not match collection '{collection.name}', ignoring: {path}")
+            return None
+        print(f"Embedding projection loaded: {path} ({projection.method}, {projection.source_dim} → {projection.dim})")
+        return projection
+
+
+class ProjectedEmbeddingFunction(embedding_functions.EmbeddingFunction):
+    """원본 EmbeddingFunction 출력에 투영을 적용하는 EmbeddingFunction (ingest용)"""
+    def __init__(self, embedding_fn, projection):
+        self.embedding_fn = embedding_fn
+        self.projection = projection
+
+    def __call__(self, input: list) -> list:
+        return self.projection.transform(self.embedding_fn(input)).tolist()
+
+
+class ProjectedQueryEmbedder:
+    """QueryEmbedder와 같은 embed() 인터페이스로 캐시된 원본 쿼리 임베딩에 투영을 적용"""
+    def __init__(self, query_embedder, projection):
+        self.query_embedder = query_embedder
+        self.projection = projection
+        self.model_name = query_embedder.model_name
+
+    def embed(self, queries):
+        return self.projection.transform(self.query_embedder.embed(queries))
+
+
+def load_projected_query_embedder(projection, query_embedder, backend="torch"):
+    """
+    투영을 학습한 원본 모델로 쿼리를 인코딩하는 ProjectedQueryEmbedder
+    컬렉션을 기본 쿼리 모델(query_embedder)과 다른 모델(예: Qwen3-Embedding)로 만들었으면
+    그 모델의 쿼리 경로(쿼리 프롬프트 포함)로 인코딩해야 투영의 source_dim과 맞습니다.
+
+    Args:
+        projection: EmbeddingProjection.load_for_collection() 결과
+        query_embedder: 기본 쿼리 모델의 QueryEmbedder
+        backend: 원본 모델이 다를 때 사용할 임베딩 백엔드
+    """
+    from utils.query_embedding_cache import QueryEmbedder
+    from utils.embedding_backend import load_query_embedding_function, get_embedding_cache_tag
+
+    model_name = projection.model_name
+    if model_name and get_embedding_cache_tag(model_name, backend) != query_embedder.model_name:
+        print(f"Encoding queries with the projection's source model: {model_name}")
+        query_embedder = QueryEmbedder(get_embedding_cache_tag(model_name, backend),
+                                       lambda: load_query_embedding_function(model_name, backend))
+    return ProjectedQueryEmbedder(query_embedder, projection)
+
+
+def exact_top_k(query_embeddings, doc_embeddings, k):
+    """정규화된 벡터의 cosine top-k 문서 인덱스 (Q, k)"""
+    scores = query_embeddings @ doc_embeddings.T
+    k = min(k, scores.shape[1])
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def evaluate_projection(projection, doc_embeddings, query_embeddings, n_docs=None, k=PROJECTION_REPORT_K, repeats=5):
+    """
+    문서 샘플에서 축소 전후 검색 결과를 비교합니다.
+
+    Args:
+        doc_embeddings: (N, source_dim) 원본 문서 임베딩 샘플
+        query_embeddings: (Q, source_dim) 원본 쿼리 임베딩 (카탈로그 쿼리)
+        n_docs: 메모리 추정에 쓸 전체 문서 수 (기본값: 샘플 크기)
+    Returns:
+        dict: recall@k, 벡터 메모리(float32 기준), 샘플 전체 exact 검색 지연
+    """
+    full_docs = l2_normalize(np.asarray(doc_embeddings, dtype=np.float32))
+    full_queries = l2_normalize(np.asarray(query_embeddings, dtype=np.float32))
+    reduced_docs = projection.transform(doc_embeddings)
+    reduced_queries = projection.transform(query_embeddings)
+
+    def timed(queries, docs):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            top = exact_top_k(queries, docs, k)
+        return top, (time.perf_counter() - start) / repeats / len(queries) * 1000
+
+    full_top, full_ms = timed(full_queries, full_docs)
+    reduced_top, reduced_ms = timed(reduced_queries, reduced_docs)
+    recall = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(full_top, reduced_top)])
+
+    n_docs = n_docs or len(full_docs)
+    return {
+        "method": projection.method,
+        "source_dim": projection.source_dim,
+        "dim": projection.dim,
+        "sample_docs": len(full_docs),
+        "queries": len(full_queries),
+        f"recall_at_{k}": float(recall),
+        "vector_memory_mb": n_docs * projection.source_dim * 4 / 1024 ** 2,
+        "reduced_vector_memory_mb": n_docs * projection.dim * 4 / 1024 ** 2,
+        "query_ms": full_ms,
+        "reduced_query_ms": reduced_ms
+    }
+
+
+def fit_projection(embedding_fn, texts, dim, method="pca", queries=None, n_docs=None, model_name=None,
+                   query_embedding_fn=None, sample_size=PROJECTION_FIT_SAMPLE, batch_size=512, seed=42):
+    """
+    리뷰 원문 샘플을 원본 모델로 인코딩하여 투영을 학습하고 축소 전후 비교 리포트를 만듭니다 (ingest 전 호출).
+
+    Args:
+        embedding_fn: 원본 Chroma EmbeddingFunction
+        texts: 리뷰 원문 리스트 (sample_size개를 무작위 추출)
+        queries: 리포트용 쿼리 (기본값: 카탈로그 쿼리)
+        n_docs: 메모리 추정용 전체 문서 수 (기본값: len(texts))
+        model_name: 원본 모델 이름 또는 로컬 경로 (검색 시 쿼리 인코딩에 사용하므로 로드 가능한 값이어야 함)
+        query_embedding_fn: 리포트용 쿼리 EmbeddingFunction (기본값: embedding_fn).
+            쿼리 프롬프트가 있는 모델은 검색 때와 같은 쿼리 경로를 넘겨야 recall이 실제 검색과 맞습니다.
+    Returns:
+        (EmbeddingProjection, dict): 투영과 evaluate_projection() 리포트
+    """
+    from utils.query_embedding_cache import get_catalog_queries
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(texts), size=min(sample_size, len(texts)), replace=False)
+    sample_texts = [texts[i] for i in np.sort(sample)]
+    embeddings = []
+    for offset in range(0, len(sample_texts), batch_size):
+        embeddings.append(np.asarray(embedding_fn(sample_texts[offset:offset + batch_size]), dtype=np.float32))
+        print(f"Encoding projection sample: {offset + len(embeddings[-1]):,}/{len(sample_texts):,}", end='\r')
+    print()
+    embeddings = np.concatenate(embeddings)
+
+    projection = EmbeddingProjection.fit(embeddings, dim, method, model_name=model_name)
+    query_embeddings = np.asarray((query_embedding_fn or embedding_fn)(queries or get_catalog_queries()), dtype=np.float32)
+    report = evaluate_projection(projection, embeddings, query_embeddings, n_docs=n_docs or len(texts))
+    return projection, report
+
+
+def save_projection_report(report, collection_name):
+    """리포트를 출력하고 투영 옆에 JSON으로 저장"""
+    path = os.path.join(PROJECTION_DIR, f"{collection_name}.report.json")
+    os.makedirs(PROJECTION_DIR, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    k = next(key for key in report if key.startswith("recall_at_"))
+    print(f"📊 Projection {report['source_dim']} → {report['dim']} ({report['method']}): "
+          f"{k} {report[k]:.3f}, vectors {report['vector_memory_mb']:.1f} → {report['reduced_vector_memory_mb']:.1f} MB, "
+          f"exact query {report['query_ms']:.2f} → {report['reduced_query_ms']:.2f} ms ({report['sample_docs']:,} docs)")
+    print(f"💾 Projection report saved: {path}")
@@ -0,0 +1,99 @@
+"""
+비동기 Micro-batching 모듈
+짧은 시간(MICRO_BATCH_WAIT_MS) 안에 들어온 동시 검색 요청을 모아 한 번의 배치 호출로 처리하고,
+각 요청의 결과를 기다리던 task에 돌려줍니다.
+20개 이상의 task가 동시에 검색할 때 쿼리 하나짜리 검색 여러 번이 임베딩 조회 / 행렬 연산 몇 번으로 바뀝니다.
+
+같은 배치로 묶을 수 있는 요청끼리만 모이도록 key(예: 날짜, top_k)별로 대기열을 나누며,
+배치 함수는 블로킹 함수로 보고 별도 스레드에서 실행합니다. 한 배치가 실행되는 동안 다음 배치를 모으고
+바로 실행할 수 있도록 최대 MICRO_BATCH_CONCURRENCY개의 배치를 동시에 실행합니다 (배치 함수는 스레드 안전해야 함).
+동시 실행 제한(asyncio.Semaphore)은 이벤트 루프마다 처음 쓸 때 만들므로,
+retriever에 캐시된 batcher를 여러 번의 asyncio.run에서 다시 써도 됩니다.
+배치 안의 단계 span은 span_tracer.batch_scope()로 기다리던 task마다 연결됩니다 (요청 → 배치 시작 대기는 batch_wait).
+
+사용 예:
+    batcher = MicroBatcher(lambda key, items: retriever.retrieve_reviews_batch(items, *key))
+    docs = await batcher.submit((current_date_str, top_k), agent)
+"""
+import time
+import asyncio
+
+from utils.span_tracer import batch_scope, current_task_id
+
+# 첫 요청 이후 같은 배치로 더 모을 최대 대기 시간 (밀리초) / 배치 최대 크기 (도달하면 즉시 실행)
+MICRO_BATCH_WAIT_MS = 3.0
+MICRO_BATCH_SIZE = 32
+# 동시에 실행할 최대 배치 수 (1이면 배치를 한 번에 하나씩 실행)
+MICRO_BATCH_CONCURRENCY = 2
+
+
+class MicroBatcher:
+    """
+    Args:
+        batch_fn: (key, items) -> items 순서의 결과 리스트 (블로킹, asyncio.to_thread에서 실행)
+        max_batch_size: 배치 최대 요청 수
+        max_wait_ms: 첫 요청 이후 최대 대기 시간
+        max_concurrency: 동시에 실행할 최대 배치 수
+    """
+    def __init__(self, batch_fn, max_batch_size=MICRO_BATCH_SIZE, max_wait_ms=MICRO_BATCH_WAIT_MS,
+                 max_concurrency=MICRO_BATCH_CONCURRENCY):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrency = max_concurrency
+        self._loop = None         # 아래 상태가 묶인 이벤트 루프
+        self._run_slots = None    # 동시 실행 배치 수 제한 (이벤트 루프마다 생성)
+        self._pending = {}        # key -> [(item, future, (task_id, 요청 시각 ns))]
+        self._timers = {}         # key -> asyncio.TimerHandle
+        self._tasks = set()       # 실행 중인 배치 task (GC 방지)
+
+    def _bind_loop(self, loop):
+        """이벤트 루프가 바뀌었으면 (새 asyncio.run) 이전 루프에 묶인 상태를 버리고 새로 만듭니다."""
+        if self._loop is not loop:
+            self._loop = loop
+            self._run_slots = asyncio.Semaphore(self.max_concurrency)
+            self._pending = {}
+            self._timers = {}
+            self._tasks = set()
+
+    async def submit(self, key, item):
+        """요청 하나를 대기열에 넣고 배치 결과 중 자기 결과를 기다립니다."""
+        loop = asyncio.get_running_loop()
+        self._bind_loop(loop)
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((item, future, (current_task_id(), time.time_ns())))
+        if len(batch) >= self.max_batch_size:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+        return await future
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key, batch):
+        async with self._run_slots:
+            # 취소된 요청(wait_for 타임아웃 등)은 제외
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                return
+            try:
+                # 배치 안의 단계 span은 배치 trace로 기록한 뒤 기다리던 task마다 연결
+                with batch_scope("retrieval_batch", [waiter for _, _, waiter in batch]):
+                    results = await asyncio.to_thread(self.batch_fn, key, [item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
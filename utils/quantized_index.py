@@ -0,0 +1,245 @@
+"""
+양자화 벡터 인덱스 모듈 (int8 / binary 1차 검색 + float32 재점수화)
+날짜순 인덱스(utils/vector_index.py)와 같은 행 순서로 압축 코드를 저장하고,
+date <= date_int prefix 구간의 1차 검색은 압축 코드로만 수행합니다.
+쿼리별 상위 n_results × oversample개(최소 QUANTIZATION_MIN_SHORTLIST개) shortlist만 float32 날짜순 행렬(mmap)에서 읽어 정확한 거리로 다시 정렬합니다.
+
+    - "int8":   차원별 min/max 스칼라 양자화 (float32 대비 1/4 메모리)
+    - "binary": 평균을 뺀 부호 비트 (float32 대비 1/32 메모리, Hamming 거리)
+                차원이 낮으면 거리 해상도가 부족하므로 Qwen3-Embedding-8B처럼 고차원 임베딩에 적합
+
+압축 코드와 float32 행렬 모두 mmap으로 로드하며 float32 행렬은 shortlist 행만 페이지 캐시로 읽히므로,
+같은 RAM에서 몇 배 큰 코퍼스를 검색할 수 있습니다.
+
+사용 예:
+    python -m utils.quantized_index --method binary
+"""
+import os
+import argparse
+import numpy as np
+
+from utils import artifact_store
+from utils.vector_index import merge_top_k
+
+QUANTIZED_INDEX_DIR = os.path.join("datasets", "quantized_index")
+QUANTIZED_INDEX_FORMAT_VERSION = 1
+QUANTIZATION_METHODS = ("int8", "binary")
+QUANTIZATION_METHOD = "int8"
+# shortlist 크기 = n_results × oversample (binary는 거리 해상도가 낮아 더 크게)
+QUANTIZATION_OVERSAMPLE = {"int8": 4, "binary": 10}
+# top_k가 작은 검색(Static RAG top_k=2 등)에서도 재점수화할 최소 shortlist 크기
+QUANTIZATION_MIN_SHORTLIST = 256
+
+# binary 1차 검색에서 한 번에 만드는 (쿼리 수, 행 수, 코드 바이트) XOR 배열의 최대 크기
+BINARY_SCAN_BYTES = 64 * 1024 ** 2
+# 바이트별 set bit 수 (Hamming 거리용, numpy < 2.0에는 np.bitwise_count가 없음)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def get_quantized_index_path(collection_name, method):
+    """컬렉션 / 양자화 방식별 인덱스 디렉토리"""
+    return os.path.join(QUANTIZED_INDEX_DIR, collection_name, method)
+
+
+class QuantizedIndex:
+    """
+    DateSortedIndex 행 순서의 압축 코드 + float32 재점수화
+
+    Attributes:
+        vector_index (DateSortedIndex): 재점수화용 원본 정밀도 날짜순 인덱스 (mmap)
+        method (str): "int8" 또는 "binary"
+        codes (np.ndarray): int8은 (N, dim) int8, binary는 (N, ceil(dim / 8)) uint8
+        offset, scale: int8 복원 파라미터 (x ≈ (code + 128) · scale + offset)
+        center: binary 부호 기준 벡터 (dim,)
+        approx_sq_norms: int8 복원 벡터의 제곱 norm (N,)
+    """
+    def __init__(self, vector_index, method, codes, offset=None, scale=None, center=None, approx_sq_norms=None,
+                 oversample=None):
+        if method not in QUANTIZATION_METHODS:
+            raise ValueError(f"지원하지 않는 양자화 방식입니다: {method}")
+        self.vector_index = vector_index
+        self.method = method
+        self.codes = codes
+        self.offset = offset
+        self.scale = scale
+        self.center = center
+        self.approx_sq_norms = approx_sq_norms
+        self.oversample = oversample or QUANTIZATION_OVERSAMPLE[method]
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def ids(self):
+        return self.vector_index.ids
+
+    @property
+    def dates(self):
+        return self.vector_index.dates
+
+    # ---------------------------------------------------------------
+    # 생성 / 저장 / 로드
+    # ---------------------------------------------------------------
+    @classmethod
+    def build(cls, vector_index, method=QUANTIZATION_METHOD):
+        """
+        날짜순 인덱스의 임베딩을 block_size 단위로 읽어 압축 코드를 만듭니다.
+        DateSortedIndex.load_or_build()가 컬렉션을 디스크로 바로 내보내고(build_to_path) mmap으로 로드하므로,
+        양자화 중에도 float32 전체 행렬이 RAM에 올라가지 않습니다.
+        """
+        if method not in QUANTIZATION_METHODS:
+            raise ValueError(f"지원하지 않는 양자화 방식입니다: {method}")
+        embeddings = vector_index.embeddings
+        n, dim = embeddings.shape
+        block_size = vector_index.block_size
+        print(f"Quantizing {n:,} vectors ({method}, dim={dim})...")
+
+        def blocks():
+            for start in range(0, n, block_size):
+                yield start, np.asarray(embeddings[start:start + block_size], dtype=np.float32)
+
+        if method == "binary":
+            center = np.zeros(dim, dtype=np.float64)
+            for _, block in blocks():
+                center += block.sum(axis=0)
+            center = (center / max(n, 1)).astype(np.float32)
+            codes = np.empty((n, (dim + 7) // 8), dtype=np.uint8)
+            for start, block in blocks():
+                codes[start:start + len(block)] = np.packbits(block > center, axis=1)
+            return cls(vector_index, method, codes, center=center)
+
+        low = np.full(dim, np.inf, dtype=np.float32)
+        high = np.full(dim, -np.inf, dtype=np.float32)
+        for _, block in blocks():
+            low = np.minimum(low, block.min(axis=0))
+            high = np.maximum(high, block.max(axis=0))
+        scale = np.maximum(high - low, 1e-12) / 255.0
+        codes = np.empty((n, dim), dtype=np.int8)
+        approx_sq_norms = np.empty(n, dtype=np.float32)
+        for start, block in blocks():
+            block_codes = np.clip(np.rint((block - low) / scale), 0, 255) - 128
+            codes[start:start + len(block)] = block_codes
+            restored = (block_codes + 128) * scale + low
+            approx_sq_norms[start:start + len(block)] = np.einsum('ij,ij->i', restored, restored)
+        return cls(vector_index, method, codes, offset=low, scale=scale.astype(np.float32),
+                   approx_sq_norms=approx_sq_norms)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "codes.npy"), self.codes)
+        params = {"offset": self.offset, "scale": self.scale, "center": self.center,
+                  "approx_sq_norms": self.approx_sq_norms}
+        for name, value in params.items():
+            if value is not None:
+                np.save(os.path.join(path, f"{name}.npy"), value)
+        artifact_store.write_meta(path, QUANTIZED_INDEX_FORMAT_VERSION, method=self.method,
+                                  **artifact_store.vector_index_fields(self.vector_index))
+        size_mb = self.codes.nbytes / 1024 ** 2
+        full_mb = self.vector_index.embeddings.nbytes / 1024 ** 2
+        print(f"💾 Quantized index saved: {path} ({len(self):,} rows, {self.method}, "
+              f"{size_mb:.1f} MB codes vs {full_mb:.1f} MB {self.vector_index.embeddings.dtype})")
+
+    @classmethod
+    def load(cls, vector_index, path):
+        """저장된 인덱스가 날짜순 인덱스와 일치하면 로드, 아니면 None"""
+        meta = artifact_store.read_meta(path, QUANTIZED_INDEX_FORMAT_VERSION,
+                                        **artifact_store.vector_index_fields(vector_index))
+        if meta is None:
+            return None
+
+        def optional(name):
+            file_path = os.path.join(path, f"{name}.npy")
+            return np.load(file_path) if os.path.exists(file_path) else None
+
+        # 압축 코드도 mmap으로 로드 (1차 검색이 block 단위로 순서대로 읽으므로 페이지 캐시로 충분)
+        return cls(vector_index, meta["method"], np.load(os.path.join(path, "codes.npy"), mmap_mode="r"),
+                   offset=optional("offset"), scale=optional("scale"), center=optional("center"),
+                   approx_sq_norms=optional("approx_sq_norms"))
+
+    @classmethod
+    def load_or_build(cls, vector_index, collection_name, method=QUANTIZATION_METHOD, path=None):
+        path = path or get_quantized_index_path(collection_name, method)
+        return artifact_store.load_or_build(
+            path,
+            lambda p: cls.load(vector_index, p),
+            lambda: cls.build(vector_index, method),
+            "Quantized index", lambda index: f"{len(index):,} rows, {index.method}"
+        )
+
+    # ---------------------------------------------------------------
+    # 검색
+    # ---------------------------------------------------------------
+    def iter_approx_distances(self, query_embeddings, end):
+        """[0, end) 구간을 block_size 단위로 나누어 (블록 시작 행, (Q, B) 근사 거리)를 반환"""
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        block_size = self.vector_index.block_size
+        if self.method == "binary":
+            query_bits = np.packbits(queries > self.center, axis=1)
+            # 쿼리 배치 전체를 한 번에 XOR / popcount하되 (Q, B, 바이트) 중간 배열이 BINARY_SCAN_BYTES를 넘지 않도록 B를 줄임
+            step = max(1, min(block_size, BINARY_SCAN_BYTES // max(query_bits.size, 1)))
+            for block_start in range(0, end, step):
+                block = self.codes[block_start:min(block_start + step, end)]
+                xor = np.bitwise_xor(query_bits[:, None, :], block[None, :, :])
+                yield block_start, _POPCOUNT[xor].sum(axis=2, dtype=np.int32).astype(np.float32)
+            return
+
+        # x ≈ (code + 128) · scale + offset → q·x ≈ (q · scale)·(code + 128) + q·offset
+        scaled = queries * self.scale
+        q_offset = queries @ self.offset
+        q_sq_norms = np.einsum('ij,ij->i', queries, queries)
+        for block_start in range(0, end, block_size):
+            block_end = min(block_start + block_size, end)
+            dots = scaled @ (self.codes[block_start:block_end].astype(np.float32) + 128.0).T + q_offset[:, None]
+            yield block_start, self._approx_distances(dots, q_sq_norms, self.approx_sq_norms[block_start:block_end])
+
+    def _approx_distances(self, dots, q_sq_norms, sq_norms):
+        space = self.vector_index.space
+        if space == "cosine":
+            denom = np.sqrt(q_sq_norms)[:, None] * np.sqrt(sq_norms)[None, :]
+            return 1.0 - dots / np.maximum(denom, 1e-12)
+        if space == "ip":
+            return 1.0 - dots
+        return np.maximum(q_sq_norms[:, None] + sq_norms[None, :] - 2.0 * dots, 0.0)
+
+    def search(self, query_embeddings, date_int, n_results):
+        """
+        DateSortedIndex.search()와 같은 형식의 결과.
+        압축 코드로 shortlist(max(n_results × oversample, QUANTIZATION_MIN_SHORTLIST))를 고른 뒤 shortlist 행만 원본 정밀도로 재점수화합니다.
+
+        Returns:
+            tuple: (rows, distances) - 각각 (Q, k) 배열, 정확한 거리 오름차순
+        """
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        n_queries = len(queries)
+        end = self.vector_index.prefix_length(date_int)
+        k = min(n_results, end)
+        if k <= 0:
+            return np.empty((n_queries, 0), dtype=np.int64), np.empty((n_queries, 0), dtype=np.float32)
+
+        shortlist_size = min(end, max(k * self.oversample, QUANTIZATION_MIN_SHORTLIST))
+        shortlist, _ = merge_top_k(self.iter_approx_distances(queries, end), n_queries, shortlist_size)
+        best_rows = np.empty((n_queries, k), dtype=np.int64)
+        best_dist = np.empty((n_queries, k), dtype=np.float32)
+        for q in range(n_queries):
+            # mmap 행렬에서 날짜순으로 읽도록 행 번호를 정렬한 뒤 정확한 거리 계산
+            rows = np.sort(shortlist[q])
+            distances = self.vector_index.row_distances(queries[q], rows)
+            order = np.argsort(distances, kind='stable')[:k]
+            best_rows[q], best_dist[q] = rows[order], distances[order]
+        return best_rows, best_dist
+
+
+if __name__ == "__main__":
+    import chromadb
+    from utils.vector_index import DateSortedIndex
+
+    parser = argparse.ArgumentParser(description='Quantize the date-sorted vector index for the "quantized" search backend.')
+    parser.add_argument('--db-path', default=os.path.join("datasets", "chroma_db"), help='ChromaDB path')
+    parser.add_argument('--collection', default="cyberpunk2077_reviews", help='Collection name')
+    parser.add_argument('--method', choices=QUANTIZATION_METHODS, default=QUANTIZATION_METHOD, help='Quantization method')
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.db_path)
+    collection = client.get_collection(name=args.collection, embedding_function=None)
+    vector_index = DateSortedIndex.load_or_build(collection)
+    QuantizedIndex.build(vector_index, args.method).save(get_quantized_index_path(args.collection, args.method))
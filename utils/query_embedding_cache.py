@@ -0,0 +1,162 @@
+"""
+검색 쿼리 임베딩 캐시 모듈
+utils/search_queries.py의 고정 쿼리 카탈로그(GAMER_TYPE_QUERIES + GENERAL_QUERY)를
+임베딩 모델별로 한 번만 인코딩하여 디스크에 저장하고, 검색 시 query_embeddings로 재사용합니다.
+"""
+import os
+import json
+import hashlib
+import argparse
+import threading
+import numpy as np
+
+from utils.search_queries import GAMER_TYPE_QUERIES, GENERAL_QUERY
+
+# 캐시 저장 위치 및 포맷 버전
+# 포맷이 바뀌면 CACHE_FORMAT_VERSION을 올려서 기존 캐시를 자동으로 무효화합니다.
+QUERY_CACHE_DIR = os.path.join("datasets", "query_embeddings")
+CACHE_FORMAT_VERSION = 1
+
+
+def get_catalog_queries():
+    """
+    고정 쿼리 카탈로그를 중복 없이, 항상 같은 순서로 반환합니다.
+    Returns:
+        list: GENERAL_QUERY + 모든 게이머 유형의 쿼리
+    """
+    queries = [GENERAL_QUERY]
+    for type_queries in GAMER_TYPE_QUERIES.values():
+        queries.extend(type_queries)
+    return list(dict.fromkeys(queries))
+
+
+def catalog_fingerprint(queries):
+    """쿼리 목록의 해시 (search_queries.py가 수정되면 캐시를 다시 만들기 위함)"""
+    payload = json.dumps(list(queries), ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def get_cache_path(model_name):
+    """모델별 캐시 파일 경로 (로컬 모델 경로가 들어오면 디렉토리 이름만 사용)"""
+    model_tag = os.path.basename(os.path.normpath(model_name))
+    return os.path.join(QUERY_CACHE_DIR, f"{model_tag}.v{CACHE_FORMAT_VERSION}.npz")
+
+
+def build_query_embedding_cache(model_name, embedding_fn=None):
+    """
+    카탈로그 전체를 인코딩하여 캐시 파일로 저장합니다.
+
+    Args:
+        model_name (str): 임베딩 모델 이름 (캐시 파일 키로 사용)
+        embedding_fn: Chroma EmbeddingFunction. None이면 SentenceTransformer(model_name)을 로드
+    Returns:
+        dict: {쿼리 텍스트: 임베딩 벡터(np.float32)}
+    """
+    if embedding_fn is None:
+        from chromadb.utils import embedding_functions
+        embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
+
+    queries = get_catalog_queries()
+    embeddings = np.asarray(embedding_fn(queries), dtype=np.float32)
+
+    cache_path = get_cache_path(model_name)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    np.savez(
+        cache_path,
+        queries=np.array(queries),
+        embeddings=embeddings,
+        model_name=np.array(model_name),
+        version=np.array(CACHE_FORMAT_VERSION),
+        fingerprint=np.array(catalog_fingerprint(queries))
+    )
+    print(f"💾 Query embedding cache saved: {cache_path} ({len(queries)} queries, dim={embeddings.shape[1]})")
+    return dict(zip(queries, embeddings))
+
+
+def load_query_embedding_cache(model_name):
+    """
+    저장된 캐시를 로드합니다. 파일이 없거나 버전/카탈로그가 바뀌었으면 None을 반환합니다.
+    Returns:
+        dict | None: {쿼리 텍스트: 임베딩 벡터(np.float32)}
+    """
+    cache_path = get_cache_path(model_name)
+    if not os.path.exists(cache_path):
+        return None
+
+    with np.load(cache_path) as data:
+        version = int(data["version"])
+        fingerprint = str(data["fingerprint"])
+        queries = [str(q) for q in data["queries"]]
+        embeddings = data["embeddings"].astype(np.float32)
+
+    if version != CACHE_FORMAT_VERSION or fingerprint != catalog_fingerprint(get_catalog_queries()):
+        print(f"⚠️  Query embedding cache is stale, ignoring: {cache_path}")
+        return None
+    return dict(zip(queries, embeddings))
+
+
+class QueryEmbedder:
+    """
+    쿼리 임베딩 제공자
+    카탈로그 쿼리는 디스크 캐시에서 바로 꺼내고, 캐시에 없는 쿼리가 들어올 때만
+    임베딩 모델(SentenceTransformer)을 지연 로드하여 인코딩합니다.
+    """
+    def __init__(self, model_name, embedding_fn_factory):
+        """
+        Args:
+            model_name (str): 임베딩 모델 이름
+            embedding_fn_factory (callable): 인자 없이 호출하면 Chroma EmbeddingFunction을 반환하는 함수
+        """
+        self.model_name = model_name
+        self._embedding_fn_factory = embedding_fn_factory
+        self._embedding_fn = None
+        # aretrieve_reviews()의 배치는 여러 스레드에서 동시에 실행되므로 캐시 생성 / 모델 로드 / 인코딩은 한 번에 하나씩
+        self._lock = threading.Lock()
+        self.cache = load_query_embedding_cache(model_name)
+        if self.cache is not None:
+            print(f"Query embedding cache loaded: {len(self.cache)} queries ({model_name})")
+        else:
+            print(f"Query embedding cache not found for {model_name}. It will be built on first use.")
+
+    @property
+    def embedding_fn(self):
+        """임베딩 모델 (처음 필요할 때 한 번만 로드)"""
+        if self._embedding_fn is None:
+            self._embedding_fn = self._embedding_fn_factory()
+        return self._embedding_fn
+
+    def embed(self, queries):
+        """
+        쿼리 목록을 임베딩합니다.
+        Args:
+            queries (list): 쿼리 텍스트 리스트
+        Returns:
+            np.ndarray: (len(queries), dim) float32 행렬
+        """
+        if self.cache is None:
+            with self._lock:
+                if self.cache is None:
+                    # 모델을 어차피 로드해야 하므로 카탈로그 전체를 한 번에 인코딩하여 저장
+                    self.cache = build_query_embedding_cache(self.model_name, self.embedding_fn)
+
+        missing = [q for q in dict.fromkeys(queries) if q not in self.cache]
+        extra = {}
+        if missing:
+            # 카탈로그 밖의 쿼리(테스트용 임의 쿼리 등)만 모델로 인코딩
+            with self._lock:
+                extra = dict(zip(missing, np.asarray(self.embedding_fn(missing), dtype=np.float32)))
+
+        return np.stack([self.cache[q] if q in self.cache else extra[q] for q in queries])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Precompute query embeddings for the search query catalog.')
+    parser.add_argument('--model', default="all-MiniLM-L6-v2", help='Embedding model name or local path')
+    parser.add_argument('--backend', choices=["torch", "onnx", "onnx-int8"], default="torch", help='Embedding backend')
+    args = parser.parse_args()
+
+    from utils.embedding_backend import load_embedding_function, get_embedding_cache_tag
+    build_query_embedding_cache(
+        get_embedding_cache_tag(args.model, args.backend),
+        load_embedding_function(args.model, args.backend)
+    )
@@ -0,0 +1,57 @@
+"""
+페르소나 쿼리 벡터 결합 모듈
+에이전트가 고른 여러 쿼리(4개 랜덤 + GENERAL_QUERY)를 쿼리마다 따로 검색하는 대신
+결합된 벡터 하나로 한 번만 검색합니다 (에이전트당 ANN 호출 5회 → 1회).
+
+- "mean": 정규화한 쿼리 임베딩의 가중 평균(다시 정규화)으로 검색하고, 그 거리를 그대로 similarity로 사용
+- "maxsim": 평균 벡터로 공유 후보 풀을 검색한 뒤, 후보마다 각 쿼리와의 similarity 중 최댓값으로 다시 점수화
+    (쿼리별 검색의 "가장 잘 맞는 쿼리 기준 점수"와 같은 의미, 후보 임베딩은 날짜순 인덱스에서 조회)
+
+쿼리별 검색 대비 recall은 experiment_validation/evaluate_query_fusion_recall.py로 측정합니다.
+"""
+import numpy as np
+
+from utils.collection_config import distance_to_similarity
+
+QUERY_FUSION_MODES = ("mean", "maxsim")
+# 결합 벡터 하나로 가져올 후보 수 (쿼리별 검색은 쿼리 수 × 후보 수를 합쳐 재랭킹)
+FUSED_CANDIDATE_POOL_SIZE = 600
+
+
+def validate_query_fusion(query_fusion):
+    if query_fusion is not None and query_fusion not in QUERY_FUSION_MODES:
+        raise ValueError(f"지원하지 않는 쿼리 결합 방식입니다: {query_fusion}")
+
+
+def fuse_query_embeddings(query_embeddings, weights=None):
+    """
+    쿼리 임베딩 (Q, dim) → 정규화된 가중 평균 벡터 (dim,)
+
+    Args:
+        weights: 쿼리별 가중치 (None이면 균등)
+    """
+    vectors = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    fused = np.average(vectors, axis=0, weights=weights)
+    return (fused / max(np.linalg.norm(fused), 1e-12)).astype(np.float32)
+
+
+def maxsim_similarity(query_embeddings, vector_index, ids):
+    """
+    후보 리뷰마다 쿼리별 similarity의 최댓값
+
+    Args:
+        query_embeddings: (Q, dim) 에이전트의 쿼리 임베딩
+        vector_index: 후보 임베딩을 가진 DateSortedIndex
+        ids: 후보 리뷰 ID 배열
+    Returns:
+        np.ndarray: ids 순서의 similarity
+    """
+    if len(ids) == 0:
+        return np.empty(0)
+    rows = vector_index.rows_for_ids(ids)
+    similarity = [
+        distance_to_similarity(vector_index.row_distances(query, rows), vector_index.space)
+        for query in np.atleast_2d(query_embeddings)
+    ]
+    return np.max(similarity, axis=0)
@@ -0,0 +1,186 @@
+"""
+2단계 임베딩 캐스케이드용 재점수화(re-scoring) 벡터 모듈
+후보 풀은 가벼운 all-MiniLM-L6-v2 컬렉션에서 날짜 필터 검색으로 만들고,
+최종 similarity는 ingest 때 한 번 계산해 둔 큰 모델(Qwen3-Embedding-8B 등)의 문서 벡터로 후보만 다시 계산합니다.
+
+- 문서 벡터: 리뷰 날짜순 DateSortedIndex 형식으로 저장 (datasets/rescore_index/<컬렉션>/<모델>/, float16 mmap)
+  → 배치마다 디스크에 바로 쓰고 (중단되면 이어서 인코딩), 검색 시 후보 행만 디스크에서 읽음
+- 쿼리 벡터: 카탈로그 쿼리 임베딩 캐시(utils/query_embedding_cache.py)에 모델별로 저장
+  → 큰 모델은 검색마다가 아니라 distinct 카탈로그 쿼리마다 한 번만 실행
+
+기존 컬렉션에 대해 문서 벡터 생성 (ingest 시에는 build_chroma_db.py --rescore-model):
+    python -m utils.rescore_index --model models/Qwen3-Embedding-8B --backend onnx-int8
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+from utils import artifact_store
+from utils.vector_index import DateSortedIndex, INDEX_FORMAT_VERSION
+
+RESCORE_INDEX_DIR = os.path.join("datasets", "rescore_index")
+# 재점수화는 모델 출력의 정규화 여부와 관계없이 cosine similarity 사용
+RESCORE_SPACE = "cosine"
+# 큰 모델 인코딩 배치 크기
+RESCORE_BATCH_SIZE = 64
+# 중단된 인코딩을 이어서 하기 위한 진행 상황 파일 (인덱스가 완성되면 삭제)
+RESCORE_PROGRESS_FILE = "progress.json"
+
+
+def get_rescore_index_path(collection_name, model_name):
+    """컬렉션 / 모델별 재점수화 벡터 디렉토리 (로컬 모델 경로가 들어오면 디렉토리 이름만 사용)"""
+    return os.path.join(RESCORE_INDEX_DIR, collection_name, os.path.basename(os.path.normpath(model_name)))
+
+
+def build_rescore_index(ids, dates, texts, embedding_fn, path, collection_id=None, batch_size=RESCORE_BATCH_SIZE,
+                        dtype=np.float16):
+    """
+    리뷰 원문을 큰 모델로 인코딩하여 날짜순 재점수화 인덱스를 path에 바로 씁니다.
+    벡터는 배치마다 embeddings.building.npy(mmap)에 쓰고 진행 상황(progress.json)을 갱신하므로,
+    전체 행렬을 RAM에 올리지 않고 중간에 끊겨도 같은 리뷰 목록이면 마지막으로 끝난 배치 다음부터 이어서 인코딩합니다.
+    meta.json은 모든 벡터를 쓴 뒤 마지막에 기록합니다.
+
+    Args:
+        ids, dates, texts: 리뷰 ID / YYYYMMDD 날짜 / 원문 (같은 순서, texts는 TextStore.view()처럼 인덱싱만 되면 됨)
+        embedding_fn: Chroma EmbeddingFunction (문서 인코딩용)
+        path: 저장 디렉토리 (get_rescore_index_path())
+        dtype: 저장 정밀도 (기본 float16, 후보 행만 읽으므로 디스크 / 페이지 캐시 사용량이 절반)
+    Returns:
+        DateSortedIndex: path에서 mmap으로 로드한 인덱스
+    """
+    dates = np.asarray(dates, dtype=np.int64)
+    order = np.argsort(dates, kind='stable')
+    sorted_ids = np.array(ids, dtype=str)[order]
+    sorted_dates = dates[order]
+    total = len(order)
+
+    os.makedirs(path, exist_ok=True)
+    artifact_store.clear_meta(path)
+    building_path = os.path.join(path, "embeddings.building.npy")
+    progress_path = os.path.join(path, RESCORE_PROGRESS_FILE)
+
+    embeddings, done = _open_partial_build(path, sorted_ids, collection_id, dtype)
+    if embeddings is None:
+        np.save(os.path.join(path, "ids.npy"), sorted_ids)
+        np.save(os.path.join(path, "dates.npy"), sorted_dates)
+    else:
+        print(f"Resuming re-scoring vectors from {done:,}/{total:,}")
+
+    start = time.perf_counter()
+    for offset in range(done, total, batch_size):
+        # 원문은 배치마다 날짜순으로 읽음 (전체 원문 목록을 만들지 않음)
+        batch_texts = [texts[i] for i in order[offset:offset + batch_size]]
+        block = np.asarray(embedding_fn(batch_texts), dtype=dtype)
+        if embeddings is None:
+            embeddings = np.lib.format.open_memmap(building_path, mode="w+", dtype=dtype, shape=(total, block.shape[1]))
+        embeddings[offset:offset + len(block)] = block
+        embeddings.flush()
+        with open(progress_path, "w", encoding="utf-8") as f:
+            json.dump({"collection_id": collection_id, "dtype": np.dtype(dtype).name, "done": offset + len(block)}, f)
+        rate = (offset + len(block) - done) / max(time.perf_counter() - start, 1e-9)
+        print(f"Encoding re-scoring vectors: {offset + len(block):,}/{total:,} ({rate:.1f} docs/s)", end='\r')
+    print()
+
+    if embeddings is None:
+        embeddings = np.empty((0, 0), dtype=dtype)
+        np.save(building_path, embeddings)
+    del embeddings
+    os.replace(building_path, os.path.join(path, "embeddings.npy"))
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+
+    index = DateSortedIndex(
+        ids=sorted_ids,
+        dates=sorted_dates,
+        embeddings=np.load(os.path.join(path, "embeddings.npy"), mmap_mode='r'),
+        space=RESCORE_SPACE,
+        collection_id=collection_id
+    )
+    artifact_store.write_meta(path, INDEX_FORMAT_VERSION, **artifact_store.vector_index_fields(index),
+                              dtype=np.dtype(dtype).name)
+    print(f"💾 Re-scoring index saved: {path} ({len(index):,} rows, {np.dtype(dtype).name})")
+    return index
+
+
+def _open_partial_build(path, sorted_ids, collection_id, dtype):
+    """
+    이전에 중단된 인코딩이 같은 리뷰 목록 / 컬렉션 / dtype이면 (building 행렬 mmap, 끝난 행 수), 아니면 (None, 0)
+    """
+    progress_path = os.path.join(path, RESCORE_PROGRESS_FILE)
+    building_path = os.path.join(path, "embeddings.building.npy")
+    ids_path = os.path.join(path, "ids.npy")
+    if not all(os.path.exists(p) for p in (progress_path, building_path, ids_path)):
+        return None, 0
+    with open(progress_path, encoding="utf-8") as f:
+        progress = json.load(f)
+    if progress.get("collection_id") != collection_id or progress.get("dtype") != np.dtype(dtype).name:
+        return None, 0
+    if not np.array_equal(np.load(ids_path), sorted_ids):
+        return None, 0
+    embeddings = np.load(building_path, mmap_mode='r+')
+    if len(embeddings) != len(sorted_ids):
+        return None, 0
+    return embeddings, int(progress["done"])
+
+
+def build_rescore_index_from_collection(collection, embedding_fn, text_store, path, **kwargs):
+    """기존 컬렉션의 리뷰 (원문은 mmap 원문 저장소에서)로 재점수화 인덱스 생성"""
+    index = DateSortedIndex.load_or_build(collection)
+    texts = text_store.view(index.ids)
+    return build_rescore_index(index.ids, index.dates, texts, embedding_fn, path, collection_id=str(collection.id),
+                               **kwargs)
+
+
+def load_rescore_index(collection, model_name):
+    """
+    컬렉션과 일치하는 재점수화 인덱스 로드 (없거나 컬렉션이 다시 만들어졌으면 FileNotFoundError)
+    큰 모델로 코퍼스 전체를 인코딩해야 하므로 검색 시 자동으로 만들지 않습니다.
+    """
+    path = get_rescore_index_path(collection.name, model_name)
+    index = DateSortedIndex.load(path)
+    if index is None or index.collection_id != str(collection.id) or len(index) != collection.count():
+        raise FileNotFoundError(
+            f"컬렉션과 일치하는 재점수화 벡터가 없습니다: {path} "
+            f"(python -m utils.rescore_index --model {model_name} 로 생성)"
+        )
+    print(f"Re-scoring index loaded: {path} ({len(index):,} rows, dim={index.embeddings.shape[1]})")
+    return index
+
+
+def rescore_similarity(index, query_embedding, ids):
+    """
+    후보 리뷰 ID들의 재점수화 similarity (ids 순서 유지)
+
+    Args:
+        index: load_rescore_index()가 반환한 DateSortedIndex
+        query_embedding: 큰 모델의 쿼리 벡터 (dim,)
+    """
+    from utils.collection_config import distance_to_similarity
+
+    if len(ids) == 0:
+        return np.empty(0)
+    rows = index.rows_for_ids(ids)
+    return distance_to_similarity(index.row_distances(query_embedding, rows), index.space)
+
+
+if __name__ == "__main__":
+    import chromadb
+    from utils.embedding_backend import load_embedding_function, EMBEDDING_BACKENDS
+    from utils.text_store import ReviewTextStore, get_review_text_store_path
+
+    parser = argparse.ArgumentParser(description='Encode re-scoring document vectors for an existing Chroma collection.')
+    parser.add_argument('--db-path', default=os.path.join("datasets", "chroma_db"), help='ChromaDB path')
+    parser.add_argument('--collection', default="cyberpunk2077_reviews", help='Collection name')
+    parser.add_argument('--model', default=os.path.join("models", "Qwen3-Embedding-8B"), help='Re-scoring model name or local path')
+    parser.add_argument('--backend', choices=EMBEDDING_BACKENDS, default="torch", help='Embedding backend')
+    parser.add_argument('--batch-size', type=int, default=RESCORE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.db_path)
+    collection = client.get_collection(name=args.collection, embedding_function=None)
+    text_store = ReviewTextStore.load_or_build(collection, get_review_text_store_path(args.collection))
+    embedding_fn = load_embedding_function(args.model, args.backend, trust_remote_code=True)
+    build_rescore_index_from_collection(collection, embedding_fn, text_store,
+                                        get_rescore_index_path(args.collection, args.model), batch_size=args.batch_size)
@@ -0,0 +1,139 @@
+"""
+공유 검색 계획(Retrieval Plan) 모듈
+같은 게이머 유형의 에이전트 13명은 그 유형의 쿼리 10개 중 4개(+ GENERAL_QUERY)를 각자 골라 검색하므로,
+한 날짜 안에서 같은 (쿼리, 날짜) 검색이 여러 번 반복됩니다.
+
+시뮬레이션 시작 전에 모든 (에이전트, 날짜)의 쿼리를 기존 시뮬레이션과 같은 방식으로 미리 선정해
+모집단 전체의 distinct (쿼리, 날짜) 쌍(최대 81 × 날짜 수)을 구하고,
+날짜마다 한 번의 배치 검색(retrieve_reviews_batch)으로 각 쌍을 한 번씩만 검색합니다.
+에이전트별 컨텍스트는 이 공유 결과에서 조립하므로 에이전트가 받는 컨텍스트는 바뀌지 않습니다.
+Time-Aware 검색기에는 선정된 쿼리를 agent_queries= / queries=로 그대로 넘겨 다시 선정하지 않도록 합니다.
+
+사용 예:
+    plan = RetrievalPlan(personas, simulation_dates)
+    print(plan.summary())
+    results = retriever.retrieve_reviews_batch(plan.date_queries[date_str], date_str, top_k=2)       # Static
+    results = retriever.retrieve_reviews_batch(plan.agents_for(date_str), date_str,
+                                               agent_queries=plan.queries_for_date(date_str))        # Time-Aware
+"""
+import time
+import random
+import asyncio
+from types import SimpleNamespace
+
+from utils.search_queries import GAMER_TYPE_QUERIES, GENERAL_QUERY
+from utils.span_tracer import batch_scope, current_task_id
+
+# 에이전트가 자기 유형의 쿼리 중 랜덤으로 고르는 개수 (+ GENERAL_QUERY)
+QUERIES_PER_AGENT = 4
+
+
+def select_agent_queries(gamer_type, rng=random):
+    """쿼리 선정 (Team 2 / Team 3 공통: 4개 랜덤 + GENERAL_QUERY, 쿼리가 4개 미만이면 전부)"""
+    agent_queries = GAMER_TYPE_QUERIES.get(gamer_type, [])
+    if len(agent_queries) >= QUERIES_PER_AGENT:
+        selected_queries = rng.sample(agent_queries, QUERIES_PER_AGENT)
+    else:
+        selected_queries = list(agent_queries)
+    selected_queries.append(GENERAL_QUERY)
+    return selected_queries
+
+
+class RetrievalPlan:
+    """
+    (에이전트, 날짜)별 선정 쿼리와 날짜별 distinct 쿼리
+
+    Attributes:
+        personas (list): 에이전트 리스트
+        dates (list): 시뮬레이션 날짜 리스트 (YYYY-MM-DD)
+        agent_queries (dict): {(에이전트 ID, 날짜): 선정된 쿼리 리스트}
+        date_queries (dict): {날짜: 그 날짜의 모든 에이전트가 고른 distinct 쿼리 리스트 (처음 나온 순서)}
+    """
+    def __init__(self, personas, dates, rng=random):
+        self.personas = list(personas)
+        self.dates = list(dates)
+        self.agent_queries = {}
+        self.date_queries = {}
+        # 기존 시뮬레이션 루프와 같은 순서 (날짜 → 에이전트)로 선정
+        for date_str in self.dates:
+            for persona in self.personas:
+                self.agent_queries[(persona.id, date_str)] = select_agent_queries(persona.gamer_type, rng)
+            self.date_queries[date_str] = list(dict.fromkeys(
+                query for persona in self.personas for query in self.agent_queries[(persona.id, date_str)]
+            ))
+        # shared_result()의 날짜별 검색 task
+        self._shared = {}
+        # 날짜별 공유 검색을 기다리는 task [(task_id, 요청 시각 ns)] (span 연결용)
+        self._waiters = {}
+
+    def queries_for(self, persona, date_str):
+        """에이전트가 해당 날짜에 고른 쿼리 리스트"""
+        return self.agent_queries[(persona.id, date_str)]
+
+    def queries_for_date(self, date_str):
+        """날짜의 에이전트별 선정 쿼리 리스트 (personas 순서, retrieve_reviews_batch(agent_queries=...)용)"""
+        return [self.queries_for(persona, date_str) for persona in self.personas]
+
+    def agent_for(self, persona, date_str=None):
+        """
+        Time-Aware retrieve_reviews(_batch)에 넘길 에이전트 (ID + 게이머 유형의 쿼리 목록)
+        워커 프로세스 / 검색 서버로 전달할 수 있도록 SimpleNamespace 사용.
+        검색할 쿼리는 queries= / agent_queries=로 따로 넘깁니다 (검색기가 search_queries에서 다시 선정하지 않도록).
+        """
+        return SimpleNamespace(id=persona.id, search_queries=list(GAMER_TYPE_QUERIES.get(persona.gamer_type, [])))
+
+    def agents_for(self, date_str):
+        """날짜의 모든 에이전트 (personas 순서)"""
+        return [self.agent_for(persona, date_str) for persona in self.personas]
+
+    @property
+    def n_agent_queries(self):
+        """에이전트별로 검색할 때의 (쿼리, 날짜) 검색 수 (에이전트 안에서 중복된 쿼리는 한 번만 검색)"""
+        return sum(len(set(queries)) for queries in self.agent_queries.values())
+
+    @property
+    def n_distinct(self):
+        """공유 계획의 distinct (쿼리, 날짜) 쌍 수 (공유 검색에서 실제로 검색되는 수)"""
+        return sum(len(queries) for queries in self.date_queries.values())
+
+    def n_searches(self, shared=True, query_fusion=None):
+        """
+        시뮬레이션이 실제로 수행하는 (검색 벡터, 날짜) 검색 수
+
+        Args:
+            shared: 날짜별 공유 검색 사용 여부 (False면 에이전트별 검색)
+            query_fusion: 지정하면 에이전트마다 결합 벡터 하나로 검색 ((에이전트, 날짜)당 1회)
+        """
+        if query_fusion:
+            return len(self.agent_queries)
+        return self.n_distinct if shared else self.n_agent_queries
+
+    def summary(self, shared=True, query_fusion=None):
+        n_searches = self.n_searches(shared, query_fusion)
+        ratio = self.n_agent_queries / n_searches if n_searches else 0.0
+        if query_fusion:
+            mode = f"{query_fusion} query fusion, one search per (agent, date)"
+        elif shared:
+            mode = "shared distinct (query, date) pairs"
+        else:
+            mode = "per-agent retrieval"
+        return (f"Retrieval plan: {n_searches:,} searches ({mode}) "
+                f"for {self.n_agent_queries:,} agent queries ({ratio:.1f}x fewer searches)")
+
+    async def shared_result(self, date_str, fetch):
+        """
+        날짜별 공유 검색 결과 (비동기 시뮬레이션용)
+        그 날짜를 처음 요청한 task가 fetch(date_str) 코루틴을 한 번 시작하고, 같은 날짜의 다른 task는 같은 결과를 기다립니다.
+        (기다리던 task 하나가 취소되어도 공유 검색은 취소되지 않음)
+        """
+        if date_str not in self._shared:
+            self._waiters[date_str] = []
+            self._shared[date_str] = asyncio.ensure_future(self._fetch(date_str, fetch))
+        if not self._shared[date_str].done():
+            self._waiters[date_str].append((current_task_id(), time.time_ns()))
+        return await asyncio.shield(self._shared[date_str])
+
+    async def _fetch(self, date_str, fetch):
+        # 공유 검색의 단계 span은 날짜 단위 배치 trace로 기록한 뒤 기다리던 task마다 연결
+        with batch_scope("retrieval_plan", self._waiters[date_str], date=date_str):
+            return await fetch(date_str)
@@ -0,0 +1,198 @@
+"""
+로컬 검색 서버 (Retrieval Daemon)
+임베딩 모델과 ChromaDB 인덱스를 메모리에 상주시킨 채 localhost HTTP로 검색 요청을 처리합니다.
+여러 시뮬레이션 실행이 서버 하나를 공유하므로, 실행마다 반복되던 모델 로드/DB 오픈/HNSW 워밍업이 사라집니다.
+
+서버 실행:
+    python -m utils.retrieval_server --port 8765 --workers 4
+
+클라이언트 (기존 RAGRetriever 자리에 그대로 사용):
+    retriever = RemoteRetriever("time_aware", "http://127.0.0.1:8765")
+    docs = retriever.retrieve_reviews(agent, current_date_str="2021-01-01")
+"""
+import json
+import asyncio
+import argparse
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_URL = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+
+# 모드별 RAGRetriever 클래스
+RETRIEVER_PATHS = {
+    "static": "static_rag.rag_modules.RAGRetriever",
+    "time_aware": "time_aware_rag.rag_modules.RAGRetriever",
+}
+# 원격으로 호출할 수 있는 메서드 (반환값이 JSON으로 표현 가능한 것만)
+ALLOWED_METHODS = {"retrieve_reviews", "retrieve_reviews_batch", "retrieve_reviews_multi", "sweep_reviews"}
+
+
+# ---------------------------------------------------------------
+# 인자 직렬화: Persona 등 search_queries를 가진 객체는 {"id": ..., "search_queries": [...]}로 전달
+# ---------------------------------------------------------------
+def encode_arg(value):
+    if hasattr(value, "search_queries"):
+        return {"id": getattr(value, "id", None), "search_queries": list(value.search_queries)}
+    if isinstance(value, (list, tuple)):
+        return [encode_arg(v) for v in value]
+    return value
+
+
+def decode_arg(value):
+    if isinstance(value, dict) and set(value) == {"id", "search_queries"}:
+        return SimpleNamespace(id=value["id"], search_queries=value["search_queries"])
+    if isinstance(value, list):
+        return [decode_arg(v) for v in value]
+    return value
+
+
+# ---------------------------------------------------------------
+# 서버
+# ---------------------------------------------------------------
+class RetrievalRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /retrieve  {"mode": "static"|"time_aware", "method": "...", "args": [...], "kwargs": {...}}
+    GET  /health
+    """
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "modes": sorted(self.server.pools)})
+        else:
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/retrieve":
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            pool = self.server.pools.get(request.get("mode"))
+            method = request.get("method", "retrieve_reviews")
+            if pool is None:
+                raise ValueError(f"Unsupported mode: {request.get('mode')}")
+            if method not in ALLOWED_METHODS:
+                raise ValueError(f"Unsupported method: {method}")
+            args = decode_arg(request.get("args", []))
+            kwargs = {k: decode_arg(v) for k, v in request.get("kwargs", {}).items()}
+            result = pool.submit(method, *args, **kwargs).result()
+            self._send_json(200, {"result": result})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        # 요청마다 로그를 찍지 않음 (수만 건의 검색 요청)
+        pass
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, modes=("static", "time_aware"), n_workers=None):
+    """
+    검색 서버 실행 (Ctrl+C로 종료)
+
+    Args:
+        modes: 띄울 검색 모드 ("static", "time_aware")
+        n_workers: 모드별 워커 프로세스 수 (RetrieverPool)
+    """
+    from utils.retriever_pool import RetrieverPool
+
+    server = ThreadingHTTPServer((host, port), RetrievalRequestHandler)
+    server.daemon_threads = True
+    server.pools = {}
+    for mode in modes:
+        print(f"Starting '{mode}' retriever pool...")
+        server.pools[mode] = RetrieverPool(RETRIEVER_PATHS[mode], n_workers=n_workers)
+        server.pools[mode].warmup()
+
+    print(f"🛰️  Retrieval server listening on http://{host}:{port} (modes: {', '.join(modes)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down retrieval server...")
+    finally:
+        server.server_close()
+        for pool in server.pools.values():
+            pool.close()
+
+
+# ---------------------------------------------------------------
+# 클라이언트
+# ---------------------------------------------------------------
+class RemoteRetriever:
+    """
+    검색 서버용 얇은 클라이언트
+    RAGRetriever와 같은 메서드 이름/인자로 호출하면 서버에서 실행한 결과를 돌려줍니다.
+    """
+    def __init__(self, mode: str, url: str = DEFAULT_URL, timeout: float = 120):
+        if mode not in RETRIEVER_PATHS:
+            raise ValueError(f"지원하지 않는 검색 모드입니다: {mode}")
+        self.mode = mode
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        with urllib.request.urlopen(f"{self.url}/health", timeout=timeout) as res:
+            health = json.loads(res.read())
+        if mode not in health.get("modes", []):
+            raise ValueError(f"검색 서버가 '{mode}' 모드를 제공하지 않습니다: {health}")
+        print(f"Connected to retrieval server: {self.url} ({mode})")
+
+    def close(self):
+        """RAGRetriever.close()와 같은 인터페이스 (요청마다 연결을 열고 닫으므로 정리할 것 없음)"""
+
+    def _call(self, method, *args, **kwargs):
+        payload = json.dumps({
+            "mode": self.mode,
+            "method": method,
+            "args": encode_arg(list(args)),
+            "kwargs": {k: encode_arg(v) for k, v in kwargs.items()}
+        }, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.url}/retrieve", data=payload, headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as res:
+                return json.loads(res.read())["result"]
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"검색 서버 오류: {json.loads(e.read()).get('error')}") from e
+
+    def retrieve_reviews(self, *args, **kwargs):
+        return self._call("retrieve_reviews", *args, **kwargs)
+
+    def retrieve_reviews_batch(self, *args, **kwargs):
+        return self._call("retrieve_reviews_batch", *args, **kwargs)
+
+    def retrieve_reviews_multi(self, *args, **kwargs):
+        return self._call("retrieve_reviews_multi", *args, **kwargs)
+
+    def sweep_reviews(self, *args, **kwargs):
+        return self._call("sweep_reviews", *args, **kwargs)
+
+    async def aretrieve_reviews(self, *args, **kwargs):
+        """비동기 시뮬레이션용 (요청은 별도 스레드에서 대기)"""
+        return await asyncio.to_thread(self.retrieve_reviews, *args, **kwargs)
+
+    async def aretrieve_reviews_multi(self, *args, **kwargs):
+        return await asyncio.to_thread(self.retrieve_reviews_multi, *args, **kwargs)
+
+    async def aretrieve_reviews_batch(self, *args, **kwargs):
+        return await asyncio.to_thread(self.retrieve_reviews_batch, *args, **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run a long-lived local retrieval server.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--modes', nargs='+', choices=sorted(RETRIEVER_PATHS), default=["static", "time_aware"])
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes per mode (default: CPU count)')
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.modes, args.workers)
@@ -0,0 +1,194 @@
+"""
+검색 트레이스 (Retrieval Trace) 모듈
+검색 호출(task)마다 최종 선택된 리뷰를 순위별 한 행으로 기록합니다.
+(리뷰 ID, 작성일, 경과 일수, similarity, time_factor, final_score, 쿼리, 검색 지연)
+어떤 리뷰가 프롬프트에 들어갔는지를 남겨, 검색된 컨텍스트의 실제 나이 분포 등을 사후에 분석할 수 있습니다.
+
+검색 경로에서는 열(column) 배열을 큐에 넣기만 하고, Parquet 변환 / 파일 쓰기는 백그라운드 스레드가 합니다.
+FLUSH_ROWS 행이 모이거나 FLUSH_INTERVAL초 동안 새 기록이 없으면 part 파일 하나로 저장하므로,
+프로세스마다(RetrieverPool 워커 포함) 별도의 파일을 쓰고 분석 시 디렉토리 전체를 읽습니다.
+
+사용 예:
+    RETRIEVAL_TRACE_DIR=datasets/retrieval_traces python time_aware_rag/simulation_model_c.py
+    traces = load_traces("datasets/retrieval_traces")
+
+필요 패키지: pyarrow
+"""
+import os
+import time
+import queue
+import atexit
+import itertools
+import threading
+import numpy as np
+
+TRACE_DIR = os.path.join("datasets", "retrieval_traces")
+# part 파일 하나에 모을 최대 행 수 / 새 기록이 없을 때 버퍼를 내보내는 간격(초)
+FLUSH_ROWS = 50000
+FLUSH_INTERVAL = 5.0
+
+# 트레이스 열과 타입 (task마다 같은 값인 열은 record()에서 반복해서 채움)
+TRACE_COLUMNS = {
+    "task_id": "string",
+    "retriever": "string",
+    "current_date": "int32",
+    "agent_id": "string",
+    "decay_rate": "float32",
+    "rank": "int16",
+    "review_id": "string",
+    "review_date": "int32",
+    "review_age_days": "int32",
+    "similarity": "float32",
+    "time_factor": "float32",
+    "final_score": "float32",
+    "query": "string",
+    "latency_ms": "float32",
+}
+
+
+def _arrow_schema():
+    import pyarrow as pa
+    return pa.schema([(name, pa.type_for_alias(dtype)) for name, dtype in TRACE_COLUMNS.items()])
+
+
+class RetrievalTraceWriter:
+    """
+    백그라운드 Parquet 트레이스 기록기
+
+    Args:
+        trace_dir: 트레이스 디렉토리 (retriever 이름별 하위 디렉토리에 part 파일 저장)
+        retriever: "static" 또는 "time_aware"
+    """
+    def __init__(self, trace_dir, retriever, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Please install pyarrow to write retrieval traces: pip install pyarrow")
+
+        self.retriever = retriever
+        self.path = os.path.join(trace_dir, retriever)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        # 프로세스 + 시작 시각으로 세션을 구분 (task_id / part 파일 이름이 실행 간에 겹치지 않도록)
+        self.session = f"{os.getpid():x}{int(time.time() * 1000):x}"
+        self._task_counter = itertools.count()
+        self._part_counter = itertools.count()
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"trace-writer-{retriever}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        print(f"Retrieval trace enabled: {self.path}")
+
+    def new_task_id(self):
+        return f"{self.session}-{next(self._task_counter)}"
+
+    def record(self, task_id, current_date, review_ids, review_dates, similarity, time_factor, final_score,
+               queries, latency_ms, agent_id=None, decay_rate=0.0):
+        """
+        task 하나의 최종 선택 결과(순위 순서)를 기록합니다. 큐에 넣기만 하므로 검색 경로를 막지 않습니다.
+
+        Args:
+            current_date: YYYYMMDD 정수 시뮬레이션 날짜
+            review_ids, review_dates, similarity, time_factor, final_score, queries: 순위 순서의 병렬 배열
+            latency_ms: 검색 호출 지연 (밀리초)
+        """
+        if self._closed:
+            return
+        self._queue.put((task_id, current_date, agent_id, decay_rate, review_ids, review_dates,
+                         similarity, time_factor, final_score, queries, latency_ms))
+
+    # ---------------------------------------------------------------
+    # 백그라운드 스레드
+    # ---------------------------------------------------------------
+    def _run(self):
+        from utils.date_utils import yyyymmdd_to_epoch_days
+
+        buffer = {name: [] for name in TRACE_COLUMNS}
+        n_rows = 0
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = False
+            if not item:
+                # 유휴 상태(False) 또는 종료 요청(None): 모인 행을 part 파일로 저장
+                if n_rows:
+                    self._write(buffer)
+                    buffer = {name: [] for name in TRACE_COLUMNS}
+                    n_rows = 0
+                if item is None:
+                    return
+                continue
+
+            (task_id, current_date, agent_id, decay_rate, review_ids, review_dates,
+             similarity, time_factor, final_score, queries, latency_ms) = item
+            k = len(review_ids)
+            review_dates = np.asarray(review_dates, dtype=np.int64)
+            ages = np.where(
+                review_dates > 0,
+                yyyymmdd_to_epoch_days(current_date) - yyyymmdd_to_epoch_days(review_dates),
+                -1
+            )
+            buffer["task_id"].extend([task_id] * k)
+            buffer["retriever"].extend([self.retriever] * k)
+            buffer["current_date"].extend([current_date] * k)
+            buffer["agent_id"].extend([None if agent_id is None else str(agent_id)] * k)
+            buffer["decay_rate"].extend([decay_rate] * k)
+            buffer["rank"].extend(range(1, k + 1))
+            buffer["review_id"].extend(str(i) for i in review_ids)
+            buffer["review_date"].extend(review_dates.tolist())
+            buffer["review_age_days"].extend(ages.tolist())
+            buffer["similarity"].extend(np.asarray(similarity, dtype=np.float64).tolist())
+            buffer["time_factor"].extend(np.asarray(time_factor, dtype=np.float64).tolist())
+            buffer["final_score"].extend(np.asarray(final_score, dtype=np.float64).tolist())
+            buffer["query"].extend(queries)
+            buffer["latency_ms"].extend([latency_ms] * k)
+            n_rows += k
+            if n_rows >= self.flush_rows:
+                self._write(buffer)
+                buffer = {name: [] for name in TRACE_COLUMNS}
+                n_rows = 0
+
+    def _write(self, buffer):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(self.path, exist_ok=True)
+        table = pa.Table.from_pydict(buffer, schema=_arrow_schema())
+        part_path = os.path.join(self.path, f"part-{self.session}-{next(self._part_counter):05d}.parquet")
+        # 쓰는 도중의 파일을 분석에서 읽지 않도록 임시 이름으로 쓴 뒤 이동
+        pq.write_table(table, part_path + ".tmp")
+        os.replace(part_path + ".tmp", part_path)
+
+    def close(self):
+        """남은 기록을 저장하고 백그라운드 스레드를 종료합니다."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+
+def load_traces(trace_dir=TRACE_DIR, retriever=None):
+    """
+    저장된 트레이스 part 파일을 하나의 DataFrame으로 읽습니다.
+
+    Args:
+        retriever: "static" / "time_aware"만 읽으려면 지정 (None이면 전체)
+    Returns:
+        pd.DataFrame | None: 트레이스 (파일이 없으면 None)
+    """
+    import pandas as pd
+
+    if not os.path.isdir(trace_dir):
+        return None
+    retrievers = [retriever] if retriever else sorted(os.listdir(trace_dir))
+    parts = [
+        os.path.join(trace_dir, r, f)
+        for r in retrievers if os.path.isdir(os.path.join(trace_dir, r))
+        for f in sorted(os.listdir(os.path.join(trace_dir, r))) if f.endswith(".parquet")
+    ]
+    if not parts:
+        return None
+    return pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True)
@@ -0,0 +1,146 @@
+"""
+멀티 프로세스 Retriever 풀
+워커 프로세스마다 읽기 전용 ChromaDB PersistentClient와 임베딩 모델을 따로 가진 RAGRetriever를 띄우고,
+asyncio에서 await 가능한 submit API를 제공합니다.
+하나의 RAGRetriever를 asyncio.Lock으로 직렬화하는 대신, 검색 처리량이 CPU 코어 수에 비례하여 늘어납니다.
+워커를 띄우기 전에 부모 프로세스에서 RAGRetriever를 한 번 만들어 디스크 산출물(쿼리 임베딩 캐시, 스니펫 / 원문 저장소,
+BM25 / 벡터 인덱스 등)을 미리 생성하므로, 워커들은 이미 만들어진 파일을 로드만 합니다.
+"""
+import os
+import time
+import asyncio
+import importlib
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.span_tracer import SpanRecorder, current_recorder, current_task_id, recording
+
+# 워커 프로세스 안의 RAGRetriever (프로세스마다 하나)
+_worker_retriever = None
+
+
+def _load_retriever_class(retriever_path):
+    """"패키지.모듈.클래스" 경로의 RAGRetriever 클래스"""
+    module_name, class_name = retriever_path.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def build_artifacts(retriever_path, init_kwargs):
+    """
+    RAGRetriever를 한 번 생성하고 prepare()를 호출하여 load_or_build 산출물과 지연 생성 캐시를 만들어 둡니다.
+    여러 워커가 동시에 cold start 하면서 같은 파일을 만들다 서로 덮어쓰는 것을 막기 위해 워커를 띄우기 전에 호출합니다.
+    """
+    retriever = _load_retriever_class(retriever_path)(**init_kwargs)
+    try:
+        retriever.prepare()
+    finally:
+        retriever.close()
+
+
+def _init_worker(retriever_path, init_kwargs):
+    """워커 프로세스 초기화: RAGRetriever를 한 번만 생성"""
+    global _worker_retriever
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    _worker_retriever = _load_retriever_class(retriever_path)(**init_kwargs)
+
+
+def _call_worker(method_name, args, kwargs):
+    """워커 프로세스의 RAGRetriever 메서드 호출"""
+    return getattr(_worker_retriever, method_name)(*args, **kwargs)
+
+
+def _call_worker_traced(method_name, args, kwargs):
+    """_call_worker + 워커 안에서 기록된 단계 span (embed / ann / rerank 등)을 결과와 함께 반환"""
+    recorder = SpanRecorder()
+    with recording(recorder):
+        start_ns = time.time_ns()
+        result = getattr(_worker_retriever, method_name)(*args, **kwargs)
+        recorder.record("retrieval_worker", start_ns, time.time_ns())
+    return result, recorder.spans
+
+
+def _ping_worker():
+    # 잠시 점유하여 여러 워커가 나누어 받도록 함
+    time.sleep(0.1)
+    return os.getpid()
+
+
+class RetrieverPool:
+    """
+    RAGRetriever 워커 프로세스 풀
+
+    사용 예:
+        pool = RetrieverPool("time_aware_rag.rag_modules.RAGRetriever", n_workers=4)
+        docs = await pool.retrieve_reviews(agent, current_date_str="2021-01-01")
+        pool.close()
+
+    주의: 인자와 반환값은 프로세스 간에 pickle로 전달되므로,
+    함수 안에서 정의한 클래스 대신 types.SimpleNamespace 같은 pickle 가능한 객체를 넘겨야 합니다.
+    """
+    def __init__(self, retriever_path: str, n_workers: int = None, **init_kwargs):
+        """
+        Args:
+            retriever_path: "패키지.모듈.클래스" 형식의 RAGRetriever 경로
+            n_workers: 워커 프로세스 수 (기본값: CPU 코어 수)
+            init_kwargs: RAGRetriever 생성자 인자 (예: backend="bruteforce")
+        """
+        self.n_workers = n_workers or os.cpu_count() or 1
+        # 디스크 산출물은 부모 프로세스에서 한 번만 생성 (워커는 로드만)
+        build_artifacts(retriever_path, init_kwargs)
+        # fork 시 부모의 Chroma/토크나이저 스레드 상태가 복제되는 문제를 피하기 위해 spawn 사용
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(retriever_path, init_kwargs)
+        )
+
+    def warmup(self):
+        """모든 워커를 미리 띄워 RAGRetriever 초기화를 끝내 둡니다 (첫 요청 지연 방지)"""
+        pids = {f.result() for f in [self.executor.submit(_ping_worker) for _ in range(self.n_workers * 2)]}
+        print(f"Retriever pool ready: {len(pids)} worker process(es)")
+
+    def submit(self, method_name: str, *args, **kwargs):
+        """워커의 RAGRetriever 메서드 호출을 제출하고 concurrent.futures.Future 반환"""
+        return self.executor.submit(_call_worker, method_name, args, kwargs)
+
+    async def call(self, method_name: str, *args, **kwargs):
+        """
+        워커의 RAGRetriever 메서드를 비동기로 호출
+        호출한 task에 span recorder가 있으면 워커 안의 단계 span과 큐 대기 시간(retrieval_queue_wait)을 함께 기록합니다.
+        """
+        recorder = current_recorder()
+        if recorder is None:
+            return await asyncio.wrap_future(self.submit(method_name, *args, **kwargs))
+
+        task_id = current_task_id()
+        submitted_ns = time.time_ns()
+        result, spans = await asyncio.wrap_future(
+            self.executor.submit(_call_worker_traced, method_name, args, kwargs)
+        )
+        # 마지막 span이 워커 전체 구간 -> 제출부터 워커가 실제로 시작하기까지가 큐 대기
+        worker_start_ns = spans[-1][2]
+        recorder.record("retrieval_queue_wait", submitted_ns, max(submitted_ns, worker_start_ns), task_id)
+        recorder.merge(spans, task_id)
+        return result
+
+    async def retrieve_reviews(self, *args, **kwargs):
+        """RAGRetriever.retrieve_reviews()와 같은 인자를 받는 비동기 버전"""
+        return await self.call("retrieve_reviews", *args, **kwargs)
+
+    async def retrieve_reviews_batch(self, *args, **kwargs):
+        """RAGRetriever.retrieve_reviews_batch()의 비동기 버전 (날짜별 공유 검색 계획, utils/retrieval_plan.py)"""
+        return await self.call("retrieve_reviews_batch", *args, **kwargs)
+
+    async def retrieve_reviews_multi(self, *args, **kwargs):
+        """Static RAGRetriever.retrieve_reviews_multi()의 비동기 버전"""
+        return await self.call("retrieve_reviews_multi", *args, **kwargs)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
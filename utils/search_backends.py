@@ -0,0 +1,299 @@
+"""
+Dense 검색 백엔드 모듈
+Static / Time-Aware RAGRetriever가 같은 인터페이스로 쓰는 검색 백엔드입니다.
+모든 백엔드는 search(query_embeddings, date_int, n_results)로 date <= date_int 인 리뷰 중
+쿼리별 거리 상위 n_results개를 {"ids", "distances", "dates"} (Chroma 방식 거리 오름차순) 리스트로 반환합니다.
+
+- "chroma": HNSW + where 날짜 필터 (SQLite 메타데이터 평가)
+- "bruteforce": 날짜순 정렬 행렬의 prefix 구간에서 exact top-k (utils/vector_index.py)
+- "sharded": 날짜 이전 시간 샤드 컬렉션만 병렬 검색 (utils/time_shards.py)
+- "faiss": 날짜순 행 번호를 내부 ID로 쓰는 FAISS IVF-Flat / IVF-PQ 인덱스.
+    date <= date_int 조건은 IDSelectorRange(0, prefix_length)로 표현되어 메타데이터 평가 없이 inverted list 안에서 걸러집니다.
+- "quantized": 날짜순 행렬의 int8 / binary 압축 코드로 prefix 구간 shortlist를 고르고 float32 행(mmap)으로 재점수화
+    (utils/quantized_index.py)
+
+사용 예:
+    python -m utils.search_backends --index-type ivf_pq --nlist 1024
+
+필요 패키지: faiss-cpu ("faiss" 백엔드에서만)
+"""
+import os
+import argparse
+import numpy as np
+
+from utils import artifact_store
+from utils.vector_index import DateSortedIndex
+from utils.time_shards import ShardedCollection
+from utils.quantized_index import QuantizedIndex
+
+SEARCH_BACKENDS = ("chroma", "bruteforce", "sharded", "faiss", "quantized")
+
+FAISS_INDEX_DIR = os.path.join("datasets", "faiss_index")
+FAISS_INDEX_FORMAT_VERSION = 1
+FAISS_INDEX_TYPES = ("ivf_flat", "ivf_pq")
+FAISS_INDEX_TYPE = "ivf_flat"
+# 검색 시 탐색할 inverted list 수 (recall ↔ latency)
+FAISS_NPROBE = 16
+# IVF-PQ 서브 양자화기 수 (임베딩 차원의 약수여야 함, 384차원 MiniLM → 24차원씩)
+FAISS_PQ_M = 16
+# date <= date_int 인 행이 이 수 이하이면 IVF 대신 날짜순 행렬에서 exact 검색
+# (초기 날짜처럼 구간이 짧으면 nprobe개 list 안에 남는 후보가 k개보다 적을 수 있음)
+FAISS_EXACT_PREFIX_ROWS = 20000
+
+
+def _empty_hits(n_queries):
+    return [
+        {"ids": np.empty(0, dtype=str), "distances": np.empty(0), "dates": np.empty(0, dtype=np.int64)}
+        for _ in range(n_queries)
+    ]
+
+
+class ChromaBackend:
+    """Chroma HNSW + where 날짜 필터"""
+    name = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def search(self, query_embeddings, date_int, n_results, decay_rate=None, prune_k=None):
+        results = self.collection.query(
+            query_embeddings=np.atleast_2d(query_embeddings).tolist(),
+            n_results=n_results,
+            include=["metadatas", "distances"],  # 원문은 최종 top-k만 스니펫 저장소에서 조회
+            where={"date": {"$lte": date_int}}  # 현재 날짜 이전 리뷰만 (date 필드 사용)
+        )
+        return [
+            {
+                "ids": np.array(results['ids'][i], dtype=str),
+                "distances": np.array(results['distances'][i], dtype=np.float64),
+                "dates": np.array([meta.get('date') or 0 for meta in results['metadatas'][i]], dtype=np.int64)
+            }
+            for i in range(len(results['ids']))
+        ]
+
+    def close(self):
+        """해제할 자원 없음 (ShardedBackend만 스레드 풀을 가짐)"""
+
+
+class BruteForceBackend:
+    """날짜순 행렬 prefix 구간 exact 검색"""
+    name = "bruteforce"
+
+    def __init__(self, vector_index):
+        self.vector_index = vector_index
+
+    def search(self, query_embeddings, date_int, n_results, decay_rate=None, prune_k=None):
+        rows, distances = self.vector_index.search(query_embeddings, date_int, n_results)
+        return [
+            {
+                "ids": self.vector_index.ids[rows[i]],
+                "distances": np.asarray(distances[i], dtype=np.float64),
+                "dates": self.vector_index.dates[rows[i]]
+            }
+            for i in range(len(rows))
+        ]
+
+    def close(self):
+        """해제할 자원 없음"""
+
+
+class QuantizedBackend(BruteForceBackend):
+    """압축 코드 prefix 구간 1차 검색 + shortlist float32 재점수화 (QuantizedIndex가 DateSortedIndex와 같은 search() 제공)"""
+    name = "quantized"
+
+
+class ShardedBackend:
+    """시간 샤드 병렬 검색 (decay_rate / prune_k가 주어지면 k번째 감쇠 점수를 넘을 수 없는 샤드는 건너뜀)"""
+    name = "sharded"
+
+    def __init__(self, shards):
+        self.shards = shards
+
+    def search(self, query_embeddings, date_int, n_results, decay_rate=None, prune_k=None):
+        return self.shards.query(query_embeddings, date_int, n_results, decay_rate, prune_k)
+
+    def close(self):
+        self.shards.close()
+
+
+class FaissIVFBackend:
+    """
+    FAISS IVF 인덱스 + 날짜 ID 범위 selector
+
+    벡터는 DateSortedIndex 행 순서(날짜 오름차순)대로 ID 0..N-1로 추가되므로,
+    date <= date_int 인 리뷰는 정확히 ID [0, prefix_length) 구간이고 각 inverted list의 ID도 정렬되어 있습니다.
+    l2는 제곱 L2 거리, cosine / ip는 내적으로 검색한 뒤 Chroma와 같은 거리(1 - 내적)로 변환합니다.
+    """
+    name = "faiss"
+
+    def __init__(self, vector_index, index, index_type, nprobe=FAISS_NPROBE, exact_prefix_rows=FAISS_EXACT_PREFIX_ROWS):
+        self.vector_index = vector_index
+        self.index = index
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.exact_prefix_rows = exact_prefix_rows
+
+    @staticmethod
+    def _faiss():
+        try:
+            import faiss
+        except ImportError:
+            raise ImportError("Please install faiss to use the faiss backend: pip install faiss-cpu")
+        return faiss
+
+    def _prepare(self, vectors):
+        """검색 / 추가용 float32 행렬 (cosine은 정규화하여 내적 = cosine similarity)"""
+        vectors = np.ascontiguousarray(np.atleast_2d(vectors), dtype=np.float32)
+        if self.vector_index.space == "cosine":
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+    # ---------------------------------------------------------------
+    # 생성 / 저장 / 로드
+    # ---------------------------------------------------------------
+    @classmethod
+    def build(cls, vector_index, index_type=FAISS_INDEX_TYPE, nlist=None, pq_m=FAISS_PQ_M, batch_size=65536):
+        """
+        날짜순 인덱스의 임베딩으로 IVF 인덱스를 학습 / 생성합니다.
+
+        Args:
+            index_type: "ivf_flat" (원본 벡터 저장) 또는 "ivf_pq" (PQ 코드, 메모리 절감 / 거리 근사)
+            nlist: inverted list 수 (기본값: 4√N, list당 학습 벡터가 39개 이상이 되도록 제한)
+        """
+        if index_type not in FAISS_INDEX_TYPES:
+            raise ValueError(f"지원하지 않는 FAISS 인덱스 종류입니다: {index_type}")
+        faiss = cls._faiss()
+        backend = cls(vector_index, None, index_type)
+
+        n, dim = vector_index.embeddings.shape
+        nlist = nlist or max(1, min(int(4 * np.sqrt(n)), n // 39))
+        metric = faiss.METRIC_L2 if vector_index.space == "l2" else faiss.METRIC_INNER_PRODUCT
+        quantizer = faiss.IndexFlatL2(dim) if metric == faiss.METRIC_L2 else faiss.IndexFlatIP(dim)
+        if index_type == "ivf_pq":
+            if dim % pq_m:
+                raise ValueError(f"임베딩 차원({dim})이 PQ 서브 양자화기 수({pq_m})로 나누어떨어지지 않습니다.")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, 8, metric)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+
+        # 학습은 list당 최대 256개 샘플로 충분
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(n, size=min(n, nlist * 256), replace=False))
+        print(f"Training FAISS {index_type} index (nlist={nlist}, {len(sample):,} samples)...")
+        index.train(backend._prepare(vector_index.embeddings[sample]))
+        for start in range(0, n, batch_size):
+            block = backend._prepare(vector_index.embeddings[start:start + batch_size])
+            index.add_with_ids(block, np.arange(start, start + len(block), dtype=np.int64))
+
+        backend.index = index
+        return backend
+
+    def save(self, path):
+        faiss = self._faiss()
+        os.makedirs(path, exist_ok=True)
+        faiss.write_index(self.index, os.path.join(path, "index.faiss"))
+        artifact_store.write_meta(path, FAISS_INDEX_FORMAT_VERSION, index_type=self.index_type,
+                                  nlist=int(self.index.nlist), **artifact_store.vector_index_fields(self.vector_index))
+        print(f"💾 FAISS index saved: {path} ({self.index_type}, {self.index.ntotal:,} vectors)")
+
+    @classmethod
+    def load(cls, vector_index, path, **expected):
+        """저장된 인덱스 로드. 없거나 날짜순 인덱스 / expected(index_type 등)와 맞지 않으면 None 반환"""
+        meta = artifact_store.read_meta(path, FAISS_INDEX_FORMAT_VERSION,
+                                        **artifact_store.vector_index_fields(vector_index), **expected)
+        if meta is None:
+            return None
+        index = cls._faiss().read_index(os.path.join(path, "index.faiss"))
+        return cls(vector_index, index, meta["index_type"])
+
+    @classmethod
+    def load_or_build(cls, vector_index, collection_name, index_type=FAISS_INDEX_TYPE, path=None):
+        path = path or os.path.join(FAISS_INDEX_DIR, collection_name)
+        return artifact_store.load_or_build(
+            path,
+            lambda p: cls.load(vector_index, p, index_type=index_type),
+            lambda: cls.build(vector_index, index_type),
+            "FAISS index", lambda backend: f"{index_type}, {backend.index.ntotal:,} vectors"
+        )
+
+    # ---------------------------------------------------------------
+    # 검색
+    # ---------------------------------------------------------------
+    def search(self, query_embeddings, date_int, n_results, decay_rate=None, prune_k=None):
+        faiss = self._faiss()
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        queries = self._prepare(query_embeddings)
+        end = self.vector_index.prefix_length(date_int)
+        k = min(n_results, end)
+        if k <= 0:
+            return _empty_hits(len(queries))
+        if end <= self.exact_prefix_rows:
+            return BruteForceBackend(self.vector_index).search(query_embeddings, date_int, n_results)
+
+        # 날짜 필터 = 내부 ID 범위 [0, end) (list 안의 ID가 정렬되어 있으므로 assume_sorted)
+        params = faiss.SearchParametersIVF(sel=faiss.IDSelectorRange(0, end, True), nprobe=self.nprobe)
+        scores, rows = self.index.search(queries, k, params=params)
+
+        hits = []
+        for q, (query_scores, query_rows) in enumerate(zip(scores, rows)):
+            found = query_rows >= 0  # 탐색한 list에 남은 후보가 k개보다 적으면 -1
+            query_rows = query_rows[found]
+            if self.index_type == "ivf_pq":
+                # PQ 거리는 근사값이므로 찾은 행만 원본 벡터로 다시 계산하여 정렬
+                distances = self.vector_index.row_distances(query_embeddings[q], query_rows)
+                order = np.argsort(distances, kind='stable')
+                query_rows, distances = query_rows[order], distances[order]
+            elif self.vector_index.space == "l2":
+                distances = query_scores[found]
+            else:
+                distances = 1.0 - query_scores[found]
+            hits.append({
+                "ids": self.vector_index.ids[query_rows],
+                "distances": np.asarray(distances, dtype=np.float64),
+                "dates": self.vector_index.dates[query_rows]
+            })
+        return hits
+
+    def close(self):
+        """해제할 자원 없음"""
+
+
+def load_search_backend(backend, client, collection, space, vector_index=None):
+    """
+    RAGRetriever의 backend 이름에 해당하는 검색 백엔드를 생성합니다.
+
+    Args:
+        vector_index: 이미 로드한 DateSortedIndex (bruteforce / faiss / quantized에서 사용, 없으면 로드/생성)
+    """
+    if backend not in SEARCH_BACKENDS:
+        raise ValueError(f"지원하지 않는 검색 백엔드입니다: {backend}")
+    if backend == "chroma":
+        return ChromaBackend(collection)
+    if backend == "sharded":
+        return ShardedBackend(ShardedCollection.load_or_build(client, collection, space))
+
+    vector_index = vector_index or DateSortedIndex.load_or_build(collection)
+    if backend == "bruteforce":
+        return BruteForceBackend(vector_index)
+    if backend == "quantized":
+        return QuantizedBackend(QuantizedIndex.load_or_build(vector_index, collection.name))
+    return FaissIVFBackend.load_or_build(vector_index, collection.name)
+
+
+if __name__ == "__main__":
+    import chromadb
+
+    parser = argparse.ArgumentParser(description='Build a FAISS IVF index over the date-sorted vector index.')
+    parser.add_argument('--db-path', default=os.path.join("datasets", "chroma_db"), help='ChromaDB path')
+    parser.add_argument('--collection', default="cyberpunk2077_reviews", help='Collection name')
+    parser.add_argument('--index-type', choices=FAISS_INDEX_TYPES, default=FAISS_INDEX_TYPE, help='FAISS index type')
+    parser.add_argument('--nlist', type=int, default=None, help='Number of inverted lists (default: 4*sqrt(N))')
+    parser.add_argument('--pq-m', type=int, default=FAISS_PQ_M, help='PQ sub-quantizers (ivf_pq only)')
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.db_path)
+    collection = client.get_collection(name=args.collection, embedding_function=None)
+    vector_index = DateSortedIndex.load_or_build(collection)
+    FaissIVFBackend.build(vector_index, args.index_type, args.nlist, args.pq_m).save(
+        os.path.join(FAISS_INDEX_DIR, args.collection)
+    )
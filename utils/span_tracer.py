@@ -0,0 +1,234 @@
+"""
+단계별 Span 트레이서 모듈
+비동기 시뮬레이션의 task(에이전트 × 날짜)마다 단계별 구간(span)을 기록하고,
+실행이 끝나면 OTLP JSON 형식 파일로 내보내며 단계별 p50 / p95 / p99 지연 표를 출력합니다.
+프로파일러 없이도 wall-clock이 어디에 쓰이는지(검색 대기, 임베딩, ANN, 재랭킹, LLM 대기 / 호출, CSV 저장) 볼 수 있습니다.
+
+현재 recorder와 task는 contextvars로 전달되므로 asyncio task / asyncio.to_thread 안에서도 그대로 이어지고,
+recorder가 설정되지 않은 곳(동기 시뮬레이션 등)에서 span()은 아무 일도 하지 않습니다.
+RetrieverPool 워커 프로세스에서 기록된 span은 결과와 함께 돌려받아 호출한 task에 합쳐집니다.
+여러 task가 함께 기다리는 배치 호출(micro-batch, 날짜별 공유 검색)은 batch_scope()로 감싸면
+배치 안의 단계 span이 기다리던 task마다 복사되어(원본 배치 span으로의 OTLP link 포함) task별 단계 분해가 유지됩니다.
+
+사용 예:
+    recorder = start_recording("time_aware_async")
+    async def process(task_id):
+        with task_scope(task_id):
+            with span("prompt_build"):
+                ...
+    recorder.export_otlp_json("spans.json")
+    recorder.print_summary()
+"""
+import os
+import json
+import time
+import hashlib
+import itertools
+import contextvars
+from contextlib import contextmanager
+import numpy as np
+
+_recorder = contextvars.ContextVar("span_recorder", default=None)
+_task_id = contextvars.ContextVar("span_task_id", default=None)
+
+SUMMARY_PERCENTILES = (50, 95, 99)
+# 배치 trace ID 생성용 카운터
+_batch_counter = itertools.count(1)
+# span attributes 안에서 OTLP link(연결할 span 위치 목록)를 담는 예약 키
+LINKS_KEY = "_links"
+
+
+class SpanRecorder:
+    """
+    span 목록 (task_id, name, start_ns, end_ns, attributes)
+    list.append만 하므로 여러 스레드(asyncio.to_thread)에서 함께 기록해도 됩니다.
+    """
+    def __init__(self, service_name="persona-simulation"):
+        self.service_name = service_name
+        self.spans = []
+        # task마다 복사된 배치 trace ID (요약에서는 복사본만 집계하여 중복을 피함)
+        self.linked_batches = set()
+
+    def record(self, name, start_ns, end_ns, task_id=None, **attributes):
+        """span 하나를 기록하고 그 위치(export 시 spanId)를 반환합니다."""
+        self.spans.append((task_id, name, start_ns, end_ns, attributes))
+        return len(self.spans) - 1
+
+    def merge(self, spans, task_id=None):
+        """다른 프로세스(RetrieverPool 워커)에서 기록된 span을 현재 task로 합칩니다."""
+        for _, name, start_ns, end_ns, attributes in spans:
+            self.spans.append((task_id, name, start_ns, end_ns, attributes))
+
+    # ---------------------------------------------------------------
+    # 요약 / 내보내기
+    # ---------------------------------------------------------------
+    def summary(self):
+        """
+        Returns:
+            dict: {단계 이름: {"count", "total_s", "mean_ms", "p50_ms", "p95_ms", "p99_ms"}} (처음 기록된 순서)
+        """
+        durations = {}
+        for task_id, name, start_ns, end_ns, _ in self.spans:
+            if task_id in self.linked_batches:
+                continue
+            durations.setdefault(name, []).append((end_ns - start_ns) / 1e6)
+        stats = {}
+        for name, values in durations.items():
+            values = np.asarray(values)
+            stats[name] = {
+                "count": len(values),
+                "total_s": values.sum() / 1000,
+                "mean_ms": values.mean(),
+                **{f"p{p}_ms": np.percentile(values, p) for p in SUMMARY_PERCENTILES}
+            }
+        return stats
+
+    def print_summary(self):
+        stats = self.summary()
+        if not stats:
+            return
+        width = max(len(name) for name in stats)
+        print(f"\n⏱️  Stage latency ({self.service_name})")
+        print(f"{'stage':<{width}}  {'count':>7}  {'total(s)':>9}  {'mean':>9}  {'p50':>9}  {'p95':>9}  {'p99':>9}  (ms)")
+        for name, s in stats.items():
+            print(f"{name:<{width}}  {s['count']:>7}  {s['total_s']:>9.1f}  {s['mean_ms']:>9.1f}  "
+                  f"{s['p50_ms']:>9.1f}  {s['p95_ms']:>9.1f}  {s['p99_ms']:>9.1f}")
+
+    def export_otlp_json(self, path):
+        """
+        OTLP/JSON (ExportTraceServiceRequest) 형식으로 저장합니다.
+        task_id가 같은 span은 같은 traceId를 가지므로 Jaeger 등 OTLP 도구에서 task 단위로 묶어 볼 수 있습니다.
+        """
+        spans = []
+        for i, (task_id, name, start_ns, end_ns, attributes) in enumerate(self.spans):
+            links = attributes.get(LINKS_KEY, ())
+            attributes = {k: v for k, v in attributes.items() if k != LINKS_KEY}
+            attributes.update({"task.id": task_id} if task_id is not None else {})
+            spans.append({
+                "traceId": _trace_id(task_id),
+                "spanId": _span_id(i),
+                "name": name,
+                "kind": 1,
+                "startTimeUnixNano": str(start_ns),
+                "endTimeUnixNano": str(end_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()],
+                **({"links": [{"traceId": _trace_id(self.spans[j][0]), "spanId": _span_id(j)} for j in links]}
+                   if links else {})
+            })
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{"scope": {"name": "utils.span_tracer"}, "spans": spans}]
+            }]
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        print(f"💾 Spans saved: {path} ({len(spans):,} spans)")
+
+
+def _trace_id(task_id):
+    return hashlib.md5(str(task_id).encode("utf-8")).hexdigest()
+
+
+def _span_id(index):
+    return f"{index + 1:016x}"
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def start_recording(service_name="persona-simulation"):
+    """새 recorder를 현재 context에 설정하고 반환 (이후 생성되는 asyncio task에 전달됨)"""
+    recorder = SpanRecorder(service_name)
+    _recorder.set(recorder)
+    return recorder
+
+
+def current_recorder():
+    return _recorder.get()
+
+
+def current_task_id():
+    return _task_id.get()
+
+
+@contextmanager
+def recording(recorder):
+    """with 블록 안에서만 recorder 사용 (RetrieverPool 워커 등)"""
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+@contextmanager
+def task_scope(task_id):
+    """with 블록 안에서 기록되는 span을 task_id에 묶음"""
+    token = _task_id.set(task_id)
+    try:
+        yield
+    finally:
+        _task_id.reset(token)
+
+
+@contextmanager
+def span(name, **attributes):
+    """단계 구간 기록 (recorder가 없으면 아무 일도 하지 않음)"""
+    recorder = _recorder.get()
+    if recorder is None:
+        yield
+        return
+    start_ns = time.time_ns()
+    try:
+        yield
+    finally:
+        recorder.record(name, start_ns, time.time_ns(), _task_id.get(), **attributes)
+
+
+@contextmanager
+def batch_scope(name, waiters, **attributes):
+    """
+    여러 task가 함께 기다리는 배치 호출 구간 기록 (micro-batch, 날짜별 공유 검색)
+    블록 안의 단계 span은 배치 자체의 trace("batch-N")로 기록하고, 블록이 끝나면 기다리던 task마다
+        - batch_wait: 요청 시각 → 배치 시작 (배치가 모이기를 기다린 시간)
+        - 배치 span과 그 안의 단계 span(embed / ann / rerank 등) 복사본 (batch.id 속성 + 원본 span으로의 OTLP link)
+    을 기록하여 배치 경로에서도 task별 단계 분해가 유지되도록 합니다.
+
+    Args:
+        name: 배치 span 이름 (예: "retrieval_batch")
+        waiters: [(task_id, 요청 시각 ns)] 배치 결과를 기다리는 task 목록.
+            블록이 끝날 때 읽으므로 실행 중에 합류한 task도 포함됩니다 (task_id가 None이면 건너뜀).
+    """
+    recorder = _recorder.get()
+    if recorder is None:
+        yield
+        return
+    batch_id = f"batch-{next(_batch_counter)}"
+    first = len(recorder.spans)
+    start_ns = time.time_ns()
+    token = _task_id.set(batch_id)
+    try:
+        yield
+    finally:
+        _task_id.reset(token)
+        batch_index = recorder.record(name, start_ns, time.time_ns(), batch_id, batch_size=len(waiters), **attributes)
+        # 다른 스레드의 span이 섞여 있을 수 있으므로 이 배치 trace의 span만 복사
+        inner = [i for i in range(first, batch_index + 1) if recorder.spans[i][0] == batch_id]
+        for task_id, requested_ns in list(waiters):
+            if task_id is None:
+                continue
+            recorder.linked_batches.add(batch_id)
+            recorder.record("batch_wait", requested_ns, max(requested_ns, start_ns), task_id, batch_id=batch_id)
+            for i in inner:
+                _, span_name, span_start, span_end, span_attributes = recorder.spans[i]
+                recorder.record(span_name, span_start, span_end, task_id,
+                                **{**span_attributes, "batch_id": batch_id, LINKS_KEY: [i]})
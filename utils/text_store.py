@@ -0,0 +1,301 @@
+"""
+리뷰 텍스트 저장소 모듈
+리뷰 텍스트를 ReviewID 정렬 순서로 이어 붙인 UTF-8 blob과 offsets 배열로 저장하고 mmap으로 엽니다.
+ingest는 TextStoreWriter로 리뷰를 하나씩 파일에 이어 쓰므로 원문 전체를 메모리에 모으지 않습니다.
+코퍼스 전체를 메모리에 올리거나 Chroma / CSV를 다시 읽지 않고도, 리뷰 하나(또는 스니펫)를 O(1)로 잘라 낼 수 있습니다.
+파일은 OS 페이지 캐시를 통해 여러 프로세스(RetrieverPool 워커 등)가 공유합니다.
+
+    - ReviewTextStore: 리뷰 원문 전체 (분석 / 임의 조회용)
+    - SnippetStore: ingest 시 앞 400자로 잘라 둔 스니펫 (검색 2단계 fetch용, 더 작음)
+
+사용 예:
+    store = ReviewTextStore.load(get_review_text_store_path("cyberpunk2077_reviews"))
+    text = store.get("123456789")
+    snippets = store.snippets(["123", "456"], max_chars=200)
+"""
+import os
+import sys
+import argparse
+import numpy as np
+
+from utils import artifact_store
+
+TEXT_STORE_DIR = os.path.join("datasets", "text_store")
+TEXT_STORE_FORMAT_VERSION = 1
+# 프롬프트에 들어가는 리뷰 길이 (format_review의 doc[:400]과 동일)
+SNIPPET_LENGTH = 400
+# UTF-8 한 글자의 최대 바이트 수 (n글자 스니펫은 앞 4n 바이트 안에 있음)
+MAX_UTF8_BYTES = 4
+
+
+def get_snippet_store_path(collection_name):
+    """컬렉션별 스니펫 저장소 디렉토리 경로"""
+    return os.path.join(TEXT_STORE_DIR, f"{collection_name}_snippets")
+
+
+def get_review_text_store_path(collection_name):
+    """컬렉션별 원문 저장소 디렉토리 경로"""
+    return os.path.join(TEXT_STORE_DIR, f"{collection_name}_full")
+
+
+class TextStore:
+    """
+    ReviewID → 텍스트 저장소
+    UTF-8 바이트를 하나의 blob으로 이어 붙이고, ID 정렬 순서의 offsets로 구간을 찾습니다.
+
+    Attributes:
+        ids (np.ndarray[str]): 정렬된 리뷰 ID
+        offsets (np.ndarray[int64]): (N + 1,) blob 안의 시작 위치
+        blob (np.ndarray[uint8]): 텍스트 UTF-8 바이트 (디스크에서 로드 시 mmap)
+        max_chars (int | None): 저장 시 자른 길이 (None이면 원문 전체)
+    """
+    # 하위 클래스 기본 길이 (None: 원문 전체)
+    default_max_chars = None
+    label = "Text store"
+
+    def __init__(self, ids, offsets, blob, max_chars=None, collection_id=None):
+        self.ids = ids
+        self.offsets = offsets
+        self.blob = blob
+        self.max_chars = max_chars
+        self.collection_id = collection_id
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---------------------------------------------------------------
+    # 생성 / 저장 / 로드
+    # ---------------------------------------------------------------
+    @classmethod
+    def from_texts(cls, ids, texts, max_chars=None, collection_id=None):
+        """
+        (ID, 텍스트) 목록으로 저장소를 만듭니다. 같은 ID가 여러 번 나오면 처음 것만 사용합니다.
+        """
+        max_chars = max_chars if max_chars is not None else cls.default_max_chars
+        ids = np.array([str(i) for i in ids], dtype=str)
+        unique_ids, first = np.unique(ids, return_index=True)
+        encoded = [(texts[i] or "")[:max_chars].encode("utf-8") for i in first]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(unique_ids, offsets, blob, max_chars, collection_id)
+
+    @classmethod
+    def build_from_collection(cls, collection, path, max_chars=None, batch_size=5000):
+        """
+        이미 구축된 Chroma 컬렉션의 원문을 batch_size 단위로 읽어 path에 저장소를 바로 씁니다 (TextStoreWriter).
+
+        Returns:
+            TextStore: path에서 mmap으로 로드한 저장소
+        """
+        total = collection.count()
+        print(f"Exporting {total:,} review texts from collection '{collection.name}'...")
+        writer = TextStoreWriter(cls, path, max_chars)
+        for offset in range(0, total, batch_size):
+            batch = collection.get(include=["documents"], limit=batch_size, offset=offset)
+            for review_id, doc in zip(batch['ids'], batch['documents']):
+                writer.add(review_id, doc)
+        return writer.close(collection_id=str(collection.id))
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "ids.npy"), self.ids)
+        np.save(os.path.join(path, "offsets.npy"), self.offsets)
+        np.save(os.path.join(path, "blob.npy"), self.blob)
+        self._save_meta(path)
+
+    def _save_meta(self, path):
+        artifact_store.write_meta(path, TEXT_STORE_FORMAT_VERSION, max_chars=self.max_chars,
+                                  collection_id=self.collection_id, count=len(self))
+        print(f"💾 {self.label} saved: {path} ({len(self):,} reviews, {len(self.blob) / 1e6:.1f} MB)")
+
+    @classmethod
+    def load(cls, path, mmap=True, **expected):
+        """저장된 저장소 로드 (기본: mmap). 없거나 포맷 버전 / expected(collection_id 등)가 다르면 None 반환"""
+        meta = artifact_store.read_meta(path, TEXT_STORE_FORMAT_VERSION, **expected)
+        if meta is None:
+            return None
+        mmap_mode = 'r' if mmap else None
+        return cls(
+            np.load(os.path.join(path, "ids.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, "offsets.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, "blob.npy"), mmap_mode=mmap_mode),
+            meta["max_chars"],
+            meta.get("collection_id")
+        )
+
+    @classmethod
+    def load_for_collection(cls, collection, path):
+        """저장소가 컬렉션과 일치하면 로드, 아니면 None (컬렉션이 다시 만들어진 경우 등)"""
+        store = cls.load(path, **artifact_store.collection_fields(collection))
+        if store is not None:
+            print(f"{cls.label} loaded: {path} ({len(store):,} reviews)")
+        return store
+
+    @classmethod
+    def load_or_build(cls, collection, path):
+        """
+        ingest 때 저장된 저장소가 컬렉션과 일치하면 로드하고, 없거나 컬렉션이 다시 만들어졌으면 컬렉션에서 새로 만듭니다.
+        """
+        return artifact_store.load_or_build(
+            path,
+            lambda p: cls.load(p, **artifact_store.collection_fields(collection)),
+            lambda: cls.build_from_collection(collection, path),
+            cls.label, lambda store: f"{len(store):,} reviews"
+        )
+
+    # ---------------------------------------------------------------
+    # 조회
+    # ---------------------------------------------------------------
+    def positions(self, ids):
+        """ID 목록의 저장소 내 위치 (없는 ID는 -1)"""
+        ids = np.array([str(i) for i in ids], dtype=str)
+        if not len(self) or not len(ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.ids, ids), len(self) - 1)
+        return np.where(self.ids[pos] == ids, pos, -1)
+
+    def _slice(self, pos, max_chars=None):
+        """pos 위치의 텍스트 (max_chars가 있으면 필요한 앞부분 바이트만 읽음)"""
+        start, end = int(self.offsets[pos]), int(self.offsets[pos + 1])
+        if max_chars is None:
+            return self.blob[start:end].tobytes().decode("utf-8")
+        end = min(end, start + max_chars * MAX_UTF8_BYTES)
+        # 잘린 구간 끝의 불완전한 멀티바이트 문자는 max_chars 밖이므로 무시
+        return self.blob[start:end].tobytes().decode("utf-8", errors="ignore")[:max_chars]
+
+    def get(self, review_id):
+        """리뷰 하나의 텍스트 (없으면 None)"""
+        pos = self.positions([review_id])[0]
+        return self._slice(pos) if pos >= 0 else None
+
+    def get_many(self, ids):
+        """ID 목록의 텍스트 (입력 순서 유지, 저장소에 없는 ID는 None)"""
+        return [self._slice(p) if p >= 0 else None for p in self.positions(ids)]
+
+    def snippets(self, ids, max_chars=SNIPPET_LENGTH):
+        """ID 목록의 앞 max_chars 글자 (입력 순서 유지, 저장소에 없는 ID는 None)"""
+        return [self._slice(p, max_chars) if p >= 0 else None for p in self.positions(ids)]
+
+    def view(self, ids):
+        """ID 목록 순서로 텍스트를 필요할 때 하나씩 읽는 시퀀스 (원문 전체를 메모리에 올리지 않고 리스트 대신 사용)"""
+        return TextStoreView(self, ids)
+
+
+class TextStoreView:
+    """TextStore.view()가 반환하는 지연 조회 시퀀스 (view[i]는 ids[i]의 텍스트, 없는 ID는 None)"""
+    def __init__(self, store, ids):
+        self.store = store
+        self._positions = store.positions(ids)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __getitem__(self, i):
+        pos = self._positions[i]
+        return self.store._slice(pos) if pos >= 0 else None
+
+
+class TextStoreWriter:
+    """
+    ingest 중 (ID, 텍스트)를 하나씩 받아 UTF-8 바이트를 임시 파일에 바로 이어 쓰고,
+    close() 때 ID 정렬 순서의 blob / offsets로 다시 써서 TextStore 형식으로 저장합니다.
+    상주 메모리는 ID와 바이트 길이 목록뿐이며 원문은 파일에만 있습니다.
+
+    사용 예:
+        writer = TextStoreWriter(SnippetStore, get_snippet_store_path(COLLECTION_NAME))
+        writer.add(review_id, review_text)
+        store = writer.close(collection_id=str(collection.id))
+    """
+    def __init__(self, store_cls, path, max_chars=None):
+        self.store_cls = store_cls
+        self.path = path
+        self.max_chars = max_chars if max_chars is not None else store_cls.default_max_chars
+        os.makedirs(path, exist_ok=True)
+        artifact_store.clear_meta(path)
+        self._ingest_path = os.path.join(path, "blob.ingest.bin")
+        self._ingest_file = open(self._ingest_path, "wb")
+        self._ids = []
+        self._lengths = []
+
+    def add(self, review_id, text):
+        data = (text or "")[:self.max_chars].encode("utf-8")
+        self._ingest_file.write(data)
+        self._ids.append(str(review_id))
+        self._lengths.append(len(data))
+
+    def close(self, collection_id=None):
+        """
+        ID 정렬 순서로 blob을 다시 써서 저장합니다. 같은 ID가 여러 번 나오면 처음 것만 사용합니다 (from_texts와 동일).
+
+        Returns:
+            TextStore: 저장한 저장소 (mmap)
+        """
+        self._ingest_file.close()
+        ids = np.array(self._ids, dtype=str)
+        unique_ids, first = np.unique(ids, return_index=True)
+        ingest_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.asarray(self._lengths, dtype=np.int64), out=ingest_offsets[1:])
+        offsets = np.zeros(len(unique_ids) + 1, dtype=np.int64)
+        np.cumsum(ingest_offsets[first + 1] - ingest_offsets[first], out=offsets[1:])
+
+        blob_path = os.path.join(self.path, "blob.npy")
+        if offsets[-1] == 0:
+            np.save(blob_path, np.empty(0, dtype=np.uint8))
+        else:
+            ingest_blob = np.memmap(self._ingest_path, dtype=np.uint8, mode='r')
+            building_path = os.path.join(self.path, "blob.building.npy")
+            blob = np.lib.format.open_memmap(building_path, mode="w+", dtype=np.uint8, shape=(int(offsets[-1]),))
+            for pos, row in enumerate(first):
+                blob[offsets[pos]:offsets[pos + 1]] = ingest_blob[ingest_offsets[row]:ingest_offsets[row + 1]]
+            blob.flush()
+            del blob, ingest_blob
+            os.replace(building_path, blob_path)
+        os.remove(self._ingest_path)
+
+        np.save(os.path.join(self.path, "ids.npy"), unique_ids)
+        np.save(os.path.join(self.path, "offsets.npy"), offsets)
+        store = self.store_cls(unique_ids, offsets, np.load(blob_path, mmap_mode='r'), self.max_chars, collection_id)
+        store._save_meta(self.path)
+        return self.store_cls.load(self.path)
+
+
+class ReviewTextStore(TextStore):
+    """리뷰 원문 전체 저장소"""
+    label = "Review text store"
+
+    @classmethod
+    def load_or_build(cls, collection, path=None):
+        return super().load_or_build(collection, path or get_review_text_store_path(collection.name))
+
+
+class SnippetStore(TextStore):
+    """ingest 시 앞 400자로 잘라 둔 스니펫 저장소 (검색 2단계 fetch용)"""
+    default_max_chars = SNIPPET_LENGTH
+    label = "Snippet store"
+
+    @classmethod
+    def load_or_build(cls, collection, path=None):
+        return super().load_or_build(collection, path or get_snippet_store_path(collection.name))
+
+
+if __name__ == "__main__":
+    import chromadb
+
+    parser = argparse.ArgumentParser(description='Export review texts from a Chroma collection into mmap text stores, or look up a review.')
+    parser.add_argument('--db-path', default=os.path.join("datasets", "chroma_db"), help='ChromaDB path')
+    parser.add_argument('--collection', default="cyberpunk2077_reviews", help='Collection name')
+    parser.add_argument('--show', nargs='+', metavar='REVIEW_ID', help='Print reviews from the full-text store instead of building')
+    args = parser.parse_args()
+
+    if args.show:
+        store = ReviewTextStore.load(get_review_text_store_path(args.collection))
+        if store is None:
+            sys.exit(f"Review text store not found: {get_review_text_store_path(args.collection)}")
+        for review_id, text in zip(args.show, store.get_many(args.show)):
+            print(f"[{review_id}] {text}")
+    else:
+        client = chromadb.PersistentClient(path=args.db_path)
+        collection = client.get_collection(name=args.collection, embedding_function=None)
+        ReviewTextStore.build_from_collection(collection, get_review_text_store_path(args.collection))
+        SnippetStore.build_from_collection(collection, get_snippet_store_path(args.collection))
@@ -0,0 +1,282 @@
+"""
+시간 샤딩 (Time-Sharded Collections) 모듈
+하나의 컬렉션에 date <= current_date 필터를 거는 대신, 코퍼스를 월 / 분기 단위 컬렉션으로 나누어 두고
+시뮬레이션 날짜 이전의 샤드만 병렬로 검색한 뒤 결과를 합칩니다.
+초기 날짜(2020-12 등)의 검색은 작은 샤드 하나만 보므로 전체 HNSW를 강하게 필터링하는 비용이 사라집니다.
+
+    - 현재 날짜보다 완전히 이전인 샤드: 필터 없이 검색
+    - 현재 날짜가 포함된 샤드: where={"date": {"$lte": ...}} 필터로 검색
+    - Time-Aware 재랭킹 (선택, prune_k): 샤드의 최대 가능 점수(1 × exp(-λ · 샤드 마지막 날짜부터의 경과 일수))가
+      지금까지 찾은 k번째 점수를 넘지 못하면 그 샤드는 검색하지 않음.
+      이때 후보 풀은 "거리 상위 n개"가 아니라 "검색한 샤드들의 후보 중 감쇠 점수 상위 n개"가 되므로
+      pool 모드의 CANDIDATE_POOL_SIZE와 의미가 다릅니다 (RAGRetriever는 SHARD_PRUNING일 때만 사용).
+
+샤드는 원본 컬렉션의 임베딩을 복사해 만들고(재임베딩 없음), 목록은 manifest(datasets/shards/)에 기록합니다.
+    python -m utils.time_shards --shard-by quarter
+"""
+import os
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from utils.collection_config import distance_to_similarity, get_hnsw_config, build_collection_metadata
+from utils.date_utils import yyyymmdd_to_epoch_days
+
+SHARD_MANIFEST_DIR = os.path.join("datasets", "shards")
+SHARD_MANIFEST_VERSION = 1
+SHARD_GRANULARITIES = ("month", "quarter")
+DEFAULT_SHARD_GRANULARITY = "quarter"
+# 샤드 병렬 검색 스레드 수
+SHARD_WORKERS = 4
+# similarity 상한 (distance_to_similarity 결과는 [0, 1])
+MAX_SIMILARITY = 1.0
+
+
+def get_shard_manifest_path(collection_name):
+    """컬렉션별 샤드 manifest 경로"""
+    return os.path.join(SHARD_MANIFEST_DIR, f"{collection_name}.json")
+
+
+def shard_key(date_int, granularity):
+    """YYYYMMDD → 샤드 키 (month: "2020m12", quarter: "2020q4")"""
+    year, month = date_int // 10000, (date_int // 100) % 100
+    if granularity == "month":
+        return f"{year}m{month:02d}"
+    if granularity == "quarter":
+        return f"{year}q{(month - 1) // 3 + 1}"
+    raise ValueError(f"지원하지 않는 샤드 단위입니다: {granularity}")
+
+
+def build_time_shards(client, collection, granularity=DEFAULT_SHARD_GRANULARITY, batch_size=5000):
+    """
+    컬렉션을 월 / 분기 단위 샤드 컬렉션으로 복사하고 manifest를 저장합니다.
+    임베딩과 메타데이터만 복사하며(원문은 텍스트 저장소에서 조회), 샤드는 원본과 같은 HNSW 설정을 사용합니다.
+
+    Returns:
+        dict: 저장한 manifest
+    """
+    if granularity not in SHARD_GRANULARITIES:
+        raise ValueError(f"지원하지 않는 샤드 단위입니다: {granularity}")
+    # 원본의 거리 함수 / HNSW 파라미터 (configuration으로 바꾼 ef_search 포함)
+    hnsw_config = get_hnsw_config(collection)
+    shard_metadata = build_collection_metadata(
+        hnsw_config["space"], hnsw_config["M"], hnsw_config["ef_construction"], hnsw_config["ef_search"]
+    )
+
+    # 이전 manifest의 샤드 컬렉션 정리 (단위가 바뀌었을 수 있음)
+    previous = load_shard_manifest(collection.name)
+    for shard in (previous or {}).get("shards", []):
+        try:
+            client.delete_collection(name=shard["name"])
+        except Exception:
+            pass
+
+    total = collection.count()
+    print(f"Sharding {total:,} reviews from '{collection.name}' by {granularity}...")
+    shard_collections = {}
+    shards = {}
+    for offset in range(0, total, batch_size):
+        batch = collection.get(include=["embeddings", "metadatas"], limit=batch_size, offset=offset)
+        keys = [shard_key((meta or {}).get('date') or 0, granularity) for meta in batch['metadatas']]
+        for key in dict.fromkeys(keys):
+            rows = [i for i, k in enumerate(keys) if k == key]
+            if key not in shard_collections:
+                name = f"{collection.name}_{key}"
+                try:
+                    client.delete_collection(name=name)
+                except Exception:
+                    pass
+                shard_collections[key] = client.create_collection(
+                    name=name, embedding_function=None, metadata=shard_metadata
+                )
+                shards[key] = {"key": key, "name": name, "min_date": None, "max_date": None, "count": 0}
+            shard_collections[key].add(
+                ids=[batch['ids'][i] for i in rows],
+                embeddings=np.asarray(batch['embeddings'])[rows],
+                metadatas=[batch['metadatas'][i] for i in rows]
+            )
+            dates = [(batch['metadatas'][i] or {}).get('date') or 0 for i in rows]
+            shard = shards[key]
+            shard["min_date"] = min(dates) if shard["min_date"] is None else min(shard["min_date"], *dates)
+            shard["max_date"] = max(dates) if shard["max_date"] is None else max(shard["max_date"], *dates)
+            shard["count"] += len(rows)
+
+    manifest = {
+        "version": SHARD_MANIFEST_VERSION,
+        "collection_id": str(collection.id),
+        "count": total,
+        "granularity": granularity,
+        "shards": sorted(shards.values(), key=lambda s: s["min_date"])
+    }
+    path = get_shard_manifest_path(collection.name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"💾 Shard manifest saved: {path} ({len(shards)} shards)")
+    return manifest
+
+
+def load_shard_manifest(collection_name):
+    """저장된 manifest 로드 (없거나 포맷 버전이 다르면 None)"""
+    path = get_shard_manifest_path(collection_name)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SHARD_MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+class ShardedCollection:
+    """
+    월 / 분기 샤드 컬렉션 묶음 위의 날짜 필터 검색
+
+    Attributes:
+        shards (list): manifest의 샤드 정보 (min_date 오름차순)
+        collections (list): 샤드 순서대로의 chromadb Collection
+    """
+    def __init__(self, client, manifest, space="l2", max_workers=SHARD_WORKERS):
+        self.granularity = manifest["granularity"]
+        self.shards = manifest["shards"]
+        self.collections = [client.get_collection(name=s["name"], embedding_function=None) for s in self.shards]
+        self.space = space
+        self.min_dates = np.array([s["min_date"] for s in self.shards], dtype=np.int64)
+        self.max_dates = np.array([s["max_date"] for s in self.shards], dtype=np.int64)
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __len__(self):
+        return len(self.shards)
+
+    @classmethod
+    def load_or_build(cls, client, collection, space="l2", granularity=DEFAULT_SHARD_GRANULARITY):
+        """manifest가 컬렉션과 일치하면 로드하고, 없거나 컬렉션이 다시 만들어졌으면 샤드를 새로 만듭니다."""
+        manifest = load_shard_manifest(collection.name)
+        if (manifest is None
+                or manifest.get("collection_id") != str(collection.id)
+                or manifest.get("count") != collection.count()):
+            # 기존 manifest가 있으면 같은 단위로 다시 만듦
+            manifest = build_time_shards(client, collection, (manifest or {}).get("granularity", granularity))
+        else:
+            print(f"Shard manifest loaded: {get_shard_manifest_path(collection.name)} "
+                  f"({len(manifest['shards'])} {manifest['granularity']} shards)")
+        return cls(client, manifest, space)
+
+    def _query_shard(self, s, query_embeddings, date_int, n_results):
+        """샤드 하나 검색 (현재 날짜가 샤드 안에 있을 때만 날짜 필터 사용)"""
+        kwargs = {}
+        if self.max_dates[s] > date_int:
+            kwargs["where"] = {"date": {"$lte": date_int}}
+        results = self.collections[s].query(
+            query_embeddings=np.asarray(query_embeddings).tolist(),
+            n_results=min(n_results, self.shards[s]["count"]),
+            include=["metadatas", "distances"],
+            **kwargs
+        )
+        return [
+            {
+                "ids": np.array(results['ids'][i], dtype=str),
+                "distances": np.array(results['distances'][i], dtype=np.float64),
+                "dates": np.array([meta.get('date') or 0 for meta in results['metadatas'][i]], dtype=np.int64)
+            }
+            for i in range(len(query_embeddings))
+        ]
+
+    def query(self, query_embeddings, date_int, n_results, decay_rate=None, prune_k=None):
+        """
+        date <= date_int 인 샤드만 병렬로 검색하여 쿼리별 후보 집합을 만듭니다.
+
+        Args:
+            query_embeddings: (Q, dim) 쿼리 임베딩
+            date_int: YYYYMMDD 현재 날짜
+            n_results: 쿼리당 후보 개수
+            decay_rate / prune_k: 둘 다 주어지면 최신 샤드부터 SHARD_WORKERS개씩 검색하면서,
+                샤드의 최대 가능 점수 MAX_SIMILARITY · exp(-decay_rate · 경과 일수)가
+                쿼리별 현재 prune_k번째 점수 이하인 샤드는 건너뜁니다. 이 경우 후보는 시간 감쇠 점수 순으로 자르므로
+                후보 집합이 거리 상위 n_results개(prune_k 없이 검색한 결과)와 다릅니다.
+                감쇠 점수 상위 prune_k개는 검색한 샤드별 후보의 합집합 기준으로 정확합니다.
+
+        Returns:
+            list: 쿼리 순서대로 {"ids", "distances", "dates"} (pool 모드 후보 집합과 같은 형식)
+        """
+        eligible = np.nonzero(self.min_dates <= date_int)[0][::-1]
+        n_queries = len(query_embeddings)
+        parts = [[] for _ in range(n_queries)]
+        prune = decay_rate is not None and prune_k is not None
+        if not prune:
+            hits = self.executor.map(lambda s: self._query_shard(s, query_embeddings, date_int, n_results), eligible)
+            for shard_hits in hits:
+                for q, hit in enumerate(shard_hits):
+                    parts[q].append(hit)
+            return [self._merge(p, n_results) for p in parts]
+
+        current_day = int(yyyymmdd_to_epoch_days(date_int))
+        shard_bound = MAX_SIMILARITY * np.exp(
+            -decay_rate * np.maximum(0, current_day - yyyymmdd_to_epoch_days(self.max_dates))
+        )
+        kth = np.full(n_queries, -np.inf)
+        workers = self.max_workers
+        for start in range(0, len(eligible), workers):
+            wave = []
+            for s in eligible[start:start + workers]:
+                # 이 샤드가 아직 top-k를 바꿀 수 있는 쿼리만 검색
+                alive = np.nonzero(shard_bound[s] > kth)[0]
+                if len(alive):
+                    wave.append((s, alive))
+            if not wave:
+                break
+            hits = self.executor.map(
+                lambda item: self._query_shard(item[0], query_embeddings[item[1]], date_int, n_results), wave
+            )
+            for (s, alive), shard_hits in zip(wave, hits):
+                for q, hit in zip(alive, shard_hits):
+                    hit["scores"] = self._decayed_scores(hit, current_day, decay_rate)
+                    parts[q].append(hit)
+            for q in range(n_queries):
+                scores = np.concatenate([p["scores"] for p in parts[q]]) if parts[q] else np.empty(0)
+                if len(scores) >= prune_k:
+                    kth[q] = np.partition(scores, len(scores) - prune_k)[len(scores) - prune_k]
+        return [self._merge(p, n_results, by_score=True) for p in parts]
+
+    def _decayed_scores(self, hit, current_day, decay_rate):
+        """similarity × exp(-decay_rate · 경과 일수) (Time-Aware 재랭킹 점수와 같은 식)"""
+        review_days = np.where(hit['dates'] > 0, yyyymmdd_to_epoch_days(hit['dates']), current_day)
+        return distance_to_similarity(hit['distances'], self.space) * np.exp(
+            -decay_rate * np.maximum(0, current_day - review_days)
+        )
+
+    @staticmethod
+    def _merge(parts, n_results, by_score=False):
+        """샤드별 결과를 합쳐 거리 오름차순(by_score면 감쇠 점수 내림차순) 상위 n_results개"""
+        if not parts:
+            return {"ids": np.empty(0, dtype=str), "distances": np.empty(0), "dates": np.empty(0, dtype=np.int64)}
+        merged = {key: np.concatenate([p[key] for p in parts]) for key in ("ids", "distances", "dates")}
+        key = -np.concatenate([p["scores"] for p in parts]) if by_score else merged["distances"]
+        order = np.argsort(key, kind='stable')[:n_results]
+        return {name: values[order] for name, values in merged.items()}
+
+    def close(self):
+        """샤드 병렬 검색 스레드 풀 종료"""
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+if __name__ == "__main__":
+    import chromadb
+
+    parser = argparse.ArgumentParser(description='Split a Chroma collection into per-month or per-quarter shard collections.')
+    parser.add_argument('--db-path', default=os.path.join("datasets", "chroma_db"), help='ChromaDB path')
+    parser.add_argument('--collection', default="cyberpunk2077_reviews", help='Collection name')
+    parser.add_argument('--shard-by', choices=SHARD_GRANULARITIES, default=DEFAULT_SHARD_GRANULARITY)
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.db_path)
+    collection = client.get_collection(name=args.collection, embedding_function=None)
+    build_time_shards(client, collection, args.shard_by)
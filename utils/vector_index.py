@@ -0,0 +1,322 @@
+"""
+날짜순 정렬 Brute-force 벡터 인덱스 모듈
+ChromaDB 컬렉션의 임베딩을 리뷰 날짜 순으로 정렬된 행렬로 한 번 내보낸 뒤,
+날짜 필터(date <= current_date)를 np.searchsorted로 구한 prefix 구간으로 바꾸어
+블록 단위 행렬곱으로 정확한(exact) top-k를 계산합니다.
+단일 타이틀 리뷰 코퍼스처럼 규모가 크지 않은 경우 HNSW + 메타데이터 필터보다 빠릅니다.
+"""
+import os
+import json
+import hashlib
+import argparse
+import numpy as np
+
+from utils import artifact_store
+from utils.collection_config import get_collection_space
+
+VECTOR_INDEX_DIR = os.path.join("datasets", "vector_index")
+INDEX_FORMAT_VERSION = 1
+
+
+def get_index_path(collection_name):
+    """컬렉션별 인덱스 디렉토리 경로"""
+    return os.path.join(VECTOR_INDEX_DIR, collection_name)
+
+
+class DateSortedIndex:
+    """
+    날짜순으로 정렬된 임베딩 행렬 위의 exact 검색 인덱스
+
+    Attributes:
+        ids (np.ndarray[str]): 리뷰 ID (날짜 오름차순)
+        dates (np.ndarray[int]): YYYYMMDD 날짜 (오름차순 정렬)
+        embeddings (np.ndarray): (N, dim) float16/float32 행렬 (디스크에서 로드 시 mmap)
+        space (str): Chroma와 같은 거리 함수 ("l2", "cosine", "ip")
+    """
+    def __init__(self, ids, dates, embeddings, space="l2", collection_id=None, block_size=65536):
+        self.ids = ids
+        self.dates = dates
+        self.embeddings = embeddings
+        self.space = space
+        self.collection_id = collection_id
+        self.block_size = block_size
+        # 거리 계산용 벡터 제곱 norm (구간 검색에서 처음 필요할 때 한 번 계산, sq_norms 참고)
+        self._sq_norms = None
+        # rows_for_ids()용 ID 정렬 순서 (처음 필요할 때 계산)
+        self._id_order = None
+        # 파생 인덱스 캐시 키용 내용 지문 (처음 필요할 때 계산, fingerprint 참고)
+        self._fingerprint = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def sq_norms(self):
+        """행별 제곱 norm (l2 / cosine 거리 계산용)"""
+        if self._sq_norms is None:
+            self._sq_norms = self._compute_sq_norms()
+        return self._sq_norms
+
+    @property
+    def fingerprint(self):
+        """
+        컬렉션 내용 지문 (리뷰 ID / 날짜 순서, 임베딩 차원, 거리 함수의 해시)
+        컬렉션 ID와 개수가 같아도 내용이 바뀌었으면 파생 인덱스(decay_index 등)를 다시 만들기 위함
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            digest.update(json.dumps([self.space, list(self.embeddings.shape)]).encode("utf-8"))
+            digest.update("\n".join(map(str, self.ids)).encode("utf-8"))
+            digest.update(np.ascontiguousarray(self.dates, dtype=np.int64).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def _compute_sq_norms(self):
+        sq_norms = np.empty(len(self.embeddings), dtype=np.float32)
+        for start in range(0, len(self.embeddings), self.block_size):
+            block = np.asarray(self.embeddings[start:start + self.block_size], dtype=np.float32)
+            sq_norms[start:start + len(block)] = np.einsum('ij,ij->i', block, block)
+        return sq_norms
+
+    # ---------------------------------------------------------------
+    # 생성 / 저장 / 로드
+    # ---------------------------------------------------------------
+    @classmethod
+    def build_from_collection(cls, collection, dtype=np.float32, batch_size=5000):
+        """
+        Chroma 컬렉션 전체(임베딩 + 날짜)를 내보내 날짜순 인덱스를 만듭니다.
+
+        Args:
+            collection: chromadb Collection
+            dtype: 저장 정밀도 (np.float16이면 메모리 절반)
+            batch_size: collection.get() 한 번에 가져올 개수
+        """
+        total = collection.count()
+        print(f"Exporting {total:,} embeddings from collection '{collection.name}'...")
+
+        ids, dates, embeddings = [], [], []
+        for offset in range(0, total, batch_size):
+            batch = collection.get(include=["embeddings", "metadatas"], limit=batch_size, offset=offset)
+            ids.extend(batch['ids'])
+            dates.extend((meta or {}).get('date') or 0 for meta in batch['metadatas'])
+            embeddings.append(np.asarray(batch['embeddings'], dtype=dtype))
+
+        dates = np.array(dates, dtype=np.int64)
+        order = np.argsort(dates, kind='stable')
+        embeddings = np.concatenate(embeddings) if embeddings else np.empty((0, 0), dtype=dtype)
+
+        return cls(
+            ids=np.array(ids, dtype=str)[order],
+            dates=dates[order],
+            embeddings=embeddings[order],
+            space=get_collection_space(collection),
+            collection_id=str(collection.id)
+        )
+
+    @classmethod
+    def build_to_path(cls, collection, path, dtype=np.float32, batch_size=5000):
+        """
+        build_from_collection()과 같은 인덱스를 batch_size 단위로 디스크(path)에 바로 씁니다.
+        임베딩은 컬렉션 순서대로 임시 .npy(mmap)에 쓴 뒤 block 단위로 날짜순으로 옮기므로,
+        전체 임베딩 행렬을 RAM에 올리지 않습니다 (상주 메모리는 ID / 날짜와 batch 하나).
+
+        Returns:
+            DateSortedIndex: path에서 mmap으로 로드한 인덱스
+        """
+        total = collection.count()
+        if total == 0:
+            index = cls.build_from_collection(collection, dtype=dtype, batch_size=batch_size)
+            index.save(path)
+            return index
+        print(f"Exporting {total:,} embeddings from collection '{collection.name}' (streaming to {path})...")
+
+        os.makedirs(path, exist_ok=True)
+        artifact_store.clear_meta(path)
+        unsorted_path = os.path.join(path, "embeddings.unsorted.npy")
+        building_path = os.path.join(path, "embeddings.building.npy")
+
+        ids, dates, unsorted = [], [], None
+        for offset in range(0, total, batch_size):
+            batch = collection.get(include=["embeddings", "metadatas"], limit=batch_size, offset=offset)
+            block = np.asarray(batch['embeddings'], dtype=dtype)
+            if unsorted is None:
+                unsorted = np.lib.format.open_memmap(unsorted_path, mode="w+", dtype=dtype, shape=(total, block.shape[1]))
+            unsorted[offset:offset + len(block)] = block
+            ids.extend(batch['ids'])
+            dates.extend((meta or {}).get('date') or 0 for meta in batch['metadatas'])
+
+        dates = np.array(dates, dtype=np.int64)
+        order = np.argsort(dates, kind='stable')
+        embeddings = np.lib.format.open_memmap(building_path, mode="w+", dtype=dtype, shape=unsorted.shape)
+        for start in range(0, total, batch_size):
+            # 읽기 지역성을 위해 block 안에서는 원래 행 순서로 읽은 뒤 날짜순으로 배치
+            rows = order[start:start + batch_size]
+            read_order = np.argsort(rows, kind='stable')
+            block = np.empty((len(rows), unsorted.shape[1]), dtype=dtype)
+            block[read_order] = unsorted[rows[read_order]]
+            embeddings[start:start + len(rows)] = block
+        embeddings.flush()
+        del embeddings, unsorted
+        os.replace(building_path, os.path.join(path, "embeddings.npy"))
+        os.remove(unsorted_path)
+
+        index = cls(
+            ids=np.array(ids, dtype=str)[order],
+            dates=dates[order],
+            embeddings=np.load(os.path.join(path, "embeddings.npy"), mmap_mode='r'),
+            space=get_collection_space(collection),
+            collection_id=str(collection.id)
+        )
+        np.save(os.path.join(path, "ids.npy"), index.ids)
+        np.save(os.path.join(path, "dates.npy"), index.dates)
+        index._save_meta(path)
+        return index
+
+    def save(self, path):
+        """인덱스를 디렉토리에 저장 (embeddings는 .npy로 저장하여 mmap 로드 가능)"""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "ids.npy"), self.ids)
+        np.save(os.path.join(path, "dates.npy"), self.dates)
+        np.save(os.path.join(path, "embeddings.npy"), self.embeddings)
+        self._save_meta(path)
+
+    def _save_meta(self, path):
+        artifact_store.write_meta(path, INDEX_FORMAT_VERSION, **artifact_store.vector_index_fields(self),
+                                  dtype=str(self.embeddings.dtype))
+        print(f"💾 Vector index saved: {path} ({len(self):,} rows, {self.embeddings.dtype})")
+
+    @classmethod
+    def load(cls, path, mmap=True, **expected):
+        """저장된 인덱스 로드. 없거나 포맷 버전 / expected(collection_id 등)가 다르면 None 반환"""
+        meta = artifact_store.read_meta(path, INDEX_FORMAT_VERSION, **expected)
+        if meta is None:
+            return None
+
+        return cls(
+            ids=np.load(os.path.join(path, "ids.npy")),
+            dates=np.load(os.path.join(path, "dates.npy")),
+            embeddings=np.load(os.path.join(path, "embeddings.npy"), mmap_mode='r' if mmap else None),
+            space=meta["space"],
+            collection_id=meta.get("collection_id")
+        )
+
+    @classmethod
+    def load_or_build(cls, collection, path=None, dtype=np.float32):
+        """
+        저장된 인덱스가 컬렉션과 일치하면 로드하고, 없거나 컬렉션이 다시 만들어졌으면 디스크에 바로 새로 만듭니다 (build_to_path).
+        """
+        path = path or get_index_path(collection.name)
+        return artifact_store.load_or_build(
+            path,
+            lambda p: cls.load(p, **artifact_store.collection_fields(collection), space=get_collection_space(collection)),
+            lambda: cls.build_to_path(collection, path, dtype=dtype),
+            "Vector index", lambda index: f"{len(index):,} rows"
+        )
+
+    # ---------------------------------------------------------------
+    # 검색
+    # ---------------------------------------------------------------
+    def prefix_length(self, date_int):
+        """date <= date_int 인 행의 개수 (날짜순 정렬이므로 앞쪽 prefix 구간)"""
+        return int(np.searchsorted(self.dates, date_int, side='right'))
+
+    def _distances(self, queries, q_sq_norms, vectors, sq_norms):
+        """queries (Q, dim)와 vectors (B, dim) 사이의 Chroma 방식 거리 (Q, B)"""
+        dots = queries @ np.asarray(vectors, dtype=np.float32).T
+        if self.space == "cosine":
+            denom = np.sqrt(q_sq_norms)[:, None] * np.sqrt(sq_norms)[None, :]
+            return 1.0 - dots / np.maximum(denom, 1e-12)
+        if self.space == "ip":
+            return 1.0 - dots
+        # l2: Chroma(hnswlib)는 제곱 L2 거리를 반환
+        return np.maximum(q_sq_norms[:, None] + sq_norms[None, :] - 2.0 * dots, 0.0)
+
+    def iter_distances(self, query_embeddings, end, start=0):
+        """
+        [start, end) 구간을 block_size 단위로 나누어 (블록 시작 행, (Q, B) 거리 행렬)을 순서대로 반환합니다.
+        """
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        q_sq_norms = np.einsum('ij,ij->i', queries, queries)
+        for block_start in range(start, end, self.block_size):
+            block_end = min(block_start + self.block_size, end)
+            yield block_start, self._distances(
+                queries, q_sq_norms,
+                self.embeddings[block_start:block_end], self.sq_norms[block_start:block_end]
+            )
+
+    def rows_for_ids(self, ids):
+        """리뷰 ID → 인덱스 행 번호 (ID 정렬 순서는 처음 호출할 때 한 번만 계산)"""
+        if self._id_order is None:
+            self._id_order = np.argsort(self.ids, kind='stable')
+        positions = np.searchsorted(self.ids, np.asarray(ids, dtype=str), sorter=self._id_order)
+        return self._id_order[positions]
+
+    def row_distances(self, query_embedding, rows):
+        """
+        쿼리 하나와 지정한 행들 사이의 거리 (rows 순서 유지)
+        지정한 행의 norm만 계산하므로 큰 mmap 행렬에서도 전체 norm 계산 없이 해당 행만 읽습니다.
+        """
+        query = np.atleast_2d(np.asarray(query_embedding, dtype=np.float32))
+        vectors = np.asarray(self.embeddings[np.asarray(rows, dtype=np.int64)], dtype=np.float32)
+        return self._distances(query, np.einsum('ij,ij->i', query, query), vectors,
+                               np.einsum('ij,ij->i', vectors, vectors))[0]
+
+    def search(self, query_embeddings, date_int, n_results):
+        """
+        date <= date_int 인 리뷰 중 각 쿼리와 가장 가까운 n_results개를 정확히 찾습니다.
+        prefix 구간을 block_size 단위로 나누어 계산하므로 메모리 사용량은 Q × block_size로 제한됩니다.
+
+        Args:
+            query_embeddings: (Q, dim) 쿼리 임베딩
+            date_int: YYYYMMDD 기준 날짜 (이 날짜 이전 리뷰만 검색)
+            n_results: 쿼리당 결과 개수
+
+        Returns:
+            tuple: (rows, distances) - 각각 (Q, k) 배열, 거리 오름차순. rows는 인덱스 행 번호
+        """
+        n_queries = len(np.atleast_2d(query_embeddings))
+        end = self.prefix_length(date_int)
+        k = min(n_results, end)
+        if k <= 0:
+            return np.empty((n_queries, 0), dtype=np.int64), np.empty((n_queries, 0), dtype=np.float32)
+
+        return merge_top_k(self.iter_distances(query_embeddings, end), n_queries, k)
+
+
+def merge_top_k(blocks, n_queries, k):
+    """
+    (블록 시작 행, (Q, B) 거리 행렬) 블록들을 차례로 합치며 쿼리별 거리 상위 k개만 유지합니다.
+
+    Returns:
+        tuple: (rows, distances) - 각각 (Q, k) 배열, 거리 오름차순
+    """
+    best_rows = np.empty((n_queries, 0), dtype=np.int64)
+    best_dist = np.empty((n_queries, 0), dtype=np.float32)
+    for block_start, dist in blocks:
+        rows = np.broadcast_to(np.arange(block_start, block_start + dist.shape[1]), dist.shape)
+
+        # 블록 내 top-k와 현재까지의 top-k를 합쳐 다시 top-k만 유지
+        dist = np.concatenate([best_dist, dist], axis=1)
+        rows = np.concatenate([best_rows, rows], axis=1)
+        if dist.shape[1] > k:
+            part = np.argpartition(dist, k - 1, axis=1)[:, :k]
+            dist = np.take_along_axis(dist, part, axis=1)
+            rows = np.take_along_axis(rows, part, axis=1)
+        best_dist, best_rows = dist, rows
+
+    order = np.argsort(best_dist, axis=1, kind='stable')
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_dist, order, axis=1)
+
+
+if __name__ == "__main__":
+    import chromadb
+
+    parser = argparse.ArgumentParser(description='Export a Chroma collection into a date-sorted brute-force index.')
+    parser.add_argument('--db-path', default=os.path.join("datasets", "chroma_db"), help='ChromaDB path')
+    parser.add_argument('--collection', default="cyberpunk2077_reviews", help='Collection name')
+    parser.add_argument('--dtype', choices=['float16', 'float32'], default='float32', help='Stored embedding precision')
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.db_path)
+    collection = client.get_collection(name=args.collection, embedding_function=None)
+    DateSortedIndex.build_to_path(collection, get_index_path(args.collection), dtype=np.dtype(args.dtype))